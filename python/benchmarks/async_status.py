@@ -0,0 +1,84 @@
+# ASYNC marked receive data benchmark
+#
+# Compares a per character loop removing N_TTY PARMRK error marks with
+# mgasync.AsyncDecoder on receive buffers with no errors, with 0xff data
+# bytes and with parity errors.
+#
+# usage: python async_status.py [read_size] [megabytes]
+
+import os
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgasync import AsyncDecoder
+
+
+# per character decode of marked data
+def character_loop(buf:bytes) -> tuple:
+    data = bytearray()
+    positions = []
+    i = 0
+    size = len(buf)
+    while i < size:
+        c = buf[i]
+        if c == 0xff and i + 1 < size:
+            if buf[i + 1] == 0xff:
+                data.append(0xff)
+                i += 2
+                continue
+            if buf[i + 1] == 0 and i + 2 < size:
+                positions.append(len(data))
+                if buf[i + 2]:
+                    data.append(buf[i + 2])
+                i += 3
+                continue
+        data.append(c)
+        i += 1
+    return bytes(data), positions
+
+
+def make_stream(size:int, kind:str) -> bytes:
+    if kind == 'text':
+        return (b'The quick brown fox jumps over the lazy dog\r\n' *
+                (size // 45 + 1))[:size]
+    data = os.urandom(size)
+    if kind == 'binary':
+        return data.replace(b'\xff', b'\xff\xff')
+    # about 1 error per 1000 characters
+    out = bytearray()
+    for i in range(0, size, 1000):
+        out += data[i:i + 999].replace(b'\xff', b'\xff\xff')
+        out += b'\xff\x00\x41'
+    return bytes(out)
+
+
+def run(read_size:int, size:int):
+    for kind in ('text', 'binary', 'errors'):
+        stream = make_stream(size, kind)
+        chunks = [stream[i:i + read_size]
+                  for i in range(0, len(stream), read_size)]
+        start = time.perf_counter()
+        for chunk in chunks[:len(chunks) // 10 + 1]:
+            character_loop(chunk)
+        loop_rate = (len(chunks) // 10 + 1) * read_size / \
+            (time.perf_counter() - start)
+        decoder = AsyncDecoder()
+        start = time.perf_counter()
+        for chunk in chunks:
+            decoder.decode(chunk)
+        rate = len(stream) / (time.perf_counter() - start)
+        print(kind + ' (read size ' + str(read_size) + ')')
+        print('  character loop MB/s = ' + '{:.1f}'.format(loop_rate / 1e6))
+        print('  AsyncDecoder MB/s   = ' + '{:.1f}'.format(rate / 1e6))
+        print('  errors              = ' + str(decoder.errors))
+
+
+if __name__ == '__main__':
+    read_size = 4096
+    size = 4
+    if len(sys.argv) > 1:
+        read_size = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        size = int(sys.argv[2])
+    run(read_size, size * 1000000)
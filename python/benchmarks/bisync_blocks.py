@@ -0,0 +1,110 @@
+# BISYNC block receive benchmark
+#
+# Compares the receive_block() loop from samples/bisync.py (8 byte reads,
+# receiver restart after every block) with mgbisync.BlockAssembler (large
+# reads, receiver left enabled) on the same simulated receive stream of
+# back to back blocks separated by sync patterns.
+#
+# usage: python bisync_blocks.py [block_count]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from simport import SimPort
+from mgbisync import BlockAssembler
+
+SYNC = bytes([0x67, 0x98])
+START_OF_BLOCK = 0x55
+END_OF_BLOCK = 0xaa
+BYTES_PER_READ = 8
+BLOCK_SIZE = 100
+
+
+# receive_block() from samples/bisync.py
+def sample_receive_block(port) -> bytearray:
+    block = bytearray()  # assembled data block
+    sob = False  # start of block flag
+    eob = False  # end of block flag
+
+    while True:
+        buf = port.read(BYTES_PER_READ)
+        if not buf:
+            return None
+
+        if not sob:
+            sob_index = buf.find(START_OF_BLOCK)
+            if sob_index == -1:
+                continue
+            sob = True
+            buf = buf[sob_index:]  # discard leading bytes
+
+        eob_index = buf.find(END_OF_BLOCK)
+        if eob_index != -1:
+            eob = True
+            block.extend(buf[:eob_index+1])  # discard trailing bytes
+            break
+
+        block.extend(buf)
+        if len(buf) > BLOCK_SIZE:
+            break
+
+    # restart receiver to clear buffer and search for next sync
+    port.disable_receiver()
+    port.enable_receiver()
+
+    if eob:
+        return block
+    else:
+        return None
+
+
+def make_stream(block_count:int) -> bytes:
+    block = bytearray(BLOCK_SIZE)
+    block[0] = START_OF_BLOCK
+    block[-1] = END_OF_BLOCK
+    return (SYNC + block) * block_count
+
+
+def report(name:str, port:SimPort, blocks:int, block_count:int,
+           elapsed:float):
+    print(name)
+    print('  blocks received  = ' + str(blocks) + ' of ' + str(block_count))
+    print('  blocks/s         = ' + '{:.0f}'.format(blocks / elapsed))
+    print('  MB/s             = ' +
+          '{:.1f}'.format(blocks * BLOCK_SIZE / elapsed / 1e6))
+    print('  syscalls/block   = ' +
+          '{:.2f}'.format(port.syscalls / max(blocks, 1)))
+
+
+def run(block_count:int):
+    stream = make_stream(block_count)
+
+    port = SimPort(stream, sync=SYNC)
+    port.enable_receiver()
+    blocks = 0
+    start = time.perf_counter()
+    while True:
+        block = sample_receive_block(port)
+        if block is None:
+            break
+        blocks += 1
+    report('samples/bisync.py receive_block()', port, blocks, block_count,
+           time.perf_counter() - start)
+
+    port = SimPort(stream, sync=SYNC)
+    port.enable_receiver()
+    assembler = BlockAssembler(port, START_OF_BLOCK, END_OF_BLOCK, BLOCK_SIZE)
+    blocks = 0
+    start = time.perf_counter()
+    for block in assembler:
+        blocks += 1
+    report('mgbisync.BlockAssembler', port, blocks, block_count,
+           time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run(100000)
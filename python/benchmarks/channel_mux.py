@@ -0,0 +1,174 @@
+# Virtual channel multiplexing benchmark
+#
+# Three conversations share one 1 Mbit/s HDLC link for a number of seconds:
+#
+#   channel 1 = bulk 1024 byte frames, receiver takes one every 50 msec
+#               (slow consumer)
+#   channel 2 = bulk 1024 byte frames, receiver takes all
+#   channel 3 = 32 byte requests every 10 msec, latency measured
+#
+# Compared:
+#
+#   shared FIFO = frames sent in order queued, one reader takes frames in
+#                 order of arrival and waits for the slow channel 1
+#                 consumer (head of line blocking), no flow control
+#   Mux         = per channel receive queues, credit flow control and
+#                 deficit round robin
+#
+# Frames travel over BundlePort (multilink_bundle.py): data drains in real
+# time at the line rate and a frame reaches the peer when its last byte is
+# sent. Credit frames return over a second BundlePort.
+#
+# usage: python channel_mux.py [seconds]
+
+import struct
+import sys
+import time
+from collections import deque
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgmux import Mux
+from mgtransmit import TransmitQueues
+from multilink_bundle import BundlePort
+
+RATE = 1000000
+BULK = bytes(1024)
+SLOW_INTERVAL = 0.05
+REQUEST_INTERVAL = 0.01
+LIMIT = 2 * len(BULK) + 64  # driver queue limit (about 17 msec)
+# Mux quantum = one bulk frame per round, so requests wait for at most one
+# bulk frame per channel
+
+
+def arrived(port:BundlePort, now:float) -> list:
+    # frames whose last byte has been sent by now
+    out = []
+    arrivals = port.arrivals
+    while arrivals and arrivals[0][0] <= now:
+        out.append(arrivals.pop(0)[1])
+    return out
+
+
+def request() -> bytes:
+    return struct.pack('>d', time.perf_counter()) + bytes(24)
+
+
+def report(name:str, received:list, latency:list, held:int, seconds:float):
+    print(name)
+    for i in (1, 2):
+        print('  channel ' + str(i) + ' throughput = ' + '{:.0f}'.format(
+            received[i] * len(BULK) * 8 / seconds / 1000) + ' kbit/s')
+    latency.sort()
+    if latency:
+        print('  channel 3 latency median = ' + '{:.1f}'.format(
+            latency[len(latency) // 2] * 1000) + ' msec, max = ' +
+            '{:.1f}'.format(latency[-1] * 1000) + ' msec (' +
+            str(len(latency)) + ' requests)')
+    print('  max frames held at receiver = ' + str(held))
+
+
+def shared_fifo(seconds:float):
+    line = BundlePort(RATE)
+    queues = TransmitQueues(line, weights=(1,), limit=LIMIT)
+    fifo = deque()  # receiver frames in arrival order
+    received = [0, 0, 0, 0]
+    latency = []
+    held = 0
+    start = time.perf_counter()
+    end = start + seconds
+    next_request = start
+    next_slow = start
+    while True:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        # sender: keep bulk queued, requests on time
+        if queues.pending() < 2:
+            queues.put(b'\x01' + BULK)
+            queues.put(b'\x02' + BULK)
+        if now >= next_request:
+            queues.put(b'\x03' + request())
+            next_request += REQUEST_INTERVAL
+        queues.send(0)
+        # receiver: frames taken in order
+        fifo.extend(arrived(line, now))
+        held = max(held, len(fifo))
+        while fifo:
+            frame = fifo[0]
+            if frame[0] == 1:
+                if now < next_slow:
+                    break
+                next_slow = now + SLOW_INTERVAL
+            elif frame[0] == 3:
+                latency.append(now - struct.unpack('>d', frame[1:9])[0])
+            received[frame[0]] += 1
+            fifo.popleft()
+        time.sleep(0.0005)
+    line.close()
+    report('shared FIFO', received, latency, held, seconds)
+
+
+def mux(seconds:float):
+    line = BundlePort(RATE)
+    back = BundlePort(RATE)
+    sender = Mux(line, limit=LIMIT, quantum=len(BULK))
+    receiver = Mux(back, limit=LIMIT, quantum=len(BULK))
+    bulk1 = sender.channel(1)
+    bulk2 = sender.channel(2)
+    requests = sender.channel(3)
+    received = [0, 0, 0]
+    latency = []
+    held = 0
+    start = time.perf_counter()
+    end = start + seconds
+    next_request = start
+    next_slow = start
+    while True:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        # sender
+        for frame in arrived(back, now):
+            sender.frame_in(frame)
+        for c in (bulk1, bulk2):
+            if c.pending() < 2:
+                c.send(BULK)
+        if now >= next_request:
+            requests.send(request())
+            next_request += REQUEST_INTERVAL
+        sender.send(0)
+        # receiver: each channel read independently
+        for frame in arrived(line, now):
+            receiver.frame_in(frame)
+        held = max(held, sum(len(c.receive_queue)
+                             for c in receiver.channels.values()))
+        c = receiver.channels.get(1)
+        if c is not None and now >= next_slow and c.receive():
+            received[1] += 1
+            next_slow = now + SLOW_INTERVAL
+        c = receiver.channels.get(2)
+        while c is not None and c.receive():
+            received[2] += 1
+        c = receiver.channels.get(3)
+        while c is not None:
+            data = c.receive()
+            if data is None:
+                break
+            latency.append(now - struct.unpack('>d', data[:8])[0])
+        receiver.send(0)
+        time.sleep(0.0005)
+    line.close()
+    back.close()
+    report('Mux', received, latency, held, seconds)
+
+
+def run(seconds:float):
+    shared_fifo(seconds)
+    mux(seconds)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(float(sys.argv[1]))
+    else:
+        run(2.0)
@@ -0,0 +1,90 @@
+# Compression ratio and goodput benchmark
+#
+# Sends telemetry style records (JSON text, 80 to 160 bytes) through a
+# pair of CompressedLink objects (sender and receiver, no port) with:
+#
+#   stored          = compression not negotiated
+#   frame           = each frame compressed on its own
+#   frame + dict    = each frame compressed with preset dictionary
+#   stream          = compressor history kept across frames
+#   stream + dict   = stream mode with preset dictionary
+#   random + dict   = incompressible data (stored fallback)
+#
+# For each: ratio (payload bytes / line bytes), compress and decompress
+# CPU time per frame, and payload goodput on a full line at 9600 and
+# 64000 bits/s compared to the frame send time.
+#
+# usage: python compression_goodput.py [frame_count]
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgcompress import CompressedLink, build_dictionary
+
+
+def record(rng:random.Random, sequence:int) -> bytes:
+    return json.dumps({
+        'sequence': sequence,
+        'station': 'site-' + str(rng.randrange(20)),
+        'time': '2026-10-19T12:{:02d}:{:02d}.{:03d}Z'.format(
+            rng.randrange(60), rng.randrange(60), rng.randrange(1000)),
+        'temperature': round(rng.uniform(-10, 40), 2),
+        'pressure': round(rng.uniform(980, 1040), 1),
+        'status': rng.choice(['OK', 'OK', 'OK', 'WARN', 'ALARM']),
+        'battery': rng.randrange(100)}).encode()
+
+
+def measure(name:str, frames:list, dictionary:bytes, stream:bool,
+            compress:bool):
+    sender = CompressedLink(dictionary=dictionary, stream=stream,
+                            compress=compress)
+    receiver = CompressedLink(dictionary=dictionary, stream=stream,
+                              compress=compress)
+    sender.frame_in(receiver.offer())
+    receiver.frame_in(sender.offer())
+    start = time.perf_counter()
+    encoded = [sender.compress(frame) for frame in frames]
+    compress_time = time.perf_counter() - start
+    start = time.perf_counter()
+    decoded = [receiver.frame_in(frame) for frame in encoded]
+    decompress_time = time.perf_counter() - start
+    assert decoded == frames, 'decode failed'
+    count = len(frames)
+    ratio = sender.ratio()
+    line_bytes = sender.bytes_out / count
+    print(name)
+    print('  ratio            = ' + '{:.2f}'.format(ratio) +
+          ' (' + str(sender.stored) + ' frames stored)')
+    print('  compress         = ' + '{:.1f}'.format(compress_time / count * 1e6) + ' us/frame')
+    print('  decompress       = ' + '{:.1f}'.format(decompress_time / count * 1e6) + ' us/frame')
+    for bps in (9600, 64000):
+        print('  goodput {:5d}    = {:.0f} bits/s, frame send time {:.0f} us'.format(
+            bps, sender.goodput(bps), line_bytes * 8 / bps * 1e6))
+
+
+def run(frame_count:int):
+    rng = random.Random(1)
+    samples = [record(rng, i) for i in range(200)]
+    dictionary = build_dictionary(samples, 4096)
+    frames = [record(rng, i) for i in range(frame_count)]
+    average = sum(len(frame) for frame in frames) / frame_count
+    print(str(frame_count) + ' records, ' + '{:.0f}'.format(average) +
+          ' bytes average, dictionary ' + str(len(dictionary)) + ' bytes')
+    measure('stored', frames, b'', False, False)
+    measure('frame', frames, b'', False, True)
+    measure('frame + dict', frames, dictionary, False, True)
+    measure('stream', frames, b'', True, True)
+    measure('stream + dict', frames, dictionary, True, True)
+    noise = [os.urandom(len(frame)) for frame in frames]
+    measure('random + dict', noise, dictionary, False, True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run(5000)
@@ -0,0 +1,54 @@
+# HDLC FCS (CRC16/CRC32 CCITT) benchmark
+#
+# Reports MB/s for single frame FCS generation and for verification of a
+# batch of frames with mgcrc.check_frames() (NumPy slicing-by-8 path for
+# short CRC16 frames when NumPy is installed, one zlib.crc32 call per frame
+# for CRC32) and with a check_fcs() loop.
+#
+# usage: python crc.py [frame_size] [frame_count]
+
+import os
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import HDLC_CRC_16_CCITT, HDLC_CRC_32_CCITT
+import mgcrc
+
+
+def rate(size:int, elapsed:float) -> str:
+    return '{:.1f}'.format(size / elapsed / 1e6) + ' MB/s'
+
+
+def run(frame_size:int, frame_count:int):
+    data = [os.urandom(frame_size) for i in range(frame_count)]
+    total = frame_size * frame_count
+    if mgcrc.numpy is None:
+        print('NumPy not installed, batch uses check_fcs() per frame')
+
+    for crc_type, name in ((HDLC_CRC_16_CCITT, 'CRC16'),
+                           (HDLC_CRC_32_CCITT, 'CRC32')):
+        start = time.perf_counter()
+        frames = [mgcrc.append_fcs(d, crc_type) for d in data]
+        generate = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loop = [mgcrc.check_fcs(frame, crc_type) for frame in frames]
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = mgcrc.check_frames(frames, crc_type)
+        batched = time.perf_counter() - start
+
+        print(name + ' ' + str(frame_count) + ' frames of ' +
+              str(frame_size) + ' bytes')
+        print('  generate (append_fcs)   = ' + rate(total, generate))
+        print('  verify check_fcs() loop = ' + rate(total, single))
+        print('  verify check_frames()   = ' + rate(total, batched))
+        print('  all valid = ' + str(all(batch) and batch == loop))
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    args += [64, 20000][len(args):]
+    run(*args)
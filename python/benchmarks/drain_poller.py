@@ -0,0 +1,105 @@
+# Send queue drain benchmark
+#
+# Each of N ports repeatedly writes a block and waits until it has been
+# sent. Compared:
+#
+#   thread per port = each port waits in its own thread polling
+#                     transmit_count() with 5ms sleeps (the non-blocking
+#                     equivalent of Port.flush())
+#   DrainPoller = all ports driven from one asyncio task per port awaiting
+#                 DrainPoller.adrain(), one poller thread
+#
+# LinePort (see transmit_pacing.py) drains in real time at the line rate.
+# Detection lag = time from the queue actually emptying until the waiter
+# is released.
+#
+# usage: python drain_poller.py [ports] [blocks per port]
+
+import asyncio
+import random
+import sys
+import threading
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mghalfduplex import LatencyHistogram
+from mgtransmit import DrainPoller
+from transmit_pacing import LinePort
+
+RATE = 100224
+
+
+def empty_time(port) -> float:
+    # time driver queue of LinePort will be empty
+    return port._time + port._queued / port._byte_rate
+
+
+def thread_per_port(ports, sizes, histogram):
+    def sender(port, port_sizes):
+        for size in port_sizes:
+            port.write(bytes(size))
+            done = empty_time(port)
+            while port.transmit_count():
+                time.sleep(0.005)
+            histogram.add(time.perf_counter() - done)
+
+    threads = [threading.Thread(target=sender, args=(port, port_sizes))
+               for port, port_sizes in zip(ports, sizes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(threads)
+
+
+def drain_poller(ports, sizes, histogram):
+    poller = DrainPoller()
+
+    async def sender(port, port_sizes):
+        for size in port_sizes:
+            port.write(bytes(size))
+            done = empty_time(port)
+            await poller.adrain(port)
+            histogram.add(time.perf_counter() - done)
+
+    async def main():
+        await asyncio.gather(*[sender(port, port_sizes) for port, port_sizes
+                               in zip(ports, sizes)])
+
+    asyncio.run(main())
+    poller.close()
+    return 1
+
+
+def run(port_count:int, blocks:int):
+    random.seed(1)
+    sizes = [[random.randrange(100, 2000) for i in range(blocks)]
+             for j in range(port_count)]
+    for name, function in (('thread per port', thread_per_port),
+                           ('DrainPoller', drain_poller)):
+        ports = [LinePort(RATE) for i in range(port_count)]
+        histogram = LatencyHistogram()
+        start = time.perf_counter()
+        threads = function(ports, sizes, histogram)
+        elapsed = time.perf_counter() - start
+        ioctls = sum(port.ioctls for port in ports)
+        for port in ports:
+            port.close()
+        print(name)
+        print('  ports = ' + str(port_count) + ', wait threads = ' +
+              str(threads) + ', elapsed = ' + '{:.2f}'.format(elapsed) + ' s')
+        print('  ioctls/drain = ' +
+              '{:.2f}'.format(ioctls / histogram.count))
+        print('  detection lag mean = ' +
+              '{:.2f}'.format(histogram.mean * 1000) + ' msec')
+        print('  detection lag max  = ' +
+              '{:.2f}'.format(histogram.max * 1000) + ' msec')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(int(sys.argv[1]), int(sys.argv[2]))
+    elif len(sys.argv) > 1:
+        run(int(sys.argv[1]), 20)
+    else:
+        run(16, 20)
@@ -0,0 +1,155 @@
+# Reed-Solomon FEC encode/decode throughput benchmark
+#
+# Measures FecEncoder.encode() and FecDecoder.decode() throughput in data
+# bytes/second for RS(255, 223) interleaved to depth 8, with and without
+# NumPy, for:
+#
+#   clean = no errors (syndrome check only)
+#   burst = one burst of depth * nsym / 2 bytes per block (every
+#           codeword corrected)
+#
+# Compare the results with the line rate: FEC must keep up with the
+# receive data rate.
+#
+# Before timing, each decoder is checked to correct errors at depth 1 with
+# bytes and bytearray blocks without changing the block passed in, and the
+# FecEncoder.write() stream (sync + block units) is passed through the RAW
+# receive path: idle bytes in front, shifted by 3 bits, errors in every
+# block and one corrupted sync pattern, read in 1000 byte pieces by
+# FecDecoder.read() with mgsync.SyncHunter.
+#
+# usage: python fec_throughput.py [block_count]
+
+import os
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+import mgfec
+from mgapi import Port
+from mgfec import FecDecoder, FecEncoder, ReedSolomon
+from mgsync import SyncHunter
+
+NUMPY = mgfec.numpy
+
+
+def check(codec:ReedSolomon):
+    # depth 1 correction, block passed in must not change
+    encoder = FecEncoder(codec=codec, depth=1)
+    decoder = FecDecoder(codec=codec, depth=1)
+    data = os.urandom(encoder.data_size)
+    block = bytearray(encoder.encode(data))
+    for i in range(10, 10 + codec.nsym // 2):
+        block[i] ^= 0x5a
+    for damaged in (bytes(block), bytearray(block)):
+        copy = bytes(damaged)
+        assert decoder.decode(damaged) == (data, True), 'depth 1 decode failed'
+        assert damaged == copy, 'decode changed block'
+
+
+class StreamPort(Port):
+    """Port recording writes and returning reads from a byte stream."""
+
+    def __init__(self):
+        super().__init__('stream')
+        self.written = bytearray()
+        self.stream = b''
+        self._pos = 0
+
+    def __del__(self):
+        pass
+
+    def write(self, buf) -> bool:
+        self.written += buf
+        return True
+
+    def read(self, size:int=None):
+        if self._pos >= len(self.stream):
+            return None
+        buf = self.stream[self._pos:self._pos + min(size, 1000)]
+        self._pos += len(buf)
+        return buf
+
+
+def check_raw(codec:ReedSolomon):
+    # written units through SyncHunter and FecDecoder.read()
+    port = StreamPort()
+    port._settings.sync_pattern = 0x67986798
+    encoder = FecEncoder(port, codec=codec, depth=2)
+    data = os.urandom(encoder.data_size * 10)
+    encoder.write(data)
+    stream = bytearray(port.written)
+    unit_size = len(encoder.sync) + encoder.block_size
+    for i in range(10):
+        start = i * unit_size + len(encoder.sync)
+        for j in range(start + 5, start + 5 + codec.nsym):
+            stream[j] ^= 0xa5
+    # sync of block 4 corrupted: rest of that read lost, hunt finds a
+    # later block
+    stream[4 * unit_size:4 * unit_size + len(encoder.sync)] = \
+        bytes(len(encoder.sync))
+    value = int.from_bytes(b'\xff' * 7 + stream, 'little') << 3 | 0x5
+    port.stream = value.to_bytes(len(stream) + 8, 'little')
+    decoder = FecDecoder(port, codec=codec, depth=2,
+                         hunter=SyncHunter(encoder.sync))
+    blocks = []
+    while True:
+        result = decoder.read()
+        if result is None:
+            break
+        blocks.append(result)
+    size = encoder.data_size
+    expected = [(data[i * size:(i + 1) * size], True) for i in range(10)]
+    assert blocks[:4] == expected[:4] and blocks[-3:] == expected[-3:] and \
+        all(block in expected[5:] for block in blocks[4:]), \
+        'RAW receive path failed'
+    assert decoder.sync_errors == 1, 'sync error not detected'
+
+
+def measure(block_count:int, codec:ReedSolomon):
+    check(codec)
+    check_raw(codec)
+    encoder = FecEncoder(codec=codec)
+    decoder = FecDecoder(codec=codec)
+    data = os.urandom(encoder.data_size * block_count)
+    start = time.perf_counter()
+    encoded = encoder.encode(data)
+    elapsed = time.perf_counter() - start
+    print('  encode        = ' + '{:.2f}'.format(len(data) / elapsed / 1e6) + ' MB/s')
+    blocks = [bytes(encoded[i:i + encoder.block_size])
+              for i in range(0, len(encoded), encoder.block_size)]
+    burst = encoder.depth * codec.nsym // 2
+    damaged = []
+    for block in blocks:
+        block = bytearray(block)
+        for i in range(100, 100 + burst):
+            block[i] ^= 0x5a
+        damaged.append(bytes(block))
+    for name, test in (('clean', blocks), ('burst', damaged)):
+        start = time.perf_counter()
+        out = b''.join(decoder.decode(block)[0] for block in test)
+        elapsed = time.perf_counter() - start
+        assert out == data, 'decode failed'
+        print('  decode ' + name + '  = ' + '{:.2f}'.format(len(data) / elapsed / 1e6) + ' MB/s')
+    print('  corrected codewords = ' + str(decoder.corrected_codewords) +
+          ', corrected bytes = ' + str(decoder.corrected_bytes) +
+          ', uncorrectable = ' + str(decoder.uncorrectable))
+
+
+def run(block_count:int):
+    codec = ReedSolomon(32, 255)
+    print('RS(255, 223) depth 8, ' + str(block_count) + ' blocks')
+    if NUMPY is not None:
+        print('NumPy')
+        measure(block_count, codec)
+    print('pure Python')
+    mgfec.numpy = None
+    measure(block_count, codec)
+    mgfec.numpy = NUMPY
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run(50)
@@ -0,0 +1,71 @@
+# Fragmentation and reassembly benchmark
+#
+# Sends 1MB messages through mgfragment.Fragmenter with a range of frame
+# sizes and rebuilds them with Reassembler. Reported per frame size:
+#
+#   MB/s = fragment + reassemble processing rate (SimPort, no hardware)
+#   frames/MB = port writes (system calls) per MB
+#   line use = message bytes / bytes on line (frame + 2 byte FCS + flag,
+#              bit stuffing ignored)
+#
+# A final run drops one frame to show loss detection.
+#
+# usage: python fragment_sizes.py [message_count]
+
+import os
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from simport import SimPort
+from mgfragment import Fragmenter, Reassembler
+
+MESSAGE_SIZE = 0x100000
+FRAME_OVERHEAD = 3  # FCS + flag
+
+
+def run(message_count:int):
+    messages = [os.urandom(MESSAGE_SIZE) for i in range(message_count)]
+    for frame_size in (256, 512, 1024, 2048, 4096):
+        port = SimPort()
+        fragmenter = Fragmenter(port, frame_size)
+        reassembler = Reassembler(max_size=MESSAGE_SIZE)
+        start = time.perf_counter()
+        for message in messages:
+            fragmenter.send(message)
+        received = []
+        for frame in port.written:
+            message = reassembler.frame_in(frame)
+            if message is not None:
+                received.append(bytes(message))
+        elapsed = time.perf_counter() - start
+        assert received == messages
+        line_bytes = sum(len(frame) + FRAME_OVERHEAD for frame in port.written)
+        megabytes = message_count * MESSAGE_SIZE / 0x100000
+        print('frame_size = ' + str(frame_size))
+        print('  MB/s      = ' + '{:.1f}'.format(megabytes / elapsed))
+        print('  frames/MB = ' + '{:.0f}'.format(port.writes / megabytes))
+        print('  line use  = ' + '{:.2f}'.format(
+            message_count * MESSAGE_SIZE * 100 / line_bytes) + '%')
+
+    # drop one frame of first message
+    port = SimPort()
+    fragmenter = Fragmenter(port)
+    reassembler = Reassembler(max_size=MESSAGE_SIZE)
+    for message in messages[:2]:
+        fragmenter.send(message)
+    del port.written[10]
+    received = []
+    for frame in port.written:
+        message = reassembler.frame_in(frame)
+        if message is not None:
+            received.append(bytes(message))
+    print('one frame dropped: messages received = ' + str(len(received)) +
+          ', lost = ' + str(reassembler.lost))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run(8)
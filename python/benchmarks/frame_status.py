@@ -0,0 +1,59 @@
+# HDLC_CRC_RETURN_EX frame status benchmark
+#
+# Compares a plain loop slicing off the status trailer (one copy per
+# frame) with FrameStatusDecoder.partition() (frames sorted as read, no
+# copy, data is memoryview(frame)[:len(frame) - trailer_size]) on frames
+# of data + CRC16 FCS + status byte as returned by Port.read() when
+# Settings.discard_data_with_error = False.
+#
+# usage: python frame_status.py [frame_size] [frame_count]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import FrameStatusDecoder, HDLC_CRC_16_CCITT, \
+    HDLC_CRC_RETURN_EX, RX_OK, RX_CRC_ERROR
+
+
+def slicing_partition(frames):
+    good = []
+    bad = []
+    for frame in frames:
+        if frame[-1] == RX_OK:
+            good.append(frame[:-3])
+        else:
+            bad.append(frame[:-3])
+    return good, bad
+
+
+def run(frame_size:int, frame_count:int):
+    frames = []
+    for i in range(frame_count):
+        status = RX_CRC_ERROR if i % 100 == 0 else RX_OK
+        frames.append(bytes(frame_size) + b'\x12\x34' + bytes([status]))
+
+    start = time.perf_counter()
+    good, bad = slicing_partition(frames)
+    elapsed = time.perf_counter() - start
+    print('slicing loop ' + str(frame_size) + ' byte frames')
+    print('  good/bad  = ' + str(len(good)) + '/' + str(len(bad)))
+    print('  frames/s  = ' + '{:.0f}'.format(frame_count / elapsed))
+
+    decoder = FrameStatusDecoder(HDLC_CRC_16_CCITT | HDLC_CRC_RETURN_EX)
+    start = time.perf_counter()
+    good, bad, status = decoder.partition(frames)
+    elapsed = time.perf_counter() - start
+    print('FrameStatusDecoder.partition() ' + str(frame_size) + ' byte frames')
+    print('  good/bad  = ' + str(len(good)) + '/' + str(len(bad)))
+    print('  frames/s  = ' + '{:.0f}'.format(frame_count / elapsed))
+
+
+if __name__ == '__main__':
+    frame_size = 1024
+    frame_count = 100000
+    if len(sys.argv) > 1:
+        frame_size = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        frame_count = int(sys.argv[2])
+    run(frame_size, frame_count)
@@ -0,0 +1,100 @@
+# Half-duplex request/response benchmark
+#
+# Compares the turnaround sequence of samples/2wire.py run_primary()
+# (Port.rts, disable_receiver(), write(), flush(), rts, enable_receiver(),
+# read()) with mghalfduplex.HalfDuplexLink, with and without auto_rts.
+# Responses are read without a timeout, as in the sample.
+#
+# A pseudo terminal stands in for the serial port so every ioctl and drain
+# is a real system call (SyncLink specific ioctls fail on a pty but cost
+# the same call overhead). A thread on the other side of the pty answers
+# each request.
+#
+# usage: python half_duplex.py [exchanges]
+
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import Port
+from mghalfduplex import HalfDuplexLink, LatencyHistogram
+
+REQUEST = bytes(16)
+RESPONSE = bytes(8)
+
+
+class PtyPort(Port):
+    """Port using pseudo terminal master instead of SyncLink device."""
+
+    def __init__(self, fd:int):
+        super().__init__('pty')
+        self._fd = fd
+
+    def __del__(self):
+        pass
+
+
+def responder(fd:int, count:int):
+    for i in range(count):
+        received = 0
+        while received < len(REQUEST):
+            received += len(os.read(fd, 4096))
+        os.write(fd, RESPONSE)
+
+
+# exchange from samples/2wire.py run_primary()
+def sample_exchange(port, buf):
+    port.rts = True
+    port.disable_receiver()
+    port.write(buf)
+    port.flush()
+    port.rts = False
+    port.enable_receiver()
+    return port.read(len(RESPONSE))
+
+
+def run(count:int):
+    for name in ('samples/2wire.py exchange', 'HalfDuplexLink',
+                 'HalfDuplexLink auto_rts'):
+        master, slave = pty.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        port = PtyPort(master)
+        thread = threading.Thread(target=responder, args=(slave, count))
+        thread.start()
+        histogram = LatencyHistogram()
+        if name == 'samples/2wire.py exchange':
+            for i in range(count):
+                start = time.perf_counter()
+                sample_exchange(port, REQUEST)
+                histogram.add(time.perf_counter() - start)
+        else:
+            # auto_rts as if configured in port settings
+            port._settings.auto_rts = name.endswith('auto_rts')
+            link = HalfDuplexLink(port)
+            for i in range(count):
+                link.exchange(REQUEST)
+            histogram = link.latency
+        thread.join()
+        os.close(master)
+        os.close(slave)
+        print(name)
+        print('  exchanges/s  = ' + '{:.0f}'.format(count / histogram.total))
+        print('  mean latency = ' +
+              '{:.1f}'.format(histogram.mean * 1000000) + ' usec')
+        print('  99% latency <= ' +
+              '{:.0f}'.format(histogram.percentile(99) * 1000000) + ' usec')
+        if name != 'samples/2wire.py exchange':
+            print('  mean turnaround = ' +
+                  '{:.1f}'.format(link.turnaround.mean * 1000000) + ' usec')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run(5000)
@@ -0,0 +1,110 @@
+# HDLC message aggregation benchmark
+#
+# Sends random 10 to 40 byte messages one per HDLC frame (Port.write() per
+# message) and packed by mgaggregate.Aggregator into max_data_size frames.
+# Reported:
+#
+#   send messages/s = sending through a pseudo terminal (real write system
+#                     calls, a thread discards the data)
+#   receive messages/s = splitting received frames (Deaggregator)
+#   syscalls/message = port writes per message
+#   line use = message bytes / bytes on line (frame data + 2 byte FCS +
+#              1 flag per frame, bit stuffing ignored)
+#   messages/s at line rate = capacity of a 64 kbit/s line
+#
+# usage: python hdlc_aggregate.py [message_count]
+
+import os
+import pty
+import random
+import sys
+import threading
+import time
+import tty
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import Port
+from simport import SimPort
+from mgaggregate import Aggregator, Deaggregator
+
+FRAME_OVERHEAD = 3  # FCS + flag
+LINE_RATE = 64000
+
+
+class PtyPort(Port):
+    """Port using pseudo terminal master instead of SyncLink device."""
+
+    def __init__(self, fd:int):
+        super().__init__('pty')
+        self._fd = fd
+
+    def __del__(self):
+        pass
+
+
+def discard(fd:int):
+    while True:
+        try:
+            os.read(fd, 65536)
+        except OSError:
+            return
+
+
+def send(port, messages, aggregate:bool):
+    if aggregate:
+        aggregator = Aggregator(port, delay=None)
+        aggregator.add_messages(messages)
+        aggregator.flush()
+    else:
+        for message in messages:
+            port.write(message)
+
+
+def run(message_count:int):
+    random.seed(1)
+    messages = [bytes([i & 0xff]) * random.randrange(10, 41)
+                for i in range(message_count)]
+    message_bytes = sum(len(message) for message in messages)
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    thread = threading.Thread(target=discard, args=(slave,), daemon=True)
+    thread.start()
+    for name in ('frame per message', 'Aggregator'):
+        aggregate = name == 'Aggregator'
+        start = time.perf_counter()
+        send(PtyPort(master), messages, aggregate)
+        send_elapsed = time.perf_counter() - start
+        # frames as received
+        port = SimPort()
+        send(port, messages, aggregate)
+        start = time.perf_counter()
+        if aggregate:
+            deaggregator = Deaggregator()
+            received = []
+            for frame in port.written:
+                received += deaggregator.messages_in(frame)
+        else:
+            received = [memoryview(frame) for frame in port.written]
+        receive_elapsed = time.perf_counter() - start
+        assert len(received) == message_count and \
+            bytes(received[-1]) == messages[-1]
+        line_bytes = sum(len(frame) + FRAME_OVERHEAD for frame in port.written)
+        print(name)
+        print('  send messages/s    = ' +
+              '{:.0f}'.format(message_count / send_elapsed))
+        print('  receive messages/s = ' +
+              '{:.0f}'.format(message_count / receive_elapsed))
+        print('  syscalls/message   = ' +
+              '{:.4f}'.format(port.writes / message_count))
+        print('  line use           = ' +
+              '{:.1f}'.format(message_bytes * 100 / line_bytes) + '%')
+        print('  messages/s at ' + str(LINE_RATE) + ' bps = ' +
+              '{:.0f}'.format(LINE_RATE / 8 * message_count / line_bytes))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run(200000)
@@ -0,0 +1,50 @@
+# Software HDLC (RAW mode) framing benchmark
+#
+# Encodes frames with mghdlc.HdlcEncoder, decodes the resulting bitstream
+# with mghdlc.HdlcDecoder in receive sized chunks, verifies the frames and
+# reports throughput in Mbit/s of serial line bits.
+#
+# usage: python hdlc_soft.py [frame_size] [frame_count] [read_size]
+
+import os
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import Port
+from mghdlc import HdlcEncoder, HdlcDecoder
+
+
+def run(frame_size:int, frame_count:int, read_size:int):
+    frames = [os.urandom(frame_size) for i in range(frame_count)]
+
+    for crc, name in ((Port.CRC16, 'CRC16'), (Port.CRC32, 'CRC32')):
+        encoder = HdlcEncoder(crc)
+        start = time.perf_counter()
+        stream = encoder.encode_frames(frames) + encoder.flush()
+        encode_time = time.perf_counter() - start
+
+        decoder = HdlcDecoder(crc, max_frame_size=frame_size + 4)
+        received = []
+        start = time.perf_counter()
+        for i in range(0, len(stream), read_size):
+            received += decoder.decode(stream[i:i + read_size])
+        decode_time = time.perf_counter() - start
+
+        line_bits = len(stream) * 8
+        print(name + ' ' + str(frame_count) + ' frames of ' +
+              str(frame_size) + ' bytes (' + str(len(stream)) +
+              ' line bytes, ' + '{:.1f}'.format(
+                  100 * (len(stream) / (frame_size * frame_count) - 1)) +
+              '% flag/FCS/stuffing overhead)')
+        print('  encode = ' + '{:.2f}'.format(line_bits / encode_time / 1e6) +
+              ' Mbit/s')
+        print('  decode = ' + '{:.2f}'.format(line_bits / decode_time / 1e6) +
+              ' Mbit/s')
+        print('  frames verified = ' + str(received == frames))
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    args += [256, 2000, 4096][len(args):]
+    run(*args)
@@ -0,0 +1,146 @@
+# LAPB sliding window benchmark
+#
+# Two mglapb.LapbLink objects exchange I frames over a simulated full
+# duplex line with a line rate, one way propagation delay and random
+# frame loss. The simulation runs on a virtual clock, so results do not
+# depend on machine speed. One side sends FRAME_COUNT information frames,
+# the other side checks in order delivery and acknowledges.
+#
+# goodput = information bits delivered in order / (line rate * time)
+#
+# Window 1 is stop and wait (samples/2wire.py style exchange).
+#
+# usage: python lapb_window.py [frame_count] [loss percent]
+
+import heapq
+import random
+import sys
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mglapb import LapbLink
+
+LINE_RATE = 64000
+DELAY = 0.25  # one way, geostationary satellite hop
+INFO_SIZE = 256
+FRAME_OVERHEAD = 4  # flag + FCS, bit stuffing ignored
+
+
+class Line():
+    """Full duplex line simulation on a virtual clock."""
+
+    def __init__(self, rate:int, delay:float, loss:float):
+        self.rate = rate
+        self.delay = delay
+        self.loss = loss
+        self.now = 0.0
+        self._events = []  # (arrival time, order, destination, frame)
+        self._order = 0
+
+    def clock(self) -> float:
+        return self.now
+
+    def port(self):
+        return LinePort(self)
+
+    def send(self, source, frame):
+        # frames serialized per direction at line rate
+        start = max(self.now, source.busy_until)
+        source.busy_until = start + \
+            (len(frame) + FRAME_OVERHEAD) * 8 / self.rate
+        if random.random() < self.loss:
+            return
+        self._order += 1
+        heapq.heappush(self._events, (source.busy_until + self.delay,
+                                      self._order, source.peer, frame))
+
+    def next_event(self) -> float:
+        return self._events[0][0] if self._events else None
+
+    def deliver(self):
+        # deliver frames arriving at current time
+        events = self._events
+        while events and events[0][0] <= self.now:
+            arrival, order, port, frame = heapq.heappop(events)
+            port.link.frame_in(frame)
+
+
+class LinePort():
+    """One end of a simulated Line (write only, frames delivered to peer)."""
+
+    def __init__(self, line:Line):
+        self.line = line
+        self.busy_until = 0.0
+        self.peer = None
+        self.link = None
+
+    def write(self, buf) -> bool:
+        self.line.send(self, bytes(buf))
+        return True
+
+
+def simulate(window:int, modulo:int, selective:bool, loss:float,
+             frame_count:int) -> tuple:
+    random.seed(1)
+    line = Line(LINE_RATE, DELAY, loss)
+    a = line.port()
+    b = line.port()
+    a.peer = b
+    b.peer = a
+    expected = [0]
+
+    def check(info):
+        assert int.from_bytes(info[:4], 'big') == expected[0], \
+            'out of order delivery'
+        expected[0] += 1
+
+    a.link = LapbLink(a, modulo, window, dte=True, selective=selective,
+                      clock=line.clock)
+    b.link = LapbLink(b, modulo, window, dte=False, selective=selective,
+                      handler=check, clock=line.clock)
+    a.link.connect()
+    for i in range(frame_count):
+        a.link.send(i.to_bytes(4, 'big') + bytes(INFO_SIZE - 4))
+    start = None
+    while expected[0] < frame_count:
+        if start is None and a.link.connected:
+            start = line.now
+        waits = [w for w in (a.link.service(), b.link.service())
+                 if w is not None]
+        event = line.next_event()
+        times = [line.now + w for w in waits]
+        if event is not None:
+            times.append(event)
+        line.now = max(min(times), line.now + 1e-9)
+        line.deliver()
+    # time until last frame delivered
+    elapsed = line.now - start
+    goodput = frame_count * INFO_SIZE * 8 / (LINE_RATE * elapsed)
+    return goodput, a.link.retransmits, a.link.timeouts
+
+
+def run(frame_count:int, loss:float):
+    print('line ' + str(LINE_RATE) + ' bps, one way delay ' +
+          str(DELAY) + ' s, ' + str(INFO_SIZE) + ' byte I frames, loss ' +
+          '{:g}'.format(loss * 100) + '%')
+    for modulo, selective, windows in ((8, False, (1, 2, 4, 7)),
+                                       (128, False, (16, 32, 64, 127)),
+                                       (128, True, (16, 32, 64))):
+        name = 'modulo ' + str(modulo) + (' SREJ' if selective else ' REJ')
+        for window in windows:
+            goodput, retransmits, timeouts = simulate(
+                window, modulo, selective, loss, frame_count)
+            print('  ' + name + ' window ' + '{:>3d}'.format(window) +
+                  ': goodput = ' + '{:5.1f}'.format(goodput * 100) + '%' +
+                  ', retransmits = ' + str(retransmits) +
+                  ', timeouts = ' + str(timeouts))
+
+
+if __name__ == '__main__':
+    frame_count = 1000
+    if len(sys.argv) > 1:
+        frame_count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        run(frame_count, float(sys.argv[2]) / 100)
+    else:
+        run(frame_count, 0.0)
+        run(frame_count, 0.01)
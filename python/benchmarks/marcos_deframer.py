@@ -0,0 +1,76 @@
+# marcos SerialProtocolPort receive benchmark
+#
+# Compares the slicing receive loop previously used by
+# marcos_test_rs422/marcos_test_protocol_bisync.py with
+# marcos_protocol.PacketDeframer on the same receive stream of
+# 0x00 + 64 byte packet + 0x00 frames separated by idle (0xFF) bytes.
+#
+# usage: python marcos_deframer.py [packet_count] [read_size]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+sys.path.append('../marcos_test_rs422')
+from marcos_protocol import PacketDeframer
+
+HEADER = bytes(range(0xFF, 0xFF - 16 * 0x11, -0x11))
+DATA = bytes([(i // 3) * 0x11 for i in range(48)])
+IDLE_SIZE = 8
+
+
+# previous receive_data() loop from marcos_test_protocol_bisync.py
+def slicing_receive(chunks):
+    buffer = bytearray()
+    for data in chunks:
+        buffer.extend(data)
+        while len(buffer) >= 64:
+            start_index = buffer.find(0x00)
+            if start_index == -1:
+                buffer = bytearray()
+                break
+            if start_index + 66 > len(buffer):
+                break
+            end_index = start_index + 65
+            if buffer[end_index] == 0x00:
+                packet = buffer[start_index + 1 : start_index + 65]
+                header = packet[:16]
+                data = packet[16:]
+                yield header, data
+                buffer = buffer[end_index + 1:]
+            else:
+                buffer = buffer[start_index + 1:]
+
+
+def deframer_receive(chunks):
+    deframer = PacketDeframer()
+    for data in chunks:
+        yield from deframer.packets_in(data)
+
+
+def run(packet_count:int, read_size:int):
+    packet = bytes([0]) + HEADER + DATA + bytes([0]) + b'\xff' * IDLE_SIZE
+    stream = packet * packet_count
+    chunks = [stream[i:i + read_size]
+              for i in range(0, len(stream), read_size)]
+
+    for name, receive in (('slicing receive loop', slicing_receive),
+                          ('PacketDeframer', deframer_receive)):
+        count = 0
+        start = time.perf_counter()
+        for header, data in receive(chunks):
+            count += 1
+        elapsed = time.perf_counter() - start
+        print(name + ' (read size ' + str(read_size) + ')')
+        print('  packets   = ' + str(count) + ' of ' + str(packet_count))
+        print('  packets/s = ' + '{:.0f}'.format(count / elapsed))
+
+
+if __name__ == '__main__':
+    packet_count = 200000
+    read_size = 4096
+    if len(sys.argv) > 1:
+        packet_count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        read_size = int(sys.argv[2])
+    run(packet_count, read_size)
@@ -0,0 +1,71 @@
+# marcos SerialProtocolPort transmit benchmark
+#
+# Compares building each packet by concatenation (previous send_data())
+# with marcos_protocol.PacketTemplate filled in place, sent one packet per
+# write and as contiguous batches with one write per batch.
+#
+# usage: python marcos_transmit.py [packet_count] [batch_size]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+sys.path.append('../marcos_test_rs422')
+from simport import SimPort
+from marcos_protocol import PacketTemplate
+
+HEADER = bytes(range(0xFF, 0xFF - 16 * 0x11, -0x11))
+DATA = bytes([(i // 3) * 0x11 for i in range(48)])
+
+
+def concatenate(port, packet_count, batch_size):
+    for i in range(packet_count):
+        if len(HEADER) != 16 or len(DATA) != 48:
+            raise ValueError("Invalid packet size")
+        packet = bytearray([0]) + HEADER + DATA + bytearray([0])
+        port.write(packet)
+
+
+def template_single(port, packet_count, batch_size):
+    template = PacketTemplate()
+    view = template.view(1)
+    for i in range(packet_count):
+        template.set(0, HEADER, DATA)
+        port.write(view)
+
+
+def template_batch(port, packet_count, batch_size):
+    template = PacketTemplate(count=batch_size)
+    count = 0
+    for i in range(packet_count):
+        template.set(count, HEADER, DATA)
+        count += 1
+        if count == batch_size:
+            port.write(template.view(count))
+            count = 0
+    if count:
+        port.write(template.view(count))
+
+
+def run(packet_count:int, batch_size:int):
+    for name, send in (('concatenate + write per packet', concatenate),
+                       ('template + write per packet', template_single),
+                       ('template batch of ' + str(batch_size), template_batch)):
+        port = SimPort(record=False)
+        start = time.perf_counter()
+        send(port, packet_count, batch_size)
+        elapsed = time.perf_counter() - start
+        print(name)
+        print('  packets/s       = ' + '{:.0f}'.format(packet_count / elapsed))
+        print('  writes/packet   = ' +
+              '{:.3f}'.format(port.writes / packet_count))
+
+
+if __name__ == '__main__':
+    packet_count = 200000
+    batch_size = 32
+    if len(sys.argv) > 1:
+        packet_count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        batch_size = int(sys.argv[2])
+    run(packet_count, batch_size)
@@ -0,0 +1,124 @@
+# Multilink bundle benchmark
+#
+# Sends 1024 byte frames as fast as the ports accept them for a number of
+# seconds over:
+#
+#   1 port                  = single port baseline
+#   4 ports, Bundle         = 4 equal rate ports
+#   mixed rates, round robin = frames sent to each port in turn, waiting
+#                              for that port when its queue is full
+#   mixed rates, Bundle     = frames sent by queue depth and line rate
+#
+# BundlePort (LinePort from transmit_pacing.py) drains queued data in real
+# time at the line rate and records the time each frame finishes sending.
+# Frames from all ports are then passed to a Resequencer in order of
+# arrival (virtual clock = arrival time) to measure in order throughput
+# and resequencing buffer use.
+#
+# Before timing, Resequencer is checked to give up missing frames when a
+# frame arrives window or more frames ahead.
+#
+# usage: python multilink_bundle.py [seconds]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgbundle import Bundle, Resequencer
+from transmit_pacing import LinePort
+
+DATA_SIZE = 1024
+RATE = 1000000
+
+
+class BundlePort(LinePort):
+    """LinePort recording (arrival time, frame) for each write."""
+
+    def __init__(self, rate:int):
+        super().__init__(rate)
+        self.arrivals = []
+
+    def write(self, buf) -> bool:
+        result = super().write(buf)
+        self.arrivals.append((self._time + self._queued / self._byte_rate,
+                              bytes(buf)))
+        return result
+
+
+def check():
+    # frame far ahead: frames before it given up, held frames delivered
+    resequencer = Resequencer(window=4)
+    assert resequencer.frame_in(0, b'a') == [b'a']
+    assert resequencer.frame_in(10, b'k') == [b'k']
+    assert resequencer.lost == 9
+    resequencer = Resequencer(window=4)
+    resequencer.frame_in(0, b'a')
+    resequencer.frame_in(2, b'c')
+    assert resequencer.frame_in(9, b'j') == [b'c', b'j']
+    assert resequencer.lost == 7 and not resequencer._held
+
+
+def round_robin(ports:list, rates:list, data:bytes, limit:int,
+                end:float) -> list:
+    # frames with Bundle header sent to each port in turn
+    frames = [0] * len(ports)
+    index = 0
+    sequence = 0
+    size = len(data) + 2
+    while time.perf_counter() < end:
+        port = ports[index]
+        excess = port.transmit_count() + size - limit
+        if excess > 0:
+            time.sleep(excess * 8 / rates[index])
+        port.write(bytes([sequence >> 8, sequence & 0xff]) + data)
+        frames[index] += 1
+        sequence = (sequence + 1) & 0xffff
+        index = (index + 1) % len(ports)
+    return frames
+
+
+def run(seconds:float):
+    check()
+    data = bytes(DATA_SIZE)
+    tests = (('1 port', [RATE], False),
+             ('4 ports, Bundle', [RATE] * 4, False),
+             ('mixed rates, round robin', [RATE, RATE, RATE // 4, RATE // 4], True),
+             ('mixed rates, Bundle', [RATE, RATE, RATE // 4, RATE // 4], False))
+    for name, rates, fixed_order in tests:
+        ports = [BundlePort(rate) for rate in rates]
+        bundle = Bundle(ports)
+        start = time.perf_counter()
+        end = start + seconds
+        if fixed_order:
+            frames = round_robin(ports, rates, data, bundle.limit, end)
+        else:
+            while time.perf_counter() < end:
+                bundle.send(data)
+            frames = bundle.frames
+        arrivals = sorted(arrival for port in ports
+                          for arrival in port.arrivals)
+        for port in ports:
+            port.close()
+        now = [start]
+        resequencer = Resequencer(window=64, timeout=0.05,
+                                  clock=lambda: now[0])
+        delivered = 0
+        for arrival, frame in arrivals:
+            if arrival > end:
+                break
+            now[0] = arrival
+            delivered += len(resequencer.frame_in(frame[0] << 8 | frame[1],
+                                                  frame[2:]))
+        print(name + ' (' + '{:.2f}'.format(sum(rates) / 1e6) + ' Mbit/s total)')
+        print('  in order throughput = ' + '{:.3f}'.format(
+            delivered * DATA_SIZE * 8 / seconds / 1e6) + ' Mbit/s')
+        print('  frames per port     = ' + str(frames))
+        print('  max held            = ' + str(resequencer.max_held) +
+              ' frames, lost = ' + str(resequencer.lost))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(float(sys.argv[1]))
+    else:
+        run(2.0)
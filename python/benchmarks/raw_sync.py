@@ -0,0 +1,75 @@
+# RAW mode software sync hunt benchmark
+#
+# Measures mgsync.SyncHunter hunt rate (random data without the sync
+# pattern) and realign rate (locked at a non zero bit offset) in
+# Mbit/s for comparison with the serial line rate. Both the NumPy and
+# regular expression hunt are measured if NumPy is installed.
+#
+# usage: python raw_sync.py [read_size] [megabytes]
+
+import os
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+import mgsync
+from mgsync import SyncHunter
+
+PATTERN = 0x1acffc1d
+BITS = 32
+
+
+def run(read_size:int, size:int):
+    data = bytearray(os.urandom(size))
+    # remove chance occurrences of pattern
+    hunter = SyncHunter(PATTERN, BITS)
+    while True:
+        hunter.hunt()
+        if not hunter.receive(bytes(data)) and not hunter.locked:
+            break
+        # flip a byte holding the last pattern bits
+        if hunter.bit_offset:
+            data[hunter.discarded_bytes] ^= 0xff
+        else:
+            data[hunter.discarded_bytes - 1] ^= 0xff
+    data = bytes(data)
+    chunks = [data[i:i + read_size] for i in range(0, size, read_size)]
+
+    methods = ['regex']
+    if mgsync.numpy is not None:
+        methods.insert(0, 'numpy')
+    numpy = mgsync.numpy
+    for method in methods:
+        if method == 'regex':
+            mgsync.numpy = None
+        hunter = SyncHunter(PATTERN, BITS)
+        start = time.perf_counter()
+        for chunk in chunks:
+            hunter.receive(chunk)
+        elapsed = time.perf_counter() - start
+        print('hunt (' + method + ', read size ' + str(read_size) + ')')
+        print('  locked = ' + str(hunter.locked))
+        print('  Mbit/s = ' + '{:.1f}'.format(size * 8 / elapsed / 1e6))
+    mgsync.numpy = numpy
+
+    # sync pattern ending 3 bits into the first byte
+    hunter = SyncHunter(PATTERN, BITS)
+    first = (PATTERN << 3 | 0x7).to_bytes(5, 'little')
+    hunter.receive(first)
+    start = time.perf_counter()
+    for chunk in chunks:
+        hunter.receive(chunk)
+    elapsed = time.perf_counter() - start
+    print('realign (bit offset ' + str(hunter.bit_offset) + ')')
+    print('  aligned bytes = ' + str(hunter.aligned_bytes))
+    print('  Mbit/s = ' + '{:.1f}'.format(size * 8 / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    read_size = 4096
+    size = 4
+    if len(sys.argv) > 1:
+        read_size = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        size = int(sys.argv[2])
+    run(read_size, size * 1000000)
@@ -0,0 +1,116 @@
+# SDLC primary poll cycle benchmark
+#
+# Polls simulated secondary stations answering after a random 1-3ms
+# response time, some of which never answer (dead). Compares a fixed
+# worst case response timeout for every poll (as a strict send/flush/
+# turnaround/read exchange must use) with mgsdlc.PollScheduler adaptive
+# per station timeouts and dead station backoff.
+#
+# Live secondaries are mgsdlc.SdlcStation objects in NRM with an I frame
+# queued for every poll, so polls must acknowledge their I frames (N(R))
+# or the stations send the same frames again at every checkpoint.
+#
+# Responses are delivered through a SOCK_SEQPACKET socket pair so the
+# scheduler waits on a real file descriptor.
+#
+# usage: python sdlc_poll.py [station_count] [dead_count] [cycles]
+
+import os
+import random
+import socket
+import sys
+import threading
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from simport import SimPort
+from mgsdlc import NRM, PollScheduler, SdlcStation
+
+FIXED_TIMEOUT = 0.05
+
+
+class LinePort(SimPort):
+    """SimPort with secondaries answering polls after a delay."""
+
+    def __init__(self, dead:set):
+        super().__init__(frames=[], record=False)
+        self._receive, self._send_side = \
+            socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._fd = self._receive.fileno()
+        self.dead = dead
+        self.stations = {}
+
+    def _respond(self, responses:list):
+        for response in responses:
+            self._send_side.send(response)
+
+    def write(self, buf) -> bool:
+        self.writes += 1
+        address = buf[0]
+        if address not in self.dead:
+            station = self.stations.get(address)
+            if station is None:
+                station = SdlcStation(address)
+                station.mode = NRM
+                self.stations[address] = station
+            station.send(bytes(32))
+            threading.Timer(random.uniform(0.001, 0.003), self._respond,
+                            (station.process(buf),)).start()
+        return True
+
+    def read(self, size:int=None) -> bytes:
+        self.reads += 1
+        return self._receive.recv(4096)
+
+
+def run(station_count:int, dead_count:int, cycles:int):
+    addresses = list(range(1, station_count + 1))
+    dead = set(random.sample(addresses, dead_count))
+    for name, options in (
+            ('fixed ' + str(int(FIXED_TIMEOUT * 1000)) + 'ms timeout',
+             dict(min_timeout=FIXED_TIMEOUT, max_timeout=FIXED_TIMEOUT,
+                  initial_timeout=FIXED_TIMEOUT, dead_after=1 << 30)),
+            ('PollScheduler adaptive',
+             dict(initial_timeout=FIXED_TIMEOUT))):
+        port = LinePort(dead)
+        received = [0]
+
+        def handler(secondary, frame):
+            if not frame[1] & 1:
+                received[0] += 1
+
+        scheduler = PollScheduler(port, handler, **options)
+        for address in addresses:
+            scheduler.add(address)
+        total = 0.0
+        for i in range(cycles):
+            total += scheduler.cycle()
+        print(name + ' (' + str(station_count) + ' stations, ' +
+              str(dead_count) + ' dead)')
+        print('  average cycle ms  = ' +
+              '{:.1f}'.format(total / cycles * 1000))
+        print('  last cycle ms     = ' +
+              '{:.1f}'.format(scheduler.cycle_time * 1000))
+        print('  responses/polls   = ' + str(scheduler.responses) + '/' +
+              str(scheduler.polls))
+        print('  timeouts, skipped = ' + str(scheduler.timeouts) + ', ' +
+              str(scheduler.skipped))
+        print('  syscalls/poll     = ' +
+              '{:.1f}'.format(port.syscalls / scheduler.polls))
+        stations = port.stations.values()
+        print('  I frames sent/received/retransmitted = ' +
+              str(sum(s.i_frames_sent for s in stations)) + '/' +
+              str(received[0]) + '/' +
+              str(sum(s.retransmits for s in stations)))
+
+
+if __name__ == '__main__':
+    station_count = 16
+    dead_count = 2
+    cycles = 30
+    if len(sys.argv) > 1:
+        station_count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        dead_count = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        cycles = int(sys.argv[3])
+    run(station_count, dead_count, cycles)
@@ -0,0 +1,68 @@
+# SDLC secondary station engine benchmark
+#
+# Replays a primary command stream to mgsdlc.SdlcEngine emulating many
+# secondary stations: SNRM to each station, then poll cycles sending each
+# station an I frame with the P bit set. Each station echoes received
+# information, so every poll is answered with an I frame.
+#
+# usage: python sdlc_stations.py [station_count] [cycles] [info_size]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from simport import SimPort
+from mgsdlc import SdlcEngine, SdlcStation, SNRM, i_control, u_control
+
+
+def echo(station, info):
+    station.send(bytes(info))
+
+
+def make_commands(addresses:list, cycles:int, info_size:int) -> list:
+    info = bytes(info_size)
+    frames = [bytes((address, u_control(SNRM, True)))
+              for address in addresses]
+    for k in range(cycles):
+        # station has sent k I frames: N(R) = k, next N(S) = k
+        control = i_control(k & 7, k & 7, True)
+        for address in addresses:
+            frames.append(bytes((address, control)) + info)
+    return frames
+
+
+def run(station_count:int, cycles:int, info_size:int):
+    addresses = list(range(1, station_count + 1))
+    frames = make_commands(addresses, cycles, info_size)
+    port = SimPort(frames=frames, record=False)
+    engine = SdlcEngine(port)
+    for address in addresses:
+        engine.add_station(SdlcStation(address, echo))
+    start = time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - start
+    received = sum(station.i_frames_received for station in engine.stations)
+    sent = sum(station.i_frames_sent for station in engine.stations)
+    errors = sum(station.sequence_errors + station.frmr_count
+                 for station in engine.stations)
+    print('SdlcEngine ' + str(station_count) + ' stations, ' +
+          str(info_size) + ' byte information')
+    print('  frames received = ' + str(engine.frames))
+    print('  I frames in/out = ' + str(received) + '/' + str(sent))
+    print('  errors          = ' + str(errors))
+    print('  frames/s        = ' + '{:.0f}'.format(engine.frames / elapsed))
+    print('  writes/frame    = ' +
+          '{:.2f}'.format(port.writes / engine.frames))
+
+
+if __name__ == '__main__':
+    station_count = 64
+    cycles = 1000
+    info_size = 32
+    if len(sys.argv) > 1:
+        station_count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        cycles = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        info_size = int(sys.argv[3])
+    run(station_count, cycles, info_size)
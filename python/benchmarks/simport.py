@@ -0,0 +1,114 @@
+# Simulated port used by the benchmarks in this directory.
+#
+# SimPort implements the subset of the mgapi Port interface used by the
+# protocol layers (read, write, flush, receiver/transmitter control,
+# transmit_count) without SyncLink hardware. Receive data is replayed from
+# a byte stream (N_TTY protocols) or a list of frames (N_HDLC protocols).
+# System calls the real Port would make are counted so benchmarks can
+# report syscalls per block/frame/message.
+
+import sys
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import Port
+
+
+class SimPort():
+    """Port stand-in that replays receive data and records writes."""
+
+    def __init__(self, stream:bytes=b'', frames:list=None, sync:bytes=None,
+                 record:bool=True):
+        """
+        stream = receive byte stream (N_TTY line discipline)
+        frames = list of receive frames (N_HDLC line discipline)
+        sync = sync pattern searched for by receiver hunt
+        record = keep copy of written data in written list
+        """
+        self._defaults = Port.Defaults()
+        self._settings = Port.Settings()
+        self._stream = stream
+        self._pos = 0
+        self._frames = frames
+        self._frame_index = 0
+        self._sync = sync
+        self._record = record
+        if frames is not None:
+            self._ldisc = Port.N_HDLC
+        else:
+            self._ldisc = Port.N_TTY
+        self.written = []
+        self.reads = 0
+        self.writes = 0
+        self.ioctls = 0
+        self.transmit_queue = 0
+        self._rts = False
+
+    @property
+    def syscalls(self) -> int:
+        return self.reads + self.writes + self.ioctls
+
+    def read(self, size:int=None) -> bytes:
+        self.reads += 1
+        if self._frames is not None:
+            if self._frame_index == len(self._frames):
+                return None
+            frame = self._frames[self._frame_index]
+            self._frame_index += 1
+            return frame
+        if not size:
+            size = 1
+        if self._pos >= len(self._stream):
+            return None
+        buf = self._stream[self._pos:self._pos + size]
+        self._pos += len(buf)
+        return buf
+
+    def write(self, buf) -> bool:
+        self.writes += 1
+        if self._record:
+            self.written.append(bytes(buf))
+        return True
+
+    def flush(self) -> bool:
+        self.ioctls += 1
+        return True
+
+    def transmit_count(self) -> int:
+        self.ioctls += 1
+        return self.transmit_queue
+
+    @property
+    def rts(self) -> bool:
+        return self._rts
+
+    @rts.setter
+    def rts(self, x:bool):
+        self.ioctls += 1
+        self._rts = x
+
+    def _hunt(self):
+        # receiver restart: discard data until after next sync pattern
+        if self._sync is None or self._frames is not None:
+            return
+        index = self._stream.find(self._sync, self._pos)
+        if index == -1:
+            self._pos = len(self._stream)
+        else:
+            self._pos = index + len(self._sync)
+
+    def disable_receiver(self):
+        self.ioctls += 1
+
+    def enable_receiver(self):
+        self.ioctls += 1
+        self._hunt()
+
+    def force_idle_receiver(self):
+        self.ioctls += 1
+        self._hunt()
+
+    def disable_transmitter(self):
+        self.ioctls += 1
+
+    def enable_transmitter(self):
+        self.ioctls += 1
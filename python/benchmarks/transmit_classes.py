@@ -0,0 +1,108 @@
+# Transmit class benchmark
+#
+# A control frame is queued every 10ms while two bulk streams keep the
+# port busy. Compared:
+#
+#   FIFO = all frames written in order with a deep driver queue
+#          (TransmitScheduler target 64K, as a blocking Port.write() loop
+#          with large kernel buffers)
+#   TransmitQueues = control class strict priority, bulk classes weighted
+#          3:1, driver queue limited to 2 bulk frames
+#
+# LinePort (see transmit_pacing.py) drains the driver queue in real time at
+# the line rate. Control delay is measured from queueing the frame until
+# its last byte leaves the (simulated) line.
+#
+# usage: python transmit_classes.py [seconds]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mghalfduplex import LatencyHistogram
+from mgtransmit import TransmitScheduler, TransmitQueues
+from transmit_pacing import LinePort
+
+RATE = 1000000
+CONTROL = bytes(32)
+BULK = bytes(1024)
+CONTROL_INTERVAL = 0.01
+
+
+class TimingPort(LinePort):
+    """LinePort recording when control frames finish sending."""
+
+    def __init__(self, rate:int):
+        super().__init__(rate)
+        self.control_done = []
+        self.bulk_bytes = [0, 0]
+
+    def write(self, buf) -> bool:
+        result = super().write(buf)
+        if len(buf) == len(CONTROL):
+            self.control_done.append(
+                self._time + self._queued / self._byte_rate)
+        else:
+            self.bulk_bytes[buf[0]] += len(buf)
+        return result
+
+
+def run(seconds:float):
+    bulk = [bytes([0]) + BULK[1:], bytes([1]) + BULK[1:]]
+    for name in ('FIFO', 'TransmitQueues'):
+        port = TimingPort(RATE)
+        put_times = []
+        start = time.perf_counter()
+        end = start + seconds
+        next_control = start
+        if name == 'FIFO':
+            scheduler = TransmitScheduler(port, target=65536)
+            i = 0
+            while time.perf_counter() < end:
+                if time.perf_counter() >= next_control:
+                    put_times.append(time.perf_counter())
+                    scheduler.submit(CONTROL)
+                    next_control += CONTROL_INTERVAL
+                else:
+                    # bulk streams alternate
+                    scheduler.submit(bulk[i & 1], CONTROL_INTERVAL / 4)
+                    i += 1
+        else:
+            queues = TransmitQueues(port, weights=(0, 3, 1),
+                                    limit=len(BULK) * 2)
+            while time.perf_counter() < end:
+                now = time.perf_counter()
+                if now >= next_control:
+                    put_times.append(now)
+                    queues.put(CONTROL, 0)
+                    next_control += CONTROL_INTERVAL
+                # keep bulk classes backlogged
+                for cls in (1, 2):
+                    if len(queues.classes[cls].queue) < 4:
+                        queues.put(bulk[cls - 1], cls)
+                queues.send(max(next_control - time.perf_counter(), 0))
+        port.close()
+        histogram = LatencyHistogram()
+        for put_time, done in zip(put_times, port.control_done):
+            histogram.add(done - put_time)
+        total = sum(port.bulk_bytes)
+        print(name)
+        print('  control frames = ' + str(histogram.count))
+        print('  control delay mean = ' +
+              '{:.2f}'.format(histogram.mean * 1000) + ' msec')
+        print('  control delay max  = ' +
+              '{:.2f}'.format(histogram.max * 1000) + ' msec')
+        print('  bulk share = ' +
+              '{:.0f}'.format(port.bulk_bytes[0] * 100 / total) + '% / ' +
+              '{:.0f}'.format(port.bulk_bytes[1] * 100 / total) + '%')
+        if name == 'TransmitQueues':
+            for i, c in enumerate(queues.classes):
+                print('  class ' + str(i) + ' queueing delay mean = ' +
+                      '{:.2f}'.format(c.delay.mean * 1000) + ' msec')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(float(sys.argv[1]))
+    else:
+        run(3.0)
@@ -0,0 +1,126 @@
+# Paced transmit benchmark
+#
+# Compares the continuous send loop of samples/raw.py (write, then poll
+# transmit_count() with 5ms sleeps until the driver queue drops to one
+# buffer) with mgtransmit.TransmitScheduler.submit().
+#
+# LinePort stands in for the driver send queue: queued data drains in
+# real time at the line rate. Reported per run:
+#
+#   line use = data sent / (line rate * elapsed time)
+#   idle gaps = times the queue ran empty before the next write (underrun)
+#   wakeups and transmit_count() ioctls per write
+#
+# usage: python transmit_pacing.py [seconds]
+
+import os
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import Port
+from simport import SimPort
+from mgtransmit import TransmitScheduler
+
+DATA_SIZE = 128
+
+
+class LinePort(SimPort):
+    """SimPort with a send queue draining at a fixed line rate."""
+
+    def __init__(self, rate:int):
+        super().__init__(record=False)
+        self._settings.transmit_clock = Port.INTERNAL
+        self._settings.internal_clock_rate = rate
+        self._fd = os.open(os.devnull, os.O_WRONLY)
+        self._byte_rate = rate / 8
+        self._queued = 0.0
+        self._time = time.perf_counter()
+        self._empty = None  # time queue ran empty
+        self.idle_gaps = 0
+        self.idle_time = 0.0
+
+    def close(self):
+        os.close(self._fd)
+
+    def _drain(self, now:float):
+        # advance queue to now
+        remaining = self._queued - (now - self._time) * self._byte_rate
+        if remaining <= 0:
+            if self._empty is None:
+                self._empty = self._time + self._queued / self._byte_rate
+            remaining = 0.0
+        self._queued = remaining
+        self._time = now
+
+    def write(self, buf) -> bool:
+        now = time.perf_counter()
+        self._drain(now)
+        if self._empty is not None and self.writes:
+            self.idle_gaps += 1
+            self.idle_time += now - self._empty
+        self._empty = None
+        self._queued += len(buf)
+        return super().write(buf)
+
+    def transmit_count(self) -> int:
+        self._drain(time.perf_counter())
+        self.transmit_queue = int(self._queued)
+        return super().transmit_count()
+
+
+# send loop from samples/raw.py
+def sample_loop(port, buf, seconds:float):
+    wakeups = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        port.write(buf)
+        while port.transmit_count() > DATA_SIZE:
+            time.sleep(0.005)
+            wakeups += 1
+    return wakeups
+
+
+def run(seconds:float):
+    buf = bytes(DATA_SIZE)
+    for rate in (100224, 1000000):
+        print('line rate = ' + str(rate) + ' bps, ' + str(DATA_SIZE) +
+              ' byte writes')
+        for name in ('samples/raw.py loop', 'TransmitScheduler',
+                     'TransmitScheduler external clock'):
+            port = LinePort(rate)
+            start = time.perf_counter()
+            if name == 'samples/raw.py loop':
+                wakeups = sample_loop(port, buf, seconds)
+            else:
+                if name.endswith('external clock'):
+                    # rate learned from transmit_count()
+                    scheduler = TransmitScheduler(port, rate=0,
+                                                  target=DATA_SIZE * 8)
+                else:
+                    scheduler = TransmitScheduler(port)
+                end = start + seconds
+                while time.perf_counter() < end:
+                    scheduler.submit(buf)
+                wakeups = scheduler.wakeups
+            elapsed = time.perf_counter() - start
+            # data still queued at end has not been sent
+            sent = port.writes * DATA_SIZE - port.transmit_count()
+            port.ioctls -= 1
+            port.close()
+            print('  ' + name)
+            print('    line use  = ' + '{:.1f}'.format(
+                sent * 8 * 100 / (rate * elapsed)) + '%')
+            print('    idle gaps = ' + str(port.idle_gaps) + ' (' +
+                  '{:.1f}'.format(port.idle_time * 1000) + ' msec)')
+            print('    wakeups/write = ' +
+                  '{:.2f}'.format(wakeups / port.writes))
+            print('    ioctls/write  = ' +
+                  '{:.2f}'.format(port.ioctls / port.writes))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(float(sys.argv[1]))
+    else:
+        run(2.0)
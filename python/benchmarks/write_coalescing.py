@@ -0,0 +1,80 @@
+# Write coalescing benchmark
+#
+# Sends packets as marcos SerialProtocolPort does: start byte, 64 byte
+# packet and end byte, each a separate write. Compared:
+#
+#   Port.write() per piece = 3 system calls per packet
+#   CoalescingWriter = pieces gathered into max_data_size batches
+#
+# The port is a pseudo terminal master with a thread reading the slave
+# side, so every write is a real tty write system call.
+#
+# usage: python write_coalescing.py [packet_count]
+
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from mgapi import Port
+from mgtransmit import CoalescingWriter
+
+START_END = bytearray([0])
+PACKET = bytes(64)
+
+
+class PtyPort(Port):
+    """Port using pseudo terminal master instead of SyncLink device."""
+
+    def __init__(self, fd:int):
+        super().__init__('pty')
+        self._fd = fd
+
+    def __del__(self):
+        pass
+
+
+def discard(fd:int):
+    while True:
+        try:
+            os.read(fd, 65536)
+        except OSError:
+            return
+
+
+def run(packet_count:int):
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    port = PtyPort(master)
+    thread = threading.Thread(target=discard, args=(slave,), daemon=True)
+    thread.start()
+    for name in ('Port.write() per piece', 'CoalescingWriter'):
+        if name == 'CoalescingWriter':
+            writer = CoalescingWriter(port)
+        else:
+            writer = port
+        start = time.perf_counter()
+        for i in range(packet_count):
+            writer.write(START_END)
+            writer.write(PACKET)
+            writer.write(START_END)
+        if name == 'CoalescingWriter':
+            writer.flush()
+            syscalls = writer.port_writes
+        else:
+            syscalls = packet_count * 3
+        elapsed = time.perf_counter() - start
+        print(name)
+        print('  packets/s        = ' + '{:.0f}'.format(packet_count / elapsed))
+        print('  syscalls/packet  = ' + '{:.3f}'.format(syscalls / packet_count))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run(100000)
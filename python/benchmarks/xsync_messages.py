@@ -0,0 +1,112 @@
+# XSYNC message stream benchmark
+#
+# Compares a plain read() loop that appends each block to a bytearray and
+# slices length prefixed messages out of it (copy per message) with
+# mgxsync.XsyncReader (memoryviews of received blocks) on the same blocks
+# built by mgxsync.XsyncWriter.
+#
+# usage: python xsync_messages.py [message_size] [block_size] [message_count]
+
+import sys
+import time
+
+sys.path.append('..')  # not needed if mgapi package installed using pip
+from simport import SimPort
+from mgxsync import XsyncReader, XsyncWriter, BLOCK_HEADER_SIZE, NO_MESSAGE
+
+SYNC = 0x01020304
+SYNC_SIZE = 4
+
+
+# messages glued from block payloads by hand
+def read_loop(port, block_size:int) -> int:
+    buffer = bytearray()
+    count = 0
+    synced = False
+    while True:
+        block = port.read()
+        if not block:
+            return count
+        if not synced:
+            first = block[1] << 8 | block[2]
+            if first == NO_MESSAGE:
+                continue
+            block = block[BLOCK_HEADER_SIZE + first:]
+            synced = True
+        else:
+            block = block[BLOCK_HEADER_SIZE:]
+        buffer += block
+        while len(buffer) >= 2:
+            length = buffer[0] << 8 | buffer[1]
+            if not length:
+                # padding: discard rest of block
+                buffer = bytearray()
+                break
+            if len(buffer) < 2 + length:
+                break
+            message = bytes(buffer[2:2 + length])
+            del buffer[:2 + length]
+            count += 1
+        if len(buffer) < 2:
+            # padding (message headers do not span blocks)
+            buffer = bytearray()
+
+
+def run(message_size:int, block_size:int, message_count:int):
+    messages = [bytes([i & 0xff]) * message_size for i in range(message_count)]
+    port = SimPort(record=True)
+    writer = XsyncWriter(port, block_size, SYNC, SYNC_SIZE)
+    start = time.perf_counter()
+    for i in range(0, message_count, 100):
+        writer.write_messages(messages[i:i + 100])
+    elapsed = time.perf_counter() - start
+    data = b''.join(port.written)
+    unit = SYNC_SIZE + block_size
+    # receiver discards sync pattern
+    blocks = [data[i + SYNC_SIZE:i + unit] for i in range(0, len(data), unit)]
+    print('XsyncWriter ' + str(message_size) + ' byte messages, ' +
+          str(block_size) + ' byte blocks')
+    print('  messages/s     = ' + '{:.0f}'.format(message_count / elapsed))
+    print('  writes/message = ' +
+          '{:.3f}'.format(port.writes / message_count))
+    print('  line efficiency = ' + '{:.1f}'.format(
+        100 * message_count * message_size / len(data)) + '%')
+
+    port = SimPort(frames=blocks)
+    start = time.perf_counter()
+    count = read_loop(port, block_size)
+    elapsed = time.perf_counter() - start
+    print('plain read() loop')
+    print('  messages = ' + str(count) + ' of ' + str(message_count))
+    print('  messages/s = ' + '{:.0f}'.format(count / elapsed))
+    print('  MB/s       = ' +
+          '{:.1f}'.format(count * message_size / elapsed / 1e6))
+
+    port = SimPort(frames=blocks)
+    reader = XsyncReader(port, block_size)
+    start = time.perf_counter()
+    count = 0
+    while True:
+        batch = reader.read_messages(64)
+        if batch is None:
+            break
+        count += len(batch)
+    elapsed = time.perf_counter() - start
+    print('XsyncReader.read_messages()')
+    print('  messages = ' + str(count) + ' of ' + str(message_count))
+    print('  messages/s = ' + '{:.0f}'.format(count / elapsed))
+    print('  MB/s       = ' +
+          '{:.1f}'.format(count * message_size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    message_size = 40
+    block_size = 1024
+    message_count = 200000
+    if len(sys.argv) > 1:
+        message_size = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        block_size = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        message_count = int(sys.argv[3])
+    run(message_size, block_size, message_count)
@@ -1,5 +1,159 @@
 from mgapi import Port
 
+class PacketDeframer:
+    """
+    Extract 0x00 + 64 byte packet + 0x00 frames from a receive byte stream.
+
+    Received data is appended to a fixed capacity buffer between head and
+    tail cursors. Idle bytes (0xFF) and other bytes before a start byte are
+    dropped in one step by bytearray.find() and only a partial packet is
+    ever moved when the buffer is compacted. Packets are returned as
+    (header, data) memoryviews into the buffer which are valid until the
+    next packet is taken from packets_in().
+
+    packets_in() is a generator: data is only added to the buffer when
+    iteration of the result starts, so data passed to a call that is never
+    iterated is lost. Packets not taken before the next call are returned
+    by that call.
+    """
+
+    def __init__(self, capacity=16384, start_end_byte=0x00, header_size=16, data_size=48):
+        self.start_end_byte = start_end_byte
+        self.header_size = header_size
+        self.data_size = data_size
+        self.packet_size = header_size + data_size
+        if capacity < 2 * (self.packet_size + 2):
+            raise ValueError("Capacity too small for packet size")
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0
+        self._tail = 0
+        self.received = 0
+        self.packets = 0
+        self.errors = 0
+
+    @property
+    def dropped(self):
+        """Count of received bytes discarded as idle or invalid."""
+        pending = self._tail - self._head
+        return self.received - pending - self.packets * (self.packet_size + 2)
+
+    def reset(self):
+        self.received -= self._tail - self._head
+        self._head = 0
+        self._tail = 0
+
+    def packets_in(self, data):
+        """Add received data and return (header, data) for each complete packet."""
+        buf = self._buf
+        head = self._head
+        tail = self._tail
+        size = len(data)
+        if size > self.capacity - tail:
+            # move unprocessed bytes (at most one partial packet) to front
+            pending = tail - head
+            buf[0:pending] = self._view[head:tail]
+            head = 0
+            tail = pending
+            if size > self.capacity - tail:
+                self._head = head
+                self._tail = tail
+                raise ValueError("Received data exceeds deframer capacity")
+        buf[tail:tail + size] = data
+        tail += size
+        self._tail = tail
+        self.received += size
+
+        find = buf.find
+        start_end_byte = self.start_end_byte
+        packet_size = self.packet_size
+        while tail - head > packet_size + 1:
+            start = find(start_end_byte, head, tail)
+            if start == -1:
+                # no start byte, drop idle run in bulk
+                head = tail
+                break
+            end = start + packet_size + 1
+            if end >= tail:
+                # wait for rest of packet
+                head = start
+                break
+            if buf[end] != start_end_byte:
+                # start byte without matching end byte, resync after it
+                self.errors += 1
+                head = start + 1
+                continue
+            head = end + 1
+            self._head = head
+            self.packets += 1
+            start += 1
+            middle = start + self.header_size
+            yield self._view[start:middle], self._view[middle:end]
+        self._head = head
+
+class PacketTemplate:
+    """
+    Preallocated transmit buffer of count 0x00 + header + data + 0x00 packets.
+
+    Start/end bytes are written once. headers[i] and data[i] are memoryviews
+    of the header and data regions of packet i which are filled in place
+    (assigning a value of the wrong length raises ValueError). Packets are
+    contiguous so the first n packets are sent with one write of view(n).
+    """
+
+    def __init__(self, count=1, start_end_byte=0x00, header_size=16, data_size=48):
+        if count < 1:
+            raise ValueError("Packet count must be at least 1")
+        self.count = count
+        self.header_size = header_size
+        self.data_size = data_size
+        self.packet_size = header_size + data_size + 2
+        self.buffer = bytearray(self.packet_size * count)
+        self._view = memoryview(self.buffer)
+        self.headers = []
+        self.data = []
+        for i in range(count):
+            start = i * self.packet_size
+            self.buffer[start] = start_end_byte
+            self.buffer[start + self.packet_size - 1] = start_end_byte
+            self.headers.append(self._view[start + 1:start + 1 + header_size])
+            self.data.append(self._view[start + 1 + header_size:start + self.packet_size - 1])
+
+    def set(self, index, header, data):
+        self.headers[index][:] = header
+        self.data[index][:] = data
+
+    def view(self, count=None):
+        """Return memoryview of the first count packets (default all)."""
+        if count is None:
+            count = self.count
+        return self._view[:count * self.packet_size]
+
+    def body(self, index=0):
+        """Return memoryview of header + data of packet index (no start/end bytes)."""
+        start = index * self.packet_size
+        return self._view[start + 1:start + self.packet_size - 1]
+
+def send_batch(port, template, packets):
+    """
+    Send (header, data) packets filled into template with one write per
+    template batch. Returns False if a write fails.
+    """
+    if port.line_discipline == Port.N_HDLC:
+        raise ValueError("Batch send requires byte stream protocol")
+    count = 0
+    for header, data in packets:
+        template.set(count, header, data)
+        count += 1
+        if count == template.count:
+            if not port.write(template.view(count)):
+                return False
+            count = 0
+    if count:
+        return port.write(template.view(count))
+    return True
+
 def default_settings():
     settings = Port.Settings()
     settings.protocol = Port.RAW
@@ -12,7 +166,7 @@ def default_settings():
     return settings
 
 class SerialProtocolPort:
-    def __init__(self, port, settings=default_settings(), continuous_send = True):
+    def __init__(self, port, settings=default_settings(), continuous_send = True, batch_size=32):
         # Default serial protocol port settings
         self.port = port
         self.settings = settings
@@ -21,7 +175,13 @@ class SerialProtocolPort:
         self.packet_size = 64
         self.header_size = 16
         self.data_size = 48
-        self.buffer = bytearray()
+        self.deframer = PacketDeframer(start_end_byte=self.start_end_byte,
+                                       header_size=self.header_size,
+                                       data_size=self.data_size)
+        self.template = PacketTemplate(count=batch_size,
+                                       start_end_byte=self.start_end_byte,
+                                       header_size=self.header_size,
+                                       data_size=self.data_size)
         self.port.apply_settings(self.settings)
         self.port.transmit_idle_pattern = self.idle_byte
         self.port.receive_transfer_size = 64
@@ -35,50 +195,37 @@ class SerialProtocolPort:
         self.port.write(bytearray([self.start_end_byte]))
 
     def send_packet(self, header, data):
-        if len(header) != self.header_size or len(data) != self.data_size:
-            raise ValueError("Invalid packet size")
-        packet = header + data
-        self.port.write(packet)
+        # header + data only, template raises ValueError on wrong sizes
+        self.template.set(0, header, data)
+        self.port.write(self.template.body(0))
 
     def end_transmission(self):
         self.port.write(bytearray([self.start_end_byte]))
 
+    def send_data(self, header, data):
+        self.template.set(0, header, data)
+        return self.port.write(self.template.view(1))
+
+    def send_batch(self, packets):
+        """Send (header, data) packets with one write per template batch."""
+        return send_batch(self.port, self.template, packets)
+
     def receive_data(self):
         while True:
-            data = self.port.read(self.packet_size)
-            self.buffer.extend(data)
-
-            while len(self.buffer) >= self.packet_size:
-                start_index = self.buffer.find(self.start_byte)
-                if start_index == -1:
-                    # No start byte found, discard leading bytes
-                    self.buffer = self.buffer[-self.packet_size:]
-                    break
-                
-                if start_index > 0:
-                    # Remove leading bytes before the start byte
-                    self.buffer = self.buffer[start_index:]
-                
-                if len(self.buffer) < self.packet_size + 1:
-                    break  # Not enough data for a full packet + end byte
-                
-                packet_data = self.buffer[1:self.packet_size + 1]  # Extract packet data
-                yield packet_data[:self.header_size], packet_data[self.header_size:]  # Return header and data separately
-
-                if self.buffer[self.packet_size] == self.start_end_byte:
-                    # If the next byte is the start byte, there's a new packet
-                    self.buffer = self.buffer[self.packet_size:]
-                else:
-                    # Otherwise, it's the end of transmission or more idle bytes
-                    self.buffer = self.buffer[self.packet_size + 1:]
-                    break
+            # read whole receive backlog at high packet rates
+            size = min(max(self.port.receive_count(), self.packet_size),
+                       self.port._defaults.max_data_size)
+            data = self.port.read(size)
+            if not data:
+                continue
+            yield from self.deframer.packets_in(data)
 
     def run(self):
         try:
             while True:
                 for header, data in self.receive_data():
-                    print(f"Received packet header: {header}")
-                    print(f"Received packet data: {data}")
+                    print(f"Received packet header: {bytes(header)}")
+                    print(f"Received packet data: {bytes(data)}")
                     # Procesar el paquete aquí
         except KeyboardInterrupt:
             print("Stopped by user")
\ No newline at end of file
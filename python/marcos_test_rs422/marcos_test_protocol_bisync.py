@@ -8,6 +8,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 sys.path.append('..')  # not needed if mgapi package installed using pip
 from mgapi import Port
+from marcos_protocol import PacketDeframer, PacketTemplate, send_batch
 
 DEFAULT_PACKET_HEADER = bytes(range(0xFF, 0xFF - 16 * 0x11, -0x11))
 DEFAULT_PACKET_DATA = bytes([(i // 3) * 0x11 for i in range(48)])
@@ -40,7 +41,7 @@ class SerialProtocolPort:
         settings.internal_loopback = False
         return settings
     
-    def __init__(self, port, settings=default_settings(), continuous_send=True):
+    def __init__(self, port, settings=default_settings(), continuous_send=True, batch_size=32):
         # Default serial protocol port settings
         self.port = port
         self.settings = settings
@@ -49,7 +50,13 @@ class SerialProtocolPort:
         self.packet_size = 64
         self.header_size = 16
         self.data_size = 48
-        self.buffer = bytearray()
+        self.deframer = PacketDeframer(start_end_byte=self.start_end_byte,
+                                       header_size=self.header_size,
+                                       data_size=self.data_size)
+        self.template = PacketTemplate(count=batch_size,
+                                       start_end_byte=self.start_end_byte,
+                                       header_size=self.header_size,
+                                       data_size=self.data_size)
         self.port.apply_settings(self.settings)
         self.port.transmit_idle_pattern = self.idle_byte
         self.port.receive_transfer_size = 64
@@ -65,62 +72,44 @@ class SerialProtocolPort:
         self.port.write(bytearray([self.start_end_byte]))
 
     def send_packet(self, header, data):
-        if len(header) != self.header_size or len(data) != self.data_size:
-            raise ValueError("Invalid packet size")
-        packet = header + data
+        # Cabecera + datos en la plantilla (ValueError si el tamaño no es correcto)
+        self.template.set(0, header, data)
+        packet = self.template.body(0)
         self.port.write(packet)
-        logging.debug(f"Sent packet: {packet.hex()}")  # Mensaje de depuración
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Sent packet: %s", packet.hex())  # Mensaje de depuración
 
     def end_transmission(self):
         self.port.write(bytearray([self.start_end_byte]))
 
     def send_data(self, header, data):
-        if len(header) != self.header_size or len(data) != self.data_size:
-            raise ValueError("Invalid packet size")
-        packet = bytearray([self.start_end_byte]) + header + data + bytearray([self.start_end_byte])
-        self.port.write(packet)
-        logging.debug(f"Sent packet: {(header + data).hex()}")  # Mensaje de depuración
+        # Rellena la plantilla preasignada (0x00 + cabecera + datos + 0x00) en su lugar
+        self.template.set(0, header, data)
+        result = self.port.write(self.template.view(1))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Sent packet: %s", self.template.body(0).hex())  # Mensaje de depuración
+        return result
+
+    def send_batch(self, packets):
+        """Envia paquetes (header, data) contiguos con una sola escritura por lote."""
+        return send_batch(self.port, self.template, packets)
 
     def receive_data(self):
-        self.buffer = bytearray()
-        
+        self.deframer.reset()
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
         while True:
-            data = self.port.read(self.packet_size)  # Lee 64 bytes del puerto
-            logging.debug(f"Receieved data: {(data).hex()}")  # Mensaje de depuración
+            # Lee todo lo pendiente en el puerto (minimo 64 bytes)
+            size = min(max(self.port.receive_count(), self.packet_size),
+                       self.port._defaults.max_data_size)
+            data = self.port.read(size)
             if not data:
                 continue
-            
-            self.buffer.extend(data)  # Añade los datos leídos al buffer
-            
-            while len(self.buffer) >= 64:
-                # Buscar el byte de inicio (0x00)
-                start_index = self.buffer.find(0x00)
-                
-                if start_index == -1:
-                    # No se encontró el byte de inicio, descartar los bytes idle
-                    self.buffer = bytearray()
-                    break
-                
-                if start_index + 65 > len(self.buffer):
-                    # Si no hay suficientes datos para un paquete completo, espera más datos
-                    break
-                
-                # Verificar si el siguiente byte después del paquete es 0x00 (fin de la transmisión)
-                end_index = start_index + 65
-                
-                if self.buffer[end_index] == 0x00:
-                    # Extraer y procesar el paquete
-                    packet = self.buffer[start_index + 1 : start_index + 65]
-                    header = packet[:16]
-                    data = packet[16:]
-                    
-                    yield header, data
-                    
-                    # Eliminar el paquete procesado del buffer
-                    self.buffer = self.buffer[end_index + 1:]
-                else:
-                    # Si el siguiente byte no es 0x00, eliminar el byte de inicio y continuar
-                    self.buffer = self.buffer[start_index + 1:]
+            if debug:
+                logging.debug("Receieved data: %s", data.hex())  # Mensaje de depuración
+
+            # Extrae los paquetes completos (0x00 + 64 bytes + 0x00) sin copiar el buffer
+            yield from self.deframer.packets_in(data)
         
         
         # while True:
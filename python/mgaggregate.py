@@ -0,0 +1,202 @@
+# Small message aggregation into HDLC frames
+#
+# In N_HDLC mode every Port.write() sends one frame: one system call plus
+# flags and FCS on the line for each write. Sending many 10 to 40 byte
+# messages one per frame spends more on the system call and frame overhead
+# than on the messages.
+#
+# Aggregator packs messages into frames of up to max_data_size bytes, each
+# message preceded by its length:
+#
+#   len | message | len | message ...
+#
+# len = 1 byte for messages of 1 to 127 bytes,
+#       2 bytes (high bit set, 15 bit length) for 128 to 32767 bytes
+#
+# A frame is sent when the next message does not fit, when a delay after
+# the first message in the frame has passed (checked on add() and poll())
+# or on flush(). Deaggregator splits received frames back into messages as
+# memoryviews of the frame (no copy).
+
+import time
+
+from mgapi import Port
+
+MAX_MESSAGE_SIZE = 0x7fff
+
+
+class Aggregator():
+    """Pack small messages into HDLC frames."""
+
+    def __init__(self, port:Port, frame_size:int=None, delay:float=0.005):
+        """
+        port = open Port configured for HDLC (N_HDLC line discipline)
+        frame_size = max frame size (default max_data_size)
+        delay = max seconds a message is held before sent, None = hold
+                until frame full or flush()
+        """
+        if frame_size is None:
+            frame_size = port._defaults.max_data_size
+        assert frame_size > 2, 'frame_size too small for message header'
+        self.port = port
+        self.frame_size = frame_size
+        self.delay = delay
+        self._buf = bytearray(frame_size)
+        self._view = memoryview(self._buf)
+        self._count = 0  # bytes in current frame
+        self._deadline = None
+        self.messages = 0
+        self.frames = 0
+        self.bytes = 0  # message bytes, without length headers
+
+    def add(self, message) -> bool:
+        """Add message to current frame, return False if a write fails."""
+        size = len(message)
+        assert 0 < size <= min(MAX_MESSAGE_SIZE, self.frame_size - 2), \
+            'message size must be 1 to frame_size - 2'
+        header = 1 if size < 0x80 else 2
+        count = self._count
+        if count + header + size > self.frame_size:
+            if not self.flush():
+                return False
+            count = 0
+        if not count and self.delay is not None:
+            self._deadline = time.perf_counter() + self.delay
+        buf = self._buf
+        if header == 1:
+            buf[count] = size
+        else:
+            buf[count] = 0x80 | size >> 8
+            buf[count + 1] = size & 0xff
+        count += header
+        buf[count:count + size] = message
+        self._count = count + size
+        self.messages += 1
+        self.bytes += size
+        if self._deadline is not None and \
+           time.perf_counter() >= self._deadline:
+            return self.flush()
+        return True
+
+    def add_messages(self, messages) -> bool:
+        """Add each message in messages, return False if a write fails."""
+        for message in messages:
+            if not self.add(message):
+                return False
+        return True
+
+    def flush(self) -> bool:
+        """Send current frame."""
+        count = self._count
+        self._deadline = None
+        if not count:
+            return True
+        self._count = 0
+        self.frames += 1
+        return self.port.write(self._view[:count])
+
+    def timeout(self) -> float:
+        """
+        Return seconds until current frame must be sent (for select/poll
+        timeouts), None if no deadline.
+        """
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.perf_counter(), 0.0)
+
+    def poll(self) -> bool:
+        """Send current frame if its deadline has passed."""
+        if self._deadline is not None and \
+           time.perf_counter() >= self._deadline:
+            return self.flush()
+        return True
+
+    def __repr__(self):
+        return 'Aggregator object at ' + hex(id(self)) + '\n' + \
+            'frame_size = ' + str(self.frame_size) + '\n' + \
+            'delay = ' + str(self.delay) + '\n' + \
+            'messages = ' + str(self.messages) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Deaggregator():
+    """Split received aggregate frames into messages."""
+
+    def __init__(self, port:Port=None):
+        """port = open Port configured for HDLC (needed for read_messages())"""
+        self.port = port
+        self.messages = 0
+        self.frames = 0
+        self.bytes = 0
+        self.errors = 0  # frames with bad status or truncated message
+
+    def messages_in(self, frame) -> list:
+        """
+        Return list of messages (memoryviews of frame) in frame data.
+        A truncated last message is discarded and counted as error.
+        """
+        view = memoryview(frame)
+        size = len(view)
+        out = []
+        total = 0
+        pos = 0
+        while pos < size:
+            length = view[pos]
+            if length & 0x80:
+                if pos + 1 >= size:
+                    self.errors += 1
+                    break
+                length = (length & 0x7f) << 8 | view[pos + 1]
+                pos += 2
+            else:
+                pos += 1
+            end = pos + length
+            if not length or end > size:
+                self.errors += 1
+                break
+            out.append(view[pos:end])
+            total += length
+            pos = end
+        self.frames += 1
+        self.messages += len(out)
+        self.bytes += total
+        return out
+
+    def read_messages(self, frame_count:int=1) -> list:
+        """
+        Read up to frame_count frames (Port.read_frames()) and return list
+        of messages (memoryviews). Frames with bad status are discarded.
+        Returns None if no frame read.
+        """
+        good, bad, status = self.port.read_frames(frame_count)
+        if not good and not bad:
+            return None
+        self.errors += len(bad)
+        trailer_size = self.port.frame_status.trailer_size
+        out = []
+        for frame in good:
+            out += self.messages_in(
+                memoryview(frame)[:len(frame) - trailer_size])
+        return out
+
+    def __iter__(self):
+        """Return messages until no frame read."""
+        while True:
+            messages = self.read_messages()
+            if messages is None:
+                return
+            yield from messages
+
+    def __repr__(self):
+        return 'Deaggregator object at ' + hex(id(self)) + '\n' + \
+            'messages = ' + str(self.messages) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n' + \
+            'errors = ' + str(self.errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -2,7 +2,10 @@ import ctypes
 import errno
 import os
 import fcntl
+import select
 import termios
+import time
+from collections import namedtuple
 from copy import deepcopy
 
 HDLC_MAX_FRAME_SIZE	= 65535
@@ -520,6 +523,113 @@ class gpio_desc(ctypes.Structure):
     def __str__(self):
         return self.__repr__()
 
+
+ReceiveFrame = namedtuple('ReceiveFrame', ['data', 'status', 'fcs'])
+ReceiveFrame.__doc__ = """
+    Received HDLC frame with HDLC_CRC_RETURN_EX trailer separated.
+    data = frame data (memoryview of read buffer, not copied)
+    status = RX_OK or RX_CRC_ERROR
+    fcs = received FCS bytes (empty if not returned)
+    """
+
+
+class FrameStatusDecoder():
+    """Separate frame data, FCS and status of HDLC_CRC_RETURN_EX frames."""
+
+    def __init__(self, crc_type:int=HDLC_CRC_NONE):
+        """crc_type = MGSL_PARAMS.crc_type (HDLC_CRC_XXX | HDLC_CRC_RETURN_EX)"""
+        self.crc_type = crc_type
+        self.reset()
+
+    @property
+    def crc_type(self) -> int:
+        return self._crc_type
+
+    @crc_type.setter
+    def crc_type(self, x:int):
+        self._crc_type = x
+        if not x & HDLC_CRC_RETURN_EX:
+            # frames hold data only
+            self._fcs_size = 0
+            self._trailer_size = 0
+            return
+        if x & HDLC_CRC_MASK == HDLC_CRC_16_CCITT:
+            self._fcs_size = 2
+        elif x & HDLC_CRC_MASK == HDLC_CRC_32_CCITT:
+            self._fcs_size = 4
+        else:
+            self._fcs_size = 0
+        self._trailer_size = self._fcs_size + 1
+
+    @property
+    def trailer_size(self) -> int:
+        """Bytes of FCS and status after frame data (0 if none returned)."""
+        return self._trailer_size
+
+    def reset(self):
+        """Clear counters."""
+        self.frames = 0
+        self.crc_errors = 0
+        self.short_frames = 0
+
+    def decode(self, frame) -> ReceiveFrame:
+        """Return ReceiveFrame for frame returned by Port.read()."""
+        self.frames += 1
+        trailer_size = self._trailer_size
+        if not trailer_size:
+            return ReceiveFrame(memoryview(frame), RX_OK, b'')
+        if len(frame) < trailer_size:
+            self.short_frames += 1
+            return ReceiveFrame(memoryview(b''), RX_CRC_ERROR, b'')
+        status = frame[-1]
+        if status != RX_OK:
+            self.crc_errors += 1
+        return ReceiveFrame(memoryview(frame)[:-trailer_size], status,
+                            frame[-trailer_size:-1])
+
+    def partition(self, frames:list) -> tuple:
+        """
+        Sort frames returned by Port.read() by status without building
+        a record or copying data per frame. Return (good, bad, status):
+        good = list of frames with status RX_OK
+        bad = list of other frames
+        status = list of status of each frame in bad
+        Frames are returned as read (not copied), FCS and status included:
+        frame data is the first len(frame) - trailer_size bytes, taken
+        without a copy with memoryview(frame)[:len(frame) - trailer_size].
+        Frames shorter than trailer_size are in bad with RX_CRC_ERROR.
+        """
+        self.frames += len(frames)
+        trailer_size = self._trailer_size
+        if not trailer_size:
+            return list(frames), [], []
+        good = []
+        bad = []
+        status = []
+        keep = good.append
+        for frame in frames:
+            if len(frame) < trailer_size:
+                self.short_frames += 1
+                bad.append(frame)
+                status.append(RX_CRC_ERROR)
+            elif frame[-1] == RX_OK:
+                keep(frame)
+            else:
+                self.crc_errors += 1
+                bad.append(frame)
+                status.append(frame[-1])
+        return good, bad, status
+
+    def __repr__(self):
+        return 'FrameStatusDecoder object at ' + hex(id(self)) + '\n' + \
+            'crc_type = ' + hex(self.crc_type) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'crc_errors = ' + str(self.crc_errors) + '\n' + \
+            'short_frames = ' + str(self.short_frames) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
 #
 # Event bit flags for use with MgslWaitEvent
 #
@@ -898,6 +1008,9 @@ class Port():
             # Linux only
             self.min_read_bytes = 255
             self.read_timer = 0
+            # mark async parity/framing errors and breaks in receive data
+            # (N_TTY PARMRK), see mgasync.AsyncDecoder
+            self.async_mark_errors = False
 
         def __repr__(self):
             return 'Settings object at ' + hex(id(self)) + '\n' + \
@@ -1036,6 +1149,55 @@ class Port():
             pass
         return False
 
+    def write_nowait(self, buf) -> int:
+        """
+        Write as much of buf as port accepts without waiting.
+        Return number of bytes accepted (0 if port not ready), None on error.
+        In N_HDLC mode buf is one frame, accepted whole or not at all.
+        """
+        try:
+            return os.write(self._fd, buf)
+        except BlockingIOError:
+            return 0
+        except OSError:
+            pass
+        return None
+
+    def write_all(self, buf, timeout:float=None) -> int:
+        """
+        Write all of buf, resuming after partial writes and waiting
+        (poll POLLOUT) when port is not ready (blocked_io = False).
+        timeout = max seconds to wait for port, None = wait forever
+        Return number of bytes sent, less than len(buf) on timeout or error.
+        """
+        view = memoryview(buf).cast('B')
+        size = len(view)
+        sent = 0
+        poller = None
+        end = None
+        while sent < size:
+            try:
+                sent += os.write(self._fd, view[sent:])
+                continue
+            except BlockingIOError:
+                pass
+            except OSError:
+                break
+            if poller is None:
+                poller = select.poll()
+                poller.register(self._fd, select.POLLOUT)
+                if timeout is not None:
+                    end = time.perf_counter() + timeout
+            if end is None:
+                wait = None
+            else:
+                wait = (end - time.perf_counter()) * 1000
+                if wait <= 0:
+                    break
+            if not poller.poll(wait):
+                break
+        return sent
+
     def flush(self) -> bool:
         """Wait for pending send data to complete."""
         if self.blocked_io:
@@ -1066,6 +1228,53 @@ class Port():
             pass
         return None
 
+    def read_into(self, buf) -> int:
+        """
+        Read received data into writable buffer buf (bytearray, memoryview).
+        Return number of bytes read, 0 if no data.
+        In N_HDLC mode buf must hold max_data_size bytes (one frame).
+        """
+        if self._ldisc == self.N_HDLC:
+            assert len(buf) >= self._defaults.max_data_size, \
+                'read buffer must be at least max_data_size'
+        try:
+            return os.readv(self._fd, [buf])
+        except OSError:
+            pass
+        return 0
+
+    def read_frame(self, buf=None) -> ReceiveFrame:
+        """
+        Read one HDLC frame and return ReceiveFrame (data, status, fcs).
+        If buf is given the frame is read into buf (see read_into())
+        and ReceiveFrame.data refers to buf.
+        Counters are kept in Port.frame_status.
+        """
+        if buf is None:
+            frame = self.read()
+            if frame is None:
+                return None
+        else:
+            size = self.read_into(buf)
+            if not size:
+                return None
+            frame = memoryview(buf)[:size]
+        return self.frame_status.decode(frame)
+
+    def read_frames(self, count:int) -> tuple:
+        """
+        Read up to count HDLC frames and return (good, bad, status) as
+        FrameStatusDecoder.partition(). With blocked_io = False reading
+        stops when no frame is available.
+        """
+        frames = []
+        for i in range(count):
+            frame = self.read()
+            if frame is None:
+                break
+            frames.append(frame)
+        return self.frame_status.partition(frames)
+
     def disable_receiver(self):
         """Disable receiver."""
         try:
@@ -1182,6 +1391,10 @@ class Port():
             # set N_TTY options
             options = termios.tcgetattr(self._fd)
             options[0] = 0  # c_iflag
+            if self._settings.protocol == self.ASYNC and \
+               self._settings.async_mark_errors:
+                # error: 0xff 0x00 c, break: 0xff 0x00 0x00, 0xff: 0xff 0xff
+                options[0] = termios.INPCK | termios.PARMRK
             options[1] = 0  # c_oflag
             # c_cflag
             options[2] = \
@@ -1286,6 +1499,7 @@ class Port():
             params.crc_type |= HDLC_CRC_RETURN_EX
         if not settings.discard_received_crc:
             params.crc_type |= HDLC_CRC_RETURN_EX
+        self.frame_status.crc_type = params.crc_type
 
         params.addr = settings.hdlc_address_filter
 
@@ -1450,6 +1664,14 @@ class Port():
         settings.async_data_bits = params.data_bits
         settings.async_stop_bits = params.stop_bits
         settings.async_parity = params.parity
+        settings.async_mark_errors = False
+        if settings.protocol == self.ASYNC:
+            try:
+                options = termios.tcgetattr(self._fd)
+                if options[0] & termios.PARMRK:
+                    settings.async_mark_errors = True
+            except (OSError, termios.error):
+                pass
 
         settings.xsync_block_size = 0
         settings.sync_pattern = 0
@@ -1472,6 +1694,7 @@ class Port():
         elif settings.protocol == self.MONOSYNC:
             settings.sync_pattern = self.transmit_idle_pattern
 
+        self.frame_status.crc_type = params.crc_type
         self._settings = deepcopy(settings)
 
         return settings
@@ -1724,6 +1947,22 @@ class Port():
         except OSError:
             return 0
 
+    def get_stats(self) -> mgsl_icount:
+        """Return mgsl_icount object with port statistics."""
+        icount = mgsl_icount()
+        try:
+            fcntl.ioctl(self._fd, MGSL_IOCGSTATS, icount, True)
+        except OSError:
+            pass
+        return icount
+
+    def clear_stats(self):
+        """Clear port statistics."""
+        try:
+            fcntl.ioctl(self._fd, MGSL_IOCGSTATS, 0)
+        except OSError:
+            pass
+
     @property
     def blocked_io(self) -> bool:
         return self._blocked_io
@@ -1901,6 +2140,7 @@ class Port():
         self._defaults = self.Defaults()
         self._settings = self.Settings()
         self._ldisc = self.N_TTY
+        self.frame_status = FrameStatusDecoder()
         self.gpio = []
         for bit in range(0,32):
             gpio = self.GPIO(self, bit)
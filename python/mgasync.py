@@ -0,0 +1,148 @@
+# Bulk ASYNC receive with per character error status
+#
+# The controller transfers async receive data to the driver as data +
+# status pairs (the reason Port.receive_transfer_size is even in ASYNC
+# mode). The driver consumes the status bytes and passes only data to the
+# N_TTY line discipline, so Port.read() cannot tell which characters were
+# received with errors.
+#
+# With Settings.async_mark_errors = True the N_TTY line discipline marks
+# errors in the receive data (termios PARMRK):
+#
+#   0xff 0x00 c      character c received with parity or framing error
+#   0xff 0x00 0x00   break
+#   0xff 0xff        data byte 0xff
+#
+# AsyncDecoder removes the marks from large receive buffers and returns
+# the clean data with a list of error positions and kinds. Buffers with no
+# 0xff bytes are returned without copying, buffers with 0xff data but no
+# errors are unescaped with a single bytes.replace(), and only buffers
+# holding error marks are scanned match by match with a regular
+# expression. A mark split between two reads is held until the next read.
+#
+# N_TTY uses the same mark for parity and framing errors and does not mark
+# overruns. update_stats() adds the per type driver counts
+# (Port.get_stats()) to the decoder counters.
+#
+# Note: a parity or framing error on character 0x00 is reported as break.
+
+import re
+
+from mgapi import Port
+
+# error kinds
+ERROR = 1  # parity or framing error, character is in data
+BREAK = 2  # break, no character in data
+
+_MARK = re.compile(
+    rb'\xff(?:(\xff)|\x00(\x00)|\x00([\x01-\xff])|(\x00?\Z))')
+
+
+class AsyncDecoder():
+    """Split marked ASYNC receive data into data and error positions."""
+
+    def __init__(self, port:Port=None):
+        """port = open Port with async_mark_errors (needed for read())"""
+        self.port = port
+        self._held = b''
+        self._icount = None
+        self.characters = 0
+        self.errors = 0  # marked parity/framing errors
+        self.breaks = 0
+        # from driver counts, see update_stats()
+        self.parity_errors = 0
+        self.frame_errors = 0
+        self.overruns = 0
+
+    def reset(self):
+        """Discard held partial mark."""
+        self._held = b''
+
+    def decode(self, buf) -> tuple:
+        """
+        Return (data, positions, kinds) for receive data in buf (bytes).
+        positions = indexes into data of errors
+        kinds = ERROR (character at position received with error) or
+                BREAK (break received before character at position)
+        """
+        if self._held:
+            buf = self._held + bytes(buf)
+            self._held = b''
+        if buf.find(b'\xff') == -1:
+            self.characters += len(buf)
+            return buf, [], []
+        if buf.find(b'\xff\x00') == -1:
+            # no errors, only escaped 0xff data
+            # odd length trailing run of 0xff ends with partial mark
+            run = len(buf) - len(buf.rstrip(b'\xff'))
+            if run & 1:
+                self._held = b'\xff'
+                buf = buf[:-1]
+            data = buf.replace(b'\xff\xff', b'\xff')
+            self.characters += len(data)
+            return data, [], []
+
+        pieces = []
+        positions = []
+        kinds = []
+        size = 0  # data size so far
+        last = 0
+        for match in _MARK.finditer(buf):
+            start = match.start()
+            pieces.append(buf[last:start])
+            size += start - last
+            last = match.end()
+            group = match.lastindex
+            if group == 1:
+                pieces.append(b'\xff')
+                size += 1
+            elif group == 2:
+                positions.append(size)
+                kinds.append(BREAK)
+                self.breaks += 1
+            elif group == 3:
+                positions.append(size)
+                kinds.append(ERROR)
+                pieces.append(match.group(3))
+                size += 1
+                self.errors += 1
+            else:
+                # mark split between reads
+                self._held = bytes(buf[start:])
+                break
+        else:
+            pieces.append(buf[last:])
+            size += len(buf) - last
+        self.characters += size
+        return b''.join(pieces), positions, kinds
+
+    def read(self, size:int=None) -> tuple:
+        """
+        Read from port and return (data, positions, kinds) as decode().
+        Returns None if port.read() fails.
+        """
+        buf = self.port.read(size)
+        if buf is None:
+            return None
+        return self.decode(buf)
+
+    def update_stats(self):
+        """Add driver parity, framing and overrun counts since last call."""
+        icount = self.port.get_stats()
+        if self._icount is not None:
+            self.parity_errors += (icount.parity - self._icount.parity) & 0xffffffff
+            self.frame_errors += (icount.frame - self._icount.frame) & 0xffffffff
+            self.overruns += (icount.overrun - self._icount.overrun) & 0xffffffff
+        self._icount = icount
+
+    def __repr__(self):
+        return 'AsyncDecoder object at ' + hex(id(self)) + '\n' + \
+            'characters = ' + str(self.characters) + '\n' + \
+            'errors = ' + str(self.errors) + '\n' + \
+            'breaks = ' + str(self.breaks) + '\n' + \
+            'parity_errors = ' + str(self.parity_errors) + '\n' + \
+            'frame_errors = ' + str(self.frame_errors) + '\n' + \
+            'overruns = ' + str(self.overruns) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,150 @@
+# Streaming block assembler for BISYNC/MONOSYNC receive data
+#
+# samples/bisync.py reads a few bytes at a time and restarts the receiver
+# after every block to force a new sync search. That is required when the
+# sender idles between blocks (blocks are not byte aligned to each other)
+# but limits block rate and drops data while the receiver hunts.
+#
+# BlockAssembler is for senders that keep the line byte aligned between
+# blocks (continuous send or sync patterns between blocks). The receiver
+# stays enabled and a single bounded buffer is filled by large reads:
+#
+#   capacity
+#   |<------------------------------------------------------>|
+#   | consumed | unscanned/partial block | free space        |
+#              ^head                     ^tail
+#
+# Block boundaries are located with bytearray.find() using start/end
+# cursors (no slicing), a block may span any number of reads, and the
+# completed block is returned as a memoryview into the buffer.
+# The receiver is forced back to hunt mode (force_idle_receiver) only when
+# a block exceeds max_block_size (corrupt data or false sync).
+
+from mgapi import Port
+
+
+class BlockAssembler():
+    """Assemble start/end delimited blocks from a byte synchronous stream."""
+
+    def __init__(self, port:Port, start_of_block:int, end_of_block:int,
+                 max_block_size:int, read_size:int=None):
+        """
+        port = open Port configured for BISYNC or MONOSYNC
+        start_of_block = byte value starting each block
+        end_of_block = byte value ending each block
+        max_block_size = largest valid block including start/end bytes
+        read_size = bytes requested per read (default max_data_size)
+        """
+        if read_size is None:
+            read_size = port._defaults.max_data_size
+        assert max_block_size > 1, 'max_block_size must be > 1'
+        assert read_size > 0, 'read_size must be > 0'
+        self.port = port
+        self.start_of_block = start_of_block
+        self.end_of_block = end_of_block
+        self.max_block_size = max_block_size
+        self.read_size = read_size
+        # room for largest partial block plus one full read
+        self._buf = bytearray(max_block_size + 2 * read_size)
+        self._view = memoryview(self._buf)
+        self._head = 0  # first unconsumed byte
+        self._tail = 0  # end of valid data
+        self._start = -1  # start of block index or -1 if hunting
+        self._scan = 0  # next index to search for end of block
+        self.blocks = 0
+        self.bytes = 0
+        self.reads = 0
+        self.errors = 0
+        self.rehunts = 0
+
+    def reset(self):
+        """Discard buffered data and search for next start of block."""
+        self._head = 0
+        self._tail = 0
+        self._start = -1
+        self._scan = 0
+
+    def _rehunt(self):
+        # corrupt data or false sync: discard and resync receiver
+        self.errors += 1
+        self.rehunts += 1
+        self.reset()
+        self.port.force_idle_receiver()
+
+    def _fill(self) -> bool:
+        # make room for one read, moving partial block to buffer start
+        if len(self._buf) - self._tail < self.read_size:
+            if self._start != -1:
+                keep = self._start
+            else:
+                keep = self._tail
+            size = self._tail - keep
+            self._buf[0:size] = self._view[keep:self._tail]
+            self._tail = size
+            self._scan -= keep
+            if self._start != -1:
+                self._start = 0
+            self._head = 0
+        data = self.port.read(self.read_size)
+        if not data:
+            return False
+        self.reads += 1
+        size = len(data)
+        self._buf[self._tail:self._tail + size] = data
+        self._tail += size
+        return True
+
+    def read_block(self) -> memoryview:
+        """
+        Return next complete block (start through end byte) or None if
+        port.read() fails. The returned memoryview is valid until the
+        next call to read_block().
+        """
+        buf = self._buf
+        while True:
+            if self._start == -1:
+                index = buf.find(self.start_of_block, self._head, self._tail)
+                if index == -1:
+                    # nothing but idle/sync: discard scanned data
+                    self._head = self._tail
+                else:
+                    self._start = index
+                    self._scan = index + 1
+
+            if self._start != -1:
+                index = buf.find(self.end_of_block, self._scan, self._tail)
+                if index != -1 and index + 1 - self._start <= \
+                        self.max_block_size:
+                    start = self._start
+                    self._head = index + 1
+                    self._start = -1
+                    self.blocks += 1
+                    self.bytes += index + 1 - start
+                    return self._view[start:index + 1]
+                if (index if index != -1 else self._tail) - self._start >= \
+                        self.max_block_size:
+                    self._rehunt()
+                    continue
+                self._scan = self._tail
+
+            if not self._fill():
+                return None
+
+    def __iter__(self):
+        """Return blocks until port.read() fails."""
+        while True:
+            block = self.read_block()
+            if block is None:
+                return
+            yield block
+
+    def __repr__(self):
+        return 'BlockAssembler object at ' + hex(id(self)) + '\n' + \
+            'blocks = ' + str(self.blocks) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n' + \
+            'reads = ' + str(self.reads) + '\n' + \
+            'errors = ' + str(self.errors) + '\n' + \
+            'rehunts = ' + str(self.rehunts) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,261 @@
+# Multilink bundle: one frame stream over several HDLC ports
+#
+# A SyncLink GT2/GT4 card has 2 or 4 ports that may all connect to the
+# same peer. Bundle sends one logical frame stream over all of them and
+# Resequencer restores the original order on receive:
+#
+#   sequence | data
+#   2
+#
+# sequence = frame number (mod 65536)
+#
+# Each frame goes to the port that will finish sending it first: driver
+# queue (transmit_count(), TIOCOUTQ) plus frame size, divided by the port
+# line rate. Faster ports and ports with shorter queues get more frames,
+# so ports of different rates are all kept busy. A limit on bytes queued
+# per port bounds the added delay: when every port is at the limit send()
+# sleeps until the best port has drained enough.
+#
+# Frames on different ports arrive out of order. Resequencer holds early
+# frames (up to window frames ahead of the next expected frame) and
+# delivers them in order. A missing frame is given up after timeout
+# seconds, or when a frame arrives more than window frames ahead, and
+# the frames after it are delivered.
+
+import select
+import time
+
+from mgtransmit import line_rate
+
+HEADER_SIZE = 2
+SEQUENCE_MODULO = 0x10000
+
+
+class Resequencer():
+    """Restore frame order from sequence numbers."""
+
+    def __init__(self, window:int=64, timeout:float=0.05,
+                 clock=time.perf_counter):
+        """
+        window = max frames held waiting for a missing frame
+        timeout = seconds to wait for a missing frame
+        clock = time function
+        """
+        assert 0 < window < SEQUENCE_MODULO // 2, 'window out of range'
+        self.window = window
+        self.timeout = timeout
+        self.clock = clock
+        self._held = {}  # sequence number: data
+        self._expected = None  # next sequence number to deliver
+        self._gap_time = None  # time first frame was held
+        self.frames = 0
+        self.delivered = 0
+        self.lost = 0  # frames given up
+        self.duplicates = 0  # frames older than next expected
+        self.max_held = 0
+
+    def _deliver(self, out:list):
+        # deliver held frames from expected on
+        held = self._held
+        expected = self._expected
+        while expected in held:
+            out.append(held.pop(expected))
+            expected = (expected + 1) % SEQUENCE_MODULO
+        self._expected = expected
+        self._gap_time = self.clock() if held else None
+
+    def _skip(self, out:list):
+        # give up missing frames up to the oldest held frame
+        expected = self._expected
+        distance = min((sequence - expected) % SEQUENCE_MODULO
+                       for sequence in self._held)
+        self.lost += distance
+        self._expected = (expected + distance) % SEQUENCE_MODULO
+        self._deliver(out)
+
+    def frame_in(self, sequence:int, data) -> list:
+        """
+        Add received frame, return list of data delivered in order.
+        The first frame received sets the starting sequence number.
+        """
+        self.frames += 1
+        out = []
+        if self._expected is None:
+            self._expected = sequence
+        distance = (sequence - self._expected) % SEQUENCE_MODULO
+        if distance >= SEQUENCE_MODULO // 2 or sequence in self._held:
+            self.duplicates += 1
+            return out
+        if not distance:
+            out.append(data)
+            self._expected = (sequence + 1) % SEQUENCE_MODULO
+            if self._held:
+                self._deliver(out)
+        else:
+            if not self._held:
+                self._gap_time = self.clock()
+            self._held[sequence] = data
+            if len(self._held) > self.max_held:
+                self.max_held = len(self._held)
+            # give up missing frames until window is kept (new frame may be
+            # delivered and held frames run out before that)
+            held = self._held
+            while held and (len(held) > self.window or
+                            (sequence in held and
+                             (sequence - self._expected) % SEQUENCE_MODULO >=
+                             self.window)):
+                self._skip(out)
+        self.delivered += len(out)
+        return out
+
+    def poll(self) -> list:
+        """Give up missing frames waited on longer than timeout, return delivered data."""
+        out = []
+        while self._held and self.timeout is not None and \
+                self.clock() - self._gap_time >= self.timeout:
+            self._skip(out)
+        self.delivered += len(out)
+        return out
+
+    def wait_time(self) -> float:
+        """Return seconds until poll() gives up a missing frame, None if not waiting."""
+        if not self._held or self.timeout is None:
+            return None
+        return max(self._gap_time + self.timeout - self.clock(), 0.0)
+
+    def __repr__(self):
+        return 'Resequencer object at ' + hex(id(self)) + '\n' + \
+            'window = ' + str(self.window) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'delivered = ' + str(self.delivered) + '\n' + \
+            'held = ' + str(len(self._held)) + '\n' + \
+            'max_held = ' + str(self.max_held) + '\n' + \
+            'lost = ' + str(self.lost) + '\n' + \
+            'duplicates = ' + str(self.duplicates) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Bundle():
+    """Send and receive one frame stream over several HDLC ports."""
+
+    def __init__(self, ports:list, rates:list=None, limit:int=None,
+                 window:int=64, timeout:float=0.05):
+        """
+        ports = open Ports configured for HDLC, connected to the same peer
+        rates = line rate of each port in bits per second (default from
+                port settings, equal weights if any rate is unknown)
+        limit = max bytes queued in each port driver (default 2 frames)
+        window, timeout = Resequencer settings for receive
+        """
+        assert ports, 'no ports'
+        if rates is None:
+            rates = [line_rate(port._settings)[0] for port in ports]
+        self.ports = ports
+        self.rates = rates
+        if all(rates):
+            self._byte_rates = [rate / 8 for rate in rates]
+        else:
+            # external clocks: choose by queue depth only
+            self._byte_rates = None
+        size = ports[0]._defaults.max_data_size
+        if limit is None:
+            limit = 2 * size
+        self.limit = limit
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._sequence = 0
+        self.resequencer = Resequencer(window, timeout)
+        self.frames = [0] * len(ports)  # frames sent on each port
+        self.bytes = [0] * len(ports)  # bytes sent on each port
+        self.waits = 0
+        self._read_failed = False  # failure to report on next read()
+
+    def select_port(self, size:int) -> tuple:
+        """
+        Return (index, queued) for port that will finish sending size
+        more bytes first.
+        """
+        best = None
+        for i, port in enumerate(self.ports):
+            queued = port.transmit_count()
+            finish = queued + size
+            if self._byte_rates is not None:
+                finish /= self._byte_rates[i]
+            if best is None or finish < best[0]:
+                best = (finish, i, queued)
+        return best[1], best[2]
+
+    def send(self, data) -> bool:
+        """Send data as one frame on the best port, return False if write fails."""
+        size = len(data) + HEADER_SIZE
+        assert size <= len(self._buf), 'frame too large'
+        while True:
+            index, queued = self.select_port(size)
+            excess = queued + size - max(self.limit, size)
+            if excess <= 0:
+                break
+            # all ports full: wait for best port to drain
+            self.waits += 1
+            if self._byte_rates is not None:
+                time.sleep(excess / self._byte_rates[index])
+            else:
+                time.sleep(0.001)
+        buf = self._buf
+        buf[0] = self._sequence >> 8
+        buf[1] = self._sequence & 0xff
+        buf[HEADER_SIZE:size] = data
+        if not self.ports[index].write(self._view[:size]):
+            return False
+        self._sequence = (self._sequence + 1) % SEQUENCE_MODULO
+        self.frames[index] += 1
+        self.bytes[index] += size
+        return True
+
+    def frame_in(self, frame) -> list:
+        """Process received frame, return list of data delivered in order."""
+        if len(frame) < HEADER_SIZE:
+            return []
+        return self.resequencer.frame_in(frame[0] << 8 | frame[1],
+                                         frame[HEADER_SIZE:])
+
+    def read(self, timeout:float=None) -> list:
+        """
+        Wait up to timeout seconds (None = forever) for frames on any port
+        and return list of data delivered in order (may be empty).
+        Returns None if a read fails. If data was delivered before the
+        failure, that data is returned and the next call returns None.
+        """
+        if self._read_failed:
+            self._read_failed = False
+            return None
+        resequencer = self.resequencer
+        wait = resequencer.wait_time()
+        if timeout is not None:
+            wait = timeout if wait is None else min(wait, timeout)
+        fds = [port._fd for port in self.ports]
+        readable, writable, errors = select.select(fds, [], [], wait)
+        out = []
+        for fd in readable:
+            frame = self.ports[fds.index(fd)].read()
+            if frame is None:
+                if not out:
+                    return None
+                self._read_failed = True
+                return out
+            out += self.frame_in(frame)
+        out += resequencer.poll()
+        return out
+
+    def __repr__(self):
+        return 'Bundle object at ' + hex(id(self)) + '\n' + \
+            'ports = ' + str(len(self.ports)) + '\n' + \
+            'rates = ' + str(self.rates) + '\n' + \
+            'limit = ' + str(self.limit) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n' + \
+            'waits = ' + str(self.waits) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
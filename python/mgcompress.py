@@ -0,0 +1,317 @@
+# Payload compression for slow HDLC links
+#
+# At 9600 to 64000 bits/s line time costs far more than CPU time: a 200
+# byte frame takes 25ms to send at 64000 bits/s and microseconds to
+# compress. CompressedLink compresses each frame with zlib (raw deflate,
+# no zlib header or checksum, the HDLC FCS already checks the frame) and
+# adds a 1 byte header:
+#
+#   type | data
+#   1
+#
+# STORED       = data sent as is (compressed data not smaller)
+# DEFLATE      = frame compressed on its own
+# STREAM       = frame compressed as part of one stream (stream=True),
+#                data preceded by 1 byte sequence number
+# STREAM_START = first STREAM frame after a compressor reset
+# OFFER/ACCEPT = negotiation: flags | dictionary id (adler32)
+# RESET        = receiver lost stream sync, sender starts a new stream
+#
+# - Short frames compress poorly on their own. A preset dictionary of
+#   typical data (build_dictionary() from sample messages) gives the
+#   compressor matches from the first byte. Both ends must use the same
+#   dictionary, checked by negotiation.
+# - stream=True keeps compressor history across frames (better ratio) but
+#   needs every frame: deflate data can refer to a lost frame without
+#   a decode error, so STREAM frames carry a sequence number. A gap or
+#   decode error makes the receiver send one RESET and discard STREAM
+#   frames until a STREAM_START frame arrives.
+# - Frames that do not compress are sent STORED (1 byte overhead).
+#
+# negotiate() sends OFFER and waits for the peer's OFFER or ACCEPT. Both
+# ends then use compression only if both offered it with the same
+# dictionary, and stream mode only if both offered stream mode. An OFFER
+# received later (peer restarted) is answered with ACCEPT and restarts
+# stream state. Until negotiated all frames are sent STORED.
+
+import select
+import time
+import zlib
+
+from mgapi import Port
+from mgtransmit import line_rate
+
+STORED = 0
+DEFLATE = 1
+STREAM = 2
+STREAM_START = 3
+OFFER = 4
+ACCEPT = 5
+RESET = 6
+
+# OFFER/ACCEPT flags
+COMPRESS = 0x01
+STREAM_MODE = 0x02
+
+MAX_DICTIONARY_SIZE = 32768
+
+
+def build_dictionary(samples, size:int=MAX_DICTIONARY_SIZE) -> bytes:
+    """
+    Return preset dictionary of up to size bytes from sample messages.
+    Later samples are placed at the end of the dictionary, where zlib
+    finds matches with the shortest distance codes, so list the most
+    typical samples last.
+    """
+    data = b''.join(bytes(sample) for sample in samples)
+    return data[-min(size, MAX_DICTIONARY_SIZE):]
+
+
+class CompressedLink():
+    """Compress HDLC frame payloads after negotiation with the peer."""
+
+    def __init__(self, port:Port=None, dictionary:bytes=b'', level:int=6,
+                 stream:bool=False, compress:bool=True):
+        """
+        port = open Port configured for HDLC (needed for send(), read(),
+               negotiate())
+        dictionary = preset dictionary (same at both ends, up to 32K)
+        level = zlib compression level (1 = fastest, 9 = best)
+        stream = offer stream mode (history kept across frames)
+        compress = offer compression (False = always send STORED)
+        """
+        assert len(dictionary) <= MAX_DICTIONARY_SIZE, 'dictionary too large'
+        self.port = port
+        self.dictionary = bytes(dictionary)
+        self.dictionary_id = zlib.adler32(self.dictionary)
+        self.level = level
+        self.flags = (COMPRESS if compress else 0) | \
+            (STREAM_MODE if stream and compress else 0)
+        self.mode = 0  # negotiated flags
+        self.negotiated = False
+        self._compressor = None
+        self._start = False  # next STREAM frame starts new stream
+        self._sequence = 0  # next STREAM frame sequence number
+        self._decompressor = None
+        self._expected = 0  # next received STREAM sequence number
+        self._broken = False  # receive stream lost sync
+        self._reset_sent = False  # RESET sent since last STREAM_START
+        self.frames_out = 0
+        self.bytes_in = 0  # payload bytes sent
+        self.bytes_out = 0  # frame bytes sent (header included)
+        self.stored = 0  # frames sent STORED
+        self.frames_received = 0
+        self.bytes_received = 0  # frame bytes received
+        self.payload_received = 0
+        self.errors = 0  # bad or undecodable frames
+        self.resets = 0  # stream resets requested by peer
+
+    def _compressobj(self):
+        if self.dictionary:
+            return zlib.compressobj(self.level, zlib.DEFLATED, -15,
+                                    zdict=self.dictionary)
+        return zlib.compressobj(self.level, zlib.DEFLATED, -15)
+
+    def _decompressobj(self):
+        if self.dictionary:
+            return zlib.decompressobj(-15, zdict=self.dictionary)
+        return zlib.decompressobj(-15)
+
+    def _control(self, frame_type:int) -> bytes:
+        return bytes([frame_type, self.flags]) + \
+            self.dictionary_id.to_bytes(4, 'big')
+
+    def offer(self) -> bytes:
+        """Return OFFER frame."""
+        return self._control(OFFER)
+
+    def _agree(self, flags:int, dictionary_id:int):
+        mode = self.flags & flags
+        if dictionary_id != self.dictionary_id:
+            mode = 0
+        self.mode = mode
+        self.negotiated = True
+        self._compressor = self._compressobj() if mode & STREAM_MODE else None
+        self._start = True
+        self._decompressor = None
+        self._broken = bool(mode & STREAM_MODE)
+        self._reset_sent = False
+
+    def compress(self, payload) -> bytes:
+        """Return frame for payload."""
+        payload = bytes(payload)
+        size = len(payload)
+        mode = self.mode
+        frame = None
+        if mode & STREAM_MODE:
+            # keep copy to undo compressor history if frame is stored
+            saved = self._compressor.copy()
+            data = self._compressor.compress(payload) + \
+                self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            # sync flush ends with 00 00 ff ff, added back by receiver
+            data = data[:-4]
+            if len(data) + 1 < size:
+                if self._start:
+                    self._sequence = 0
+                frame = bytes([STREAM_START if self._start else STREAM,
+                               self._sequence]) + data
+                self._sequence = (self._sequence + 1) & 0xff
+                self._start = False
+            else:
+                self._compressor = saved
+        elif mode & COMPRESS:
+            compressor = self._compressobj()
+            data = compressor.compress(payload) + compressor.flush()
+            if len(data) < size:
+                frame = bytes([DEFLATE]) + data
+        if frame is None:
+            frame = bytes([STORED]) + payload
+            self.stored += 1
+        self.frames_out += 1
+        self.bytes_in += size
+        self.bytes_out += len(frame)
+        return frame
+
+    def frame_in(self, frame):
+        """
+        Process received frame. Return payload (bytes) or None for control
+        frames and frames that cannot be decoded. Control frames may send
+        a response (port needed).
+        """
+        size = len(frame)
+        self.frames_received += 1
+        self.bytes_received += size
+        if not size:
+            self.errors += 1
+            return None
+        frame_type = frame[0]
+        data = bytes(frame[1:])
+        if frame_type == STORED:
+            payload = data
+        elif frame_type == DEFLATE:
+            try:
+                decompressor = self._decompressobj()
+                payload = decompressor.decompress(data) + decompressor.flush()
+            except zlib.error:
+                self.errors += 1
+                return None
+        elif frame_type in (STREAM, STREAM_START):
+            if frame_type == STREAM_START:
+                self._decompressor = self._decompressobj()
+                self._broken = False
+                self._reset_sent = False
+                self._expected = 0
+            if self._broken or not data or data[0] != self._expected:
+                self.errors += 1
+                self._lost_sync()
+                return None
+            self._expected = (self._expected + 1) & 0xff
+            try:
+                payload = self._decompressor.decompress(data[1:] + b'\x00\x00\xff\xff')
+            except zlib.error:
+                self.errors += 1
+                self._lost_sync()
+                return None
+        elif frame_type in (OFFER, ACCEPT):
+            if size < 6:
+                self.errors += 1
+                return None
+            self._agree(frame[1], int.from_bytes(frame[2:6], 'big'))
+            if frame_type == OFFER and self.port is not None:
+                self.port.write(self._control(ACCEPT))
+            return None
+        elif frame_type == RESET:
+            self.resets += 1
+            if self.mode & STREAM_MODE:
+                self._compressor = self._compressobj()
+                self._start = True
+            return None
+        else:
+            self.errors += 1
+            return None
+        self.payload_received += len(payload)
+        return payload
+
+    def _lost_sync(self):
+        # ask sender for a new stream, once per loss of sync
+        self._broken = True
+        self._decompressor = None
+        if self.port is not None and not self._reset_sent:
+            self._reset_sent = True
+            self.port.write(bytes([RESET]))
+
+    def negotiate(self, timeout:float=1.0) -> bool:
+        """
+        Send OFFER and process received frames until the peer's OFFER or
+        ACCEPT arrives or timeout seconds pass. Returns True if negotiated
+        (mode holds the agreed flags). Data frames received meanwhile are
+        discarded.
+        """
+        self.negotiated = False
+        if not self.port.write(self.offer()):
+            return False
+        port = self.port
+        end = time.perf_counter() + timeout
+        while not self.negotiated:
+            left = end - time.perf_counter()
+            if left <= 0:
+                return False
+            readable, writable, errors = \
+                select.select([port._fd], [], [], left)
+            if readable:
+                frame = port.read()
+                if frame is None:
+                    return False
+                self.frame_in(frame)
+        return True
+
+    def send(self, payload) -> bool:
+        """Compress and send payload as one frame."""
+        return self.port.write(self.compress(payload))
+
+    def read(self):
+        """
+        Read frames until a payload is received and return it.
+        Returns None if a read fails.
+        """
+        while True:
+            frame = self.port.read()
+            if frame is None:
+                return None
+            payload = self.frame_in(frame)
+            if payload is not None:
+                return payload
+
+    def ratio(self) -> float:
+        """Return payload bytes sent / frame bytes sent (> 1 = gain)."""
+        if not self.bytes_out:
+            return 1.0
+        return self.bytes_in / self.bytes_out
+
+    def goodput(self, bps:int=None) -> float:
+        """
+        Return payload bits per second a full line carries at the current
+        ratio. bps = line rate (default from port settings).
+        """
+        if bps is None:
+            bps = line_rate(self.port._settings)[0]
+        return bps * self.ratio()
+
+    def __repr__(self):
+        return 'CompressedLink object at ' + hex(id(self)) + '\n' + \
+            'negotiated = ' + str(self.negotiated) + '\n' + \
+            'compress = ' + str(bool(self.mode & COMPRESS)) + '\n' + \
+            'stream = ' + str(bool(self.mode & STREAM_MODE)) + '\n' + \
+            'dictionary size = ' + str(len(self.dictionary)) + '\n' + \
+            'frames_out = ' + str(self.frames_out) + '\n' + \
+            'bytes_in = ' + str(self.bytes_in) + '\n' + \
+            'bytes_out = ' + str(self.bytes_out) + '\n' + \
+            'stored = ' + str(self.stored) + '\n' + \
+            'ratio = ' + '{:.3f}'.format(self.ratio()) + '\n' + \
+            'frames_received = ' + str(self.frames_received) + '\n' + \
+            'payload_received = ' + str(self.payload_received) + '\n' + \
+            'errors = ' + str(self.errors) + '\n' + \
+            'resets = ' + str(self.resets) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
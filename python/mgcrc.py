@@ -0,0 +1,191 @@
+# HDLC frame check sequence (FCS) generation and verification
+#
+# Software CRC compatible with the controller CRC types:
+# - HDLC_CRC_16_CCITT (Port.CRC16) : CRC-16/CCITT, reflected, 16 bit FCS
+# - HDLC_CRC_32_CCITT (Port.CRC32) : CRC-32/CCITT, reflected, 32 bit FCS
+# Both use initial value all ones and send the complemented result
+# LSB first after the frame data (the FCS returned by Port.read() when
+# Settings.discard_received_crc = False).
+#
+# Single frames use CRC routines implemented in C by the standard library
+# (zlib.crc32 is CRC-32/CCITT, binascii.crc_hqx is the non-reflected
+# CRC-16/CCITT and is used on bit reversed data).
+#
+# check_frames() verifies many frames at once. For CRC16, if NumPy is
+# installed, short frames are grouped by length into 2 dimensional arrays
+# and the CRC is advanced 8 bytes per step for all frames together using
+# slicing-by-8 tables. This removes the per frame call overhead (bit
+# reversal and crc_hqx) that dominates for short frames. Longer frames,
+# all CRC32 frames (zlib.crc32 is faster than NumPy at every length) and
+# all frames without NumPy are checked with the single frame routines.
+
+import binascii
+import zlib
+
+from mgapi import HDLC_CRC_NONE, HDLC_CRC_16_CCITT, HDLC_CRC_32_CCITT
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# reflected generator polynomials
+CRC16_POLY = 0x8408
+CRC32_POLY = 0xedb88320
+
+# CRC register value after processing frame data followed by its FCS
+CRC16_GOOD = 0xf0b8
+CRC32_GOOD = 0xdebb20e3
+
+# zlib.crc32() (complemented register) of frame data followed by its FCS
+_ZLIB_CRC32_GOOD = CRC32_GOOD ^ 0xffffffff
+
+# frames per length group below which NumPy is not used
+BATCH_MIN_FRAMES = 16
+
+# longest CRC16 frame checked with NumPy, longer frames are faster with
+# the C routine one frame at a time
+BATCH_MAX_LENGTH = 128
+
+# bit reversed byte values
+_REVERSE = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+
+def fcs_size(crc_type:int) -> int:
+    """Return FCS size in bytes for HDLC_CRC_XXX (or Port.CRCXX) type."""
+    crc_type &= 0xff
+    if crc_type == HDLC_CRC_16_CCITT:
+        return 2
+    elif crc_type == HDLC_CRC_32_CCITT:
+        return 4
+    return 0
+
+
+def crc16(data, crc:int=0xffff) -> int:
+    """Return CRC-16/CCITT register after data (no final complement)."""
+    crc = _REVERSE[crc & 0xff] << 8 | _REVERSE[crc >> 8]
+    crc = binascii.crc_hqx(bytes(data).translate(_REVERSE), crc)
+    return _REVERSE[crc & 0xff] << 8 | _REVERSE[crc >> 8]
+
+
+def crc32(data, crc:int=0xffffffff) -> int:
+    """Return CRC-32/CCITT register after data (no final complement)."""
+    # zlib complements on entry and exit
+    return zlib.crc32(data, crc ^ 0xffffffff) ^ 0xffffffff
+
+
+def fcs(data, crc_type:int) -> bytes:
+    """Return FCS bytes in transmit order for data."""
+    crc_type &= 0xff
+    if crc_type == HDLC_CRC_16_CCITT:
+        return (crc16(data) ^ 0xffff).to_bytes(2, 'little')
+    elif crc_type == HDLC_CRC_32_CCITT:
+        return zlib.crc32(data).to_bytes(4, 'little')
+    return b''
+
+
+def append_fcs(data, crc_type:int) -> bytes:
+    """Return data followed by FCS."""
+    return bytes(data) + fcs(data, crc_type)
+
+
+def check_fcs(frame, crc_type:int) -> bool:
+    """Return True if frame (data followed by FCS) has a valid FCS."""
+    crc_type &= 0xff
+    if crc_type == HDLC_CRC_16_CCITT:
+        return len(frame) > 2 and crc16(frame) == CRC16_GOOD
+    elif crc_type == HDLC_CRC_32_CCITT:
+        return len(frame) > 4 and crc32(frame) == CRC32_GOOD
+    return True
+
+
+def make_tables(poly:int) -> list:
+    """
+    Return 8 slicing tables of 256 entries for reflected poly.
+    tables[k][x] = CRC register of byte x followed by k zero bytes.
+    """
+    table = []
+    for i in range(256):
+        crc = i
+        for bit in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ poly
+            else:
+                crc >>= 1
+        table.append(crc)
+    tables = [table]
+    for k in range(1, 8):
+        previous = tables[k - 1]
+        tables.append([(value >> 8) ^ table[value & 0xff]
+                       for value in previous])
+    return tables
+
+
+CRC16_TABLES = make_tables(CRC16_POLY)
+CRC32_TABLES = make_tables(CRC32_POLY)
+
+
+_numpy_tables = {}
+
+
+def _batch_crc(frames, tables:list, width:int, init:int):
+    # CRC register of each row of 2 dimensional uint8 array frames
+    dtype = numpy.uint32
+    t = _numpy_tables.get(width)
+    if t is None:
+        t = [numpy.array(table, dtype=dtype) for table in tables]
+        _numpy_tables[width] = t
+    rows, size = frames.shape
+    crc = numpy.full(rows, init, dtype=dtype)
+    blocks = size // 8
+    for block in range(blocks):
+        b = frames[:, block * 8:block * 8 + 8].astype(dtype)
+        # fold register into first width/8 data bytes
+        for i in range(width // 8):
+            b[:, i] ^= (crc >> (8 * i)) & 0xff
+        crc = t[7][b[:, 0]]
+        for i in range(1, 8):
+            crc ^= t[7 - i][b[:, i]]
+    for i in range(blocks * 8, size):
+        crc = t[0][(crc ^ frames[:, i]) & 0xff] ^ (crc >> 8)
+    return crc
+
+
+def check_frames(frames:list, crc_type:int) -> list:
+    """Return list of bool (FCS valid) for list of frames (data + FCS)."""
+    crc_type &= 0xff
+    if crc_type == HDLC_CRC_NONE:
+        return [True] * len(frames)
+    if crc_type == HDLC_CRC_32_CCITT:
+        # one zlib.crc32 call per frame, no NumPy
+        crc32 = zlib.crc32
+        return [len(frame) > 4 and crc32(frame) == _ZLIB_CRC32_GOOD
+                for frame in frames]
+    size = fcs_size(crc_type)
+    if numpy is None or len(frames) < BATCH_MIN_FRAMES:
+        return [check_fcs(frame, crc_type) for frame in frames]
+
+    # group indexes of frames short enough for NumPy by length
+    max_length = BATCH_MAX_LENGTH
+    groups = {}
+    for index, frame in enumerate(frames):
+        length = len(frame)
+        if size < length <= max_length:
+            groups.setdefault(length, []).append(index)
+    if not groups:
+        # no batch work: plain loop, never slower than check_fcs()
+        return [check_fcs(frame, crc_type) for frame in frames]
+
+    result = [size < len(frame) <= max_length or check_fcs(frame, crc_type)
+              for frame in frames]
+    for length, indexes in groups.items():
+        if len(indexes) < BATCH_MIN_FRAMES:
+            for index in indexes:
+                result[index] = check_fcs(frames[index], crc_type)
+            continue
+        array = numpy.frombuffer(b''.join(frames[index] for index in indexes),
+                                 dtype=numpy.uint8).reshape(len(indexes), length)
+        good_rows = _batch_crc(array, CRC16_TABLES, 16, 0xffff) == CRC16_GOOD
+        for index, ok in zip(indexes, good_rows.tolist()):
+            result[index] = ok
+    return result
@@ -0,0 +1,570 @@
+# Reed-Solomon forward error correction for RAW and XSYNC links
+#
+# Simplex RAW and XSYNC links have no return channel for retransmission.
+# FecEncoder adds Reed-Solomon parity to send data and FecDecoder corrects
+# received data.
+#
+# - RS(n, n - nsym) over GF(256) (polynomial 0x11d, first root a^0),
+#   default RS(255, 223): 32 parity bytes correct up to 16 byte errors per
+#   codeword. nsym sets the code rate, n < 255 gives a shortened code.
+# - depth codewords are byte interleaved into one block, so a burst of up
+#   to depth * nsym / 2 bytes is corrected.
+#
+#   block = depth * n bytes, carrying depth * (n - nsym) data bytes
+#
+# FecEncoder.write() sends the sync pattern (Settings.sync_pattern,
+# xsync_sync_size bytes, as mgxsync.XsyncWriter) before every block, so
+# the receiver can find the blocks:
+#
+#   sync | block | sync | block ...
+#
+# For XSYNC set Settings.xsync_block_size = FecEncoder.block_size: the
+# receiver hunts for the sync pattern, discards it and returns each block
+# for FecDecoder.read()/decode(). For RAW, give FecDecoder an
+# mgsync.SyncHunter(FecEncoder.sync): receive()/read() align the receive
+# stream on the first sync pattern, then check and remove the sync pattern
+# between blocks (a mismatch starts a new hunt).
+#
+# Encoding is synthetic division by the generator polynomial using a
+# table of generator multiples: with NumPy one table lookup and XOR per
+# data position for all codewords of all blocks together, without NumPy the
+# parity of each codeword is kept as a single Python integer. Decoding
+# first computes syndromes for all codewords of a block (NumPy: table
+# lookups and an XOR reduction, else the parity is recomputed and
+# compared). Only codewords with errors go through Berlekamp-Massey,
+# Chien search (NumPy: all positions at once) and Forney correction.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from collections import deque
+
+from mgapi import Port
+from mgxsync import sync_bytes
+
+PRIMITIVE = 0x11d
+
+# bit reversed byte values for msb_first ports
+_REVERSE = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+# GF(256) exponent (doubled to skip modulo 255) and log tables
+EXP = [0] * 512
+LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    EXP[_i] = _x
+    LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= PRIMITIVE
+for _i in range(255, 512):
+    EXP[_i] = EXP[_i - 255]
+del _x, _i
+
+
+def gf_mul(a:int, b:int) -> int:
+    """Return GF(256) product."""
+    if not a or not b:
+        return 0
+    return EXP[LOG[a] + LOG[b]]
+
+
+def gf_inverse(a:int) -> int:
+    """Return GF(256) multiplicative inverse of a (not 0)."""
+    return EXP[255 - LOG[a]]
+
+
+def _poly_eval(poly:list, x:int) -> int:
+    # evaluate polynomial (lowest degree first) at x
+    y = 0
+    for c in reversed(poly):
+        y = gf_mul(y, x) ^ c
+    return y
+
+
+def generator(nsym:int) -> list:
+    """Return generator polynomial coefficients, highest degree first."""
+    g = [1]
+    for i in range(nsym):
+        # multiply by (x - a^i)
+        root = EXP[i]
+        g = [c ^ gf_mul(p, root) for c, p in zip(g + [0], [0] + g)]
+    return g
+
+
+class ReedSolomon():
+    """RS(n, n - nsym) encoder/decoder over GF(256)."""
+
+    def __init__(self, nsym:int=32, n:int=255):
+        """
+        nsym = parity bytes per codeword (corrects nsym / 2 byte errors)
+        n = codeword size (255 or less for shortened code)
+        """
+        assert 0 < nsym < n <= 255, 'must have 0 < nsym < n <= 255'
+        self.nsym = nsym
+        self.n = n
+        self.k = n - nsym
+        g = generator(nsym)
+        self._gen = g
+        # generator multiples c * g[1:] for each c: as integers (parity
+        # register, first parity byte most significant) and rows of bytes
+        rows = [bytes(gf_mul(c, x) for x in g[1:]) for c in range(256)]
+        self._gen_int = [int.from_bytes(row, 'big') for row in rows]
+        self._shift = 8 * (nsym - 1)
+        self._mask = (1 << 8 * nsym) - 1
+        if numpy is not None:
+            self._gen_table = numpy.frombuffer(b''.join(rows),
+                                               numpy.uint8).reshape(256, nsym)
+            log = numpy.array(LOG, numpy.intp)
+            mul = numpy.array(EXP, numpy.uint8)[log[:, None] + log[None, :]]
+            mul[0, :] = 0
+            mul[:, 0] = 0
+            self._mul = mul.ravel()
+            # syndrome i term for position j: a^(i * (n - 1 - j)), columns
+            # padded with 0 to a multiple of 8 to XOR 8 syndromes at a time
+            width = -(-nsym // 8) * 8
+            self._powers = numpy.array(
+                [[EXP[(i * (n - 1 - j)) % 255] if i < nsym else 0
+                  for i in range(width)] for j in range(n)], numpy.intp)
+            self._exp = numpy.array(EXP[:255], numpy.uint8)
+            # log of X^-1 for each position
+            self._inverse_log = numpy.array(
+                [(255 - (n - 1 - j)) % 255 for j in range(n)], numpy.int64)
+
+    def parity(self, data) -> bytes:
+        """Return nsym parity bytes for k data bytes."""
+        gen = self._gen_int
+        shift = self._shift
+        mask = self._mask
+        p = 0
+        for b in data:
+            p = ((p << 8) & mask) ^ gen[b ^ (p >> shift)]
+        return p.to_bytes(self.nsym, 'big')
+
+    def encode(self, data) -> bytes:
+        """Return codeword (data + parity) for k data bytes."""
+        assert len(data) == self.k, 'data must be k bytes'
+        return bytes(data) + self.parity(data)
+
+    def encode_array(self, data):
+        """
+        Return parity for codewords in NumPy uint8 array data
+        (codewords x k) as array (codewords x nsym).
+        """
+        count, k = data.shape
+        nsym = self.nsym
+        work = numpy.zeros((count, k + nsym), numpy.uint8)
+        work[:, :k] = data
+        table = self._gen_table
+        for j in range(k):
+            work[:, j + 1:j + 1 + nsym] ^= table[work[:, j]]
+        return work[:, k:]
+
+    def syndromes(self, codeword) -> list:
+        """Return list of nsym syndromes for codeword (all 0 if no errors)."""
+        out = []
+        for i in range(self.nsym):
+            x = EXP[i]
+            s = 0
+            if x == 1:
+                for c in codeword:
+                    s ^= c
+            else:
+                log_x = LOG[x]
+                for c in codeword:
+                    s = (EXP[LOG[s] + log_x] if s else 0) ^ c
+            out.append(s)
+        return out
+
+    def syndrome_array(self, codewords):
+        """
+        Return syndromes of codewords in NumPy uint8 array
+        (codewords x n) as array (codewords x nsym).
+        """
+        index = (codewords.astype(numpy.intp)[:, :, None] << 8) | \
+            self._powers[None, :, :]
+        terms = self._mul.take(index).view(numpy.uint64)
+        synd = numpy.bitwise_xor.reduce(terms, axis=1).view(numpy.uint8)
+        return synd[:, :self.nsym]
+
+    def correct(self, codeword, synd:list=None):
+        """
+        Correct codeword (bytearray, changed in place).
+        Return number of corrected bytes, -1 if uncorrectable.
+        """
+        if synd is None:
+            synd = self.syndromes(codeword)
+        if not any(synd):
+            return 0
+        n = self.n
+        # Berlekamp-Massey: error locator, lowest degree first
+        locator = [1]
+        previous = [1]
+        length = 0  # number of errors
+        shift = 1
+        last = 1  # discrepancy when previous was saved
+        for i in range(self.nsym):
+            delta = synd[i]
+            for j in range(1, min(length, i) + 1):
+                delta ^= gf_mul(locator[j], synd[i - j])
+            if not delta:
+                shift += 1
+                continue
+            scale = gf_mul(delta, gf_inverse(last))
+            update = [0] * shift + [gf_mul(scale, c) for c in previous]
+            saved = locator
+            if len(update) > len(locator):
+                locator = locator + [0] * (len(update) - len(locator))
+            else:
+                locator = locator[:]
+            for j, c in enumerate(update):
+                locator[j] ^= c
+            if 2 * length <= i:
+                length = i + 1 - length
+                previous = saved
+                last = delta
+                shift = 1
+            else:
+                shift += 1
+        while len(locator) > 1 and not locator[-1]:
+            locator.pop()
+        errors = len(locator) - 1
+        if errors != length or 2 * errors > self.nsym:
+            return -1
+        # Chien search: position p has locator root X^-1, X = a^(n-1-p)
+        if numpy is not None:
+            # all positions at once: term j at X^-1 = a^(j * log(X^-1))
+            total = numpy.zeros(n, numpy.uint8)
+            for j, c in enumerate(locator):
+                if c:
+                    total ^= self._exp[(LOG[c] + j * self._inverse_log) % 255]
+            positions = numpy.flatnonzero(total == 0).tolist()
+        else:
+            positions = [p for p in range(n) if
+                         not _poly_eval(locator,
+                                        EXP[(255 - (n - 1 - p)) % 255])]
+        if len(positions) != errors:
+            return -1
+        # Forney: error evaluator = S(x) * locator(x) mod x^nsym
+        evaluator = [0] * self.nsym
+        for i, s in enumerate(synd):
+            if s:
+                for j, c in enumerate(locator[:self.nsym - i]):
+                    evaluator[i + j] ^= gf_mul(s, c)
+        # formal derivative: odd degree terms
+        derivative = [locator[j] if j & 1 else 0
+                      for j in range(1, len(locator))]
+        for p in positions:
+            x = EXP[n - 1 - p]
+            x_inv = gf_inverse(x)
+            denominator = _poly_eval(derivative, x_inv)
+            if not denominator:
+                return -1
+            magnitude = gf_mul(gf_mul(x, _poly_eval(evaluator, x_inv)),
+                               gf_inverse(denominator))
+            codeword[p] ^= magnitude
+        if numpy is not None:
+            check = self.syndrome_array(
+                numpy.frombuffer(codeword, numpy.uint8).reshape(1, n))
+            if check.any():
+                return -1
+        elif any(self.syndromes(codeword)):
+            return -1
+        return errors
+
+    def __repr__(self):
+        return 'ReedSolomon object at ' + hex(id(self)) + '\n' + \
+            'n = ' + str(self.n) + '\n' + \
+            'k = ' + str(self.k) + '\n' + \
+            'nsym = ' + str(self.nsym) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class FecEncoder():
+    """Add interleaved Reed-Solomon parity to send data."""
+
+    def __init__(self, port:Port=None, nsym:int=32, depth:int=8,
+                 n:int=255, codec:ReedSolomon=None, sync_pattern:int=None,
+                 sync_size:int=None):
+        """
+        port = open Port configured for RAW or XSYNC (needed for write())
+        nsym = parity bytes per codeword
+        depth = codewords interleaved per block
+        n = codeword size (255 or less for shortened code)
+        codec = ReedSolomon object to share tables (overrides nsym and n)
+        sync_pattern = sync pattern sent before each block by write()
+                       and pack() (default port sync_pattern)
+        sync_size = sync pattern size in bytes (default port
+                    xsync_sync_size)
+        """
+        assert depth > 0, 'depth must be greater than 0'
+        if codec is None:
+            codec = ReedSolomon(nsym, n)
+        if port is not None:
+            settings = port._settings
+            if sync_pattern is None:
+                sync_pattern = settings.sync_pattern
+            if sync_size is None:
+                sync_size = settings.xsync_sync_size
+        if sync_size is None:
+            sync_size = 4
+        assert 1 <= sync_size <= 4, 'sync_size must be 1 to 4'
+        self.port = port
+        self.codec = codec
+        self.depth = depth
+        self.block_size = depth * codec.n
+        self.data_size = depth * codec.k
+        self.sync = sync_bytes(sync_pattern or 0, sync_size)
+        self.blocks = 0
+
+    def encode_block(self, data) -> bytearray:
+        """Return block for data_size bytes of data."""
+        codec = self.codec
+        depth = self.depth
+        k = codec.k
+        block = bytearray(self.block_size)
+        if numpy is not None:
+            array = numpy.frombuffer(data, numpy.uint8).reshape(depth, k)
+            parity = codec.encode_array(array)
+            # column major: byte j of every codeword, then byte j + 1
+            block[:depth * k] = array.T.tobytes()
+            block[depth * k:] = parity.T.tobytes()
+        else:
+            for c in range(depth):
+                codeword = data[c * k:(c + 1) * k]
+                block[c::depth] = bytes(codeword) + codec.parity(codeword)
+        self.blocks += 1
+        return block
+
+    def encode(self, data) -> bytearray:
+        """
+        Return blocks for data. The last block is zero filled to
+        data_size (message framing is left to the caller).
+        """
+        data = memoryview(data).cast('B')
+        size = len(data)
+        data_size = self.data_size
+        if numpy is not None:
+            # all blocks in one pass
+            count = max(-(-size // data_size), 1)
+            codec = self.codec
+            depth = self.depth
+            array = numpy.zeros(count * data_size, numpy.uint8)
+            array[:size] = numpy.frombuffer(data, numpy.uint8)
+            array = array.reshape(count * depth, codec.k)
+            parity = codec.encode_array(array)
+            codewords = numpy.concatenate((array, parity), axis=1)
+            self.blocks += count
+            return bytearray(codewords.reshape(count, depth, codec.n)
+                             .transpose(0, 2, 1).tobytes())
+        out = bytearray()
+        for i in range(0, size, data_size):
+            chunk = data[i:i + data_size]
+            if len(chunk) < data_size:
+                chunk = bytes(chunk) + bytes(data_size - len(chunk))
+            out += self.encode_block(chunk)
+        return out
+
+    def pack(self, data) -> bytearray:
+        """Return sync + block units for data (blocks as encode())."""
+        blocks = self.encode(data)
+        block_size = self.block_size
+        sync = self.sync
+        unit_size = len(sync) + block_size
+        count = len(blocks) // block_size
+        out = bytearray(count * unit_size)
+        for i in range(count):
+            start = i * unit_size
+            out[start:start + len(sync)] = sync
+            out[start + len(sync):start + unit_size] = \
+                blocks[i * block_size:(i + 1) * block_size]
+        return out
+
+    def write(self, data) -> bool:
+        """
+        Encode data and send sync + block units, return False if a write
+        fails.
+        """
+        out = memoryview(self.pack(data))
+        unit_size = len(self.sync) + self.block_size
+        step = max(self.port._defaults.max_data_size // unit_size, 1) \
+            * unit_size
+        for i in range(0, len(out), step):
+            if not self.port.write(out[i:i + step]):
+                return False
+        return True
+
+    def __repr__(self):
+        return 'FecEncoder object at ' + hex(id(self)) + '\n' + \
+            'code = RS(' + str(self.codec.n) + ', ' + str(self.codec.k) + ')\n' + \
+            'depth = ' + str(self.depth) + '\n' + \
+            'block_size = ' + str(self.block_size) + '\n' + \
+            'blocks = ' + str(self.blocks) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class FecDecoder():
+    """Correct received interleaved Reed-Solomon blocks."""
+
+    def __init__(self, port:Port=None, nsym:int=32, depth:int=8,
+                 n:int=255, codec:ReedSolomon=None, hunter=None):
+        """
+        port = open Port configured for RAW or XSYNC (needed for read())
+        nsym = parity bytes per codeword
+        depth = codewords interleaved per block
+        n = codeword size (255 or less for shortened code)
+        codec = ReedSolomon object to share tables (overrides nsym and n)
+        hunter = mgsync.SyncHunter(FecEncoder.sync) for RAW receive
+                 (receive()), None for XSYNC (one block per read)
+        """
+        assert depth > 0, 'depth must be greater than 0'
+        if codec is None:
+            codec = ReedSolomon(nsym, n)
+        self.port = port
+        self.codec = codec
+        self.depth = depth
+        self.block_size = depth * codec.n
+        self.data_size = depth * codec.k
+        self.hunter = hunter
+        if hunter is not None:
+            # sync pattern bytes as they appear in the aligned stream
+            sync = hunter.pattern.to_bytes(hunter.bits // 8, 'little')
+            if hunter.msb_first:
+                sync = sync.translate(_REVERSE)
+            self._sync = sync
+        self._stream = bytearray()  # aligned RAW data not yet decoded
+        self._sync_next = False  # sync pattern expected next in stream
+        self._decoded = deque()  # blocks decoded, not returned by read()
+        self.sync_errors = 0
+        self.blocks = 0
+        self.codewords = 0
+        self.corrected_codewords = 0
+        self.corrected_bytes = 0
+        self.uncorrectable = 0
+
+    def decode(self, block) -> tuple:
+        """
+        Return (data, ok) for block of block_size bytes.
+        ok = False if any codeword could not be corrected (its data is
+        returned as received).
+        """
+        assert len(block) == self.block_size, 'block must be block_size bytes'
+        codec = self.codec
+        depth = self.depth
+        n = codec.n
+        k = codec.k
+        self.blocks += 1
+        self.codewords += depth
+        if numpy is not None:
+            array = numpy.array(
+                numpy.frombuffer(block, numpy.uint8).reshape(n, depth).T,
+                order='C')  # copy: never writes to block
+            synd = codec.syndrome_array(array)
+            bad = numpy.flatnonzero(synd.any(axis=1))
+            if not len(bad):
+                return array[:, :k].tobytes(), True
+            ok = True
+            for c in bad:
+                codeword = bytearray(array[c].tobytes())
+                if not self._correct(codeword, synd[c].tolist()):
+                    ok = False
+                array[c] = numpy.frombuffer(codeword, numpy.uint8)
+            return array[:, :k].tobytes(), ok
+        data = bytearray(self.data_size)
+        ok = True
+        for c in range(depth):
+            codeword = bytearray(block[c::depth])
+            if codec.parity(codeword[:k]) != codeword[k:]:
+                if not self._correct(codeword, None):
+                    ok = False
+            data[c * k:(c + 1) * k] = codeword[:k]
+        return bytes(data), ok
+
+    def _correct(self, codeword:bytearray, synd:list) -> bool:
+        count = self.codec.correct(codeword, synd)
+        if count < 0:
+            self.uncorrectable += 1
+            return False
+        self.corrected_codewords += 1
+        self.corrected_bytes += count
+        return True
+
+    def receive(self, buf) -> list:
+        """
+        Add RAW receive data buf (needs hunter) and return list of
+        (data, ok) as decode() for each block completed. The hunter finds
+        the first sync pattern, the sync pattern before each later block
+        is checked and removed. A mismatch (sync_errors) discards the
+        rest of the data held and hunts again in the next receive data.
+        """
+        out = []
+        aligned = self.hunter.receive(buf)
+        if not len(aligned):
+            return out
+        stream = self._stream
+        stream += aligned
+        sync = self._sync
+        block_size = self.block_size
+        pos = 0
+        while True:
+            if self._sync_next:
+                if len(stream) - pos < len(sync):
+                    break
+                if stream[pos:pos + len(sync)] != sync:
+                    # lost alignment: hunt again in following receive data
+                    self.sync_errors += 1
+                    stream.clear()
+                    self._sync_next = False
+                    self.hunter.hunt()
+                    return out
+                pos += len(sync)
+                self._sync_next = False
+            if len(stream) - pos < block_size:
+                break
+            out.append(self.decode(stream[pos:pos + block_size]))
+            pos += block_size
+            self._sync_next = True
+        del stream[:pos]
+        return out
+
+    def read(self) -> tuple:
+        """
+        Read block_size bytes from port (RAW: through receive()) and
+        return (data, ok) as decode(). Returns None if a read fails.
+        """
+        if self.hunter is not None:
+            decoded = self._decoded
+            while not decoded:
+                buf = self.port.read(self.port._defaults.max_data_size)
+                if not buf:
+                    return None
+                decoded.extend(self.receive(buf))
+            return decoded.popleft()
+        block = bytearray()
+        while len(block) < self.block_size:
+            buf = self.port.read(min(self.block_size - len(block),
+                                     self.port._defaults.max_data_size))
+            if not buf:
+                return None
+            block += buf
+        return self.decode(block)
+
+    def __repr__(self):
+        return 'FecDecoder object at ' + hex(id(self)) + '\n' + \
+            'code = RS(' + str(self.codec.n) + ', ' + str(self.codec.k) + ')\n' + \
+            'depth = ' + str(self.depth) + '\n' + \
+            'blocks = ' + str(self.blocks) + '\n' + \
+            'sync_errors = ' + str(self.sync_errors) + '\n' + \
+            'codewords = ' + str(self.codewords) + '\n' + \
+            'corrected_codewords = ' + str(self.corrected_codewords) + '\n' + \
+            'corrected_bytes = ' + str(self.corrected_bytes) + '\n' + \
+            'uncorrectable = ' + str(self.uncorrectable) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
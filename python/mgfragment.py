@@ -0,0 +1,237 @@
+# Fragmentation and reassembly of large messages over HDLC frames
+#
+# In N_HDLC mode Port.read() returns at most max_data_size (4096) bytes per
+# frame. Fragmenter splits messages of any size up to MAX_MESSAGE_SIZE into
+# frames and Reassembler rebuilds them on receive.
+#
+#   first fragment:  id | index = 0 | total size | data
+#                     1    3          4
+#   other fragments: id | index | data
+#                     1    3
+#
+# id = message number (mod 256)
+# index = fragment number within message
+# total size = message size, so the receiver knows the last fragment and
+#              can check the message fits its buffer
+#
+# Messages are split into equal size fragments (no short last fragment)
+# of up to frame_size bytes, each copied once into a preallocated frame
+# buffer and written in turn so the driver holds a pipeline of frames.
+#
+# Frames arrive in order on one HDLC link, so the reassembler holds one
+# message at a time in a preallocated buffer. A missing fragment (index or
+# id out of sequence) or a frame with bad status discards the message, as
+# does no fragment arriving within timeout seconds.
+
+import time
+
+from mgapi import Port, RX_OK
+
+HEADER_SIZE = 4
+FIRST_HEADER_SIZE = 8
+MAX_MESSAGE_SIZE = 0xffffffff
+
+
+class Fragmenter():
+    """Send large messages as a series of HDLC frames."""
+
+    def __init__(self, port:Port, frame_size:int=None):
+        """
+        port = open Port configured for HDLC (N_HDLC line discipline)
+        frame_size = max frame size (default max_data_size)
+        """
+        if frame_size is None:
+            frame_size = port._defaults.max_data_size
+        assert frame_size > FIRST_HEADER_SIZE, 'frame_size too small'
+        self.port = port
+        self.frame_size = frame_size
+        self._buf = bytearray(frame_size)
+        self._view = memoryview(self._buf)
+        self._id = 0
+        self.messages = 0
+        self.frames = 0
+        self.bytes = 0
+
+    def fragment_size(self, size:int) -> int:
+        """Return data bytes per fragment for message of size bytes."""
+        # fragments after the first carry 4 more data bytes, ignored here
+        room = self.frame_size - FIRST_HEADER_SIZE
+        count = max(-(-size // room), 1)
+        return -(-size // count)
+
+    def send(self, message) -> bool:
+        """Send message, return False if a write fails."""
+        view = memoryview(message).cast('B')
+        size = len(view)
+        assert size <= MAX_MESSAGE_SIZE, 'message too large'
+        step = self.fragment_size(size)
+        buf = self._buf
+        frame = self._view
+        buf[0] = self._id
+        buf[1:4] = bytes(3)
+        buf[4:8] = size.to_bytes(4, 'big')
+        count = min(step, size)
+        buf[8:8 + count] = view[:count]
+        if not self.port.write(frame[:8 + count]):
+            return False
+        frames = 1
+        pos = count
+        index = 1
+        while pos < size:
+            count = min(step, size - pos)
+            buf[1:4] = index.to_bytes(3, 'big')
+            buf[4:4 + count] = view[pos:pos + count]
+            if not self.port.write(frame[:4 + count]):
+                self.frames += frames
+                return False
+            frames += 1
+            pos += count
+            index += 1
+        self._id = (self._id + 1) & 0xff
+        self.messages += 1
+        self.frames += frames
+        self.bytes += size
+        return True
+
+    def __repr__(self):
+        return 'Fragmenter object at ' + hex(id(self)) + '\n' + \
+            'frame_size = ' + str(self.frame_size) + '\n' + \
+            'messages = ' + str(self.messages) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Reassembler():
+    """Rebuild messages from received fragment frames."""
+
+    def __init__(self, port:Port=None, max_size:int=0x100000,
+                 timeout:float=1.0):
+        """
+        port = open Port configured for HDLC (needed for read_message())
+        max_size = largest message accepted (receive buffer size)
+        timeout = seconds without a fragment before a partial message is
+                  discarded, None = no timeout
+        """
+        self.port = port
+        self.max_size = max_size
+        self.timeout = timeout
+        self._buf = bytearray(max_size)
+        self._view = memoryview(self._buf)
+        self._id = None  # id of message in progress
+        self._index = 0  # next fragment index
+        self._size = 0  # message size
+        self._count = 0  # bytes received
+        self._time = 0.0  # time of last fragment
+        self.messages = 0
+        self.frames = 0
+        self.bytes = 0
+        self.lost = 0  # messages discarded (missing fragments, bad frames)
+        self.timeouts = 0
+        self.oversize = 0
+        self.errors = 0  # frames with bad status or bad header
+
+    def reset(self):
+        """Discard partial message."""
+        self._id = None
+
+    def _discard(self):
+        if self._id is not None:
+            self.lost += 1
+            self._id = None
+
+    def poll(self):
+        """Discard partial message if timeout has passed."""
+        if self._id is not None and self.timeout is not None and \
+           time.perf_counter() - self._time > self.timeout:
+            self.timeouts += 1
+            self._discard()
+
+    def frame_in(self, frame):
+        """
+        Add received frame data, return completed message or None.
+        The message is a memoryview of the receive buffer, valid until the
+        next call.
+        """
+        self.frames += 1
+        size = len(frame)
+        if size < HEADER_SIZE:
+            self.errors += 1
+            self._discard()
+            return None
+        now = time.perf_counter()
+        if self._id is not None and self.timeout is not None and \
+           now - self._time > self.timeout:
+            self.timeouts += 1
+            self._discard()
+        self._time = now
+        message_id = frame[0]
+        index = int.from_bytes(frame[1:4], 'big')
+        if not index:
+            self._discard()
+            if size < FIRST_HEADER_SIZE:
+                self.errors += 1
+                return None
+            total = int.from_bytes(frame[4:8], 'big')
+            if total > self.max_size:
+                self.oversize += 1
+                return None
+            self._id = message_id
+            self._size = total
+            self._count = 0
+            self._index = 0
+            data = frame[FIRST_HEADER_SIZE:]
+        else:
+            if message_id != self._id or index != self._index:
+                # fragment of discarded message or missing fragment
+                self._discard()
+                return None
+            data = frame[HEADER_SIZE:]
+        count = self._count
+        end = count + len(data)
+        if end > self._size:
+            self.errors += 1
+            self._discard()
+            return None
+        self._buf[count:end] = data
+        self._count = end
+        self._index += 1
+        if end < self._size:
+            return None
+        self._id = None
+        self.messages += 1
+        self.bytes += end
+        return self._view[:end]
+
+    def read_message(self):
+        """
+        Read frames (Port.read_frame()) until a message is complete and
+        return it (see frame_in()). Returns None if a read fails.
+        """
+        while True:
+            frame = self.port.read_frame()
+            if frame is None:
+                return None
+            if frame.status != RX_OK:
+                self.errors += 1
+                self._discard()
+                continue
+            message = self.frame_in(frame.data)
+            if message is not None:
+                return message
+
+    def __repr__(self):
+        return 'Reassembler object at ' + hex(id(self)) + '\n' + \
+            'max_size = ' + str(self.max_size) + '\n' + \
+            'messages = ' + str(self.messages) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n' + \
+            'lost = ' + str(self.lost) + '\n' + \
+            'timeouts = ' + str(self.timeouts) + '\n' + \
+            'oversize = ' + str(self.oversize) + '\n' + \
+            'errors = ' + str(self.errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
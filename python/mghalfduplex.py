@@ -0,0 +1,198 @@
+# Request/response over half-duplex lines with measured turnaround
+#
+# Every exchange in samples/2wire.py switches the line with separate calls:
+#
+#   rts = True, disable_receiver(), write(), flush(),
+#   rts = False, enable_receiver(), read()
+#
+# and the send is always drained with tcdrain. HalfDuplexLink does the
+# same turnaround with:
+#
+# - no RTS calls when HDLC_FLAG_AUTO_RTS (Settings.auto_rts) is set: the
+#   driver raises RTS for sending and drops it when the send completes.
+#   auto_rts=True applies port settings with auto_rts enabled.
+# - drain (tcdrain) only when the receiver must not be enabled before the
+#   send completes (two_wire: the receiver would see our own send data) or
+#   RTS must be dropped by software
+# - RTS and the receiver always restored after a send, even if the write
+#   fails
+# - optional response timeout (select() before the read, only when a
+#   timeout is given)
+#
+# Without auto_rts the same calls as samples/2wire.py are made and the
+# histogram updates add a few usec per exchange: it is no faster than the
+# sample. Only a port with auto_rts turns the line around faster.
+#
+# The time taken to turn the line around from send to receive and the
+# full exchange latency (start of send until response received) are
+# recorded per exchange in LatencyHistogram objects.
+
+import select
+import termios
+import time
+from copy import deepcopy
+
+from mgapi import Port
+
+
+class LatencyHistogram():
+    """Histogram of times with power of 2 microsecond buckets."""
+
+    def __init__(self, bucket_count:int=32):
+        """bucket_count = number of buckets, bucket n holds 2^n to 2^(n+1)-1 usec"""
+        self.buckets = [0] * bucket_count
+        self.reset()
+
+    def reset(self):
+        """Clear histogram."""
+        for i in range(len(self.buckets)):
+            self.buckets[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds:float):
+        """Add time in seconds to histogram."""
+        usec = int(seconds * 1000000)
+        index = min(usec.bit_length() - 1, len(self.buckets) - 1)
+        self.buckets[max(index, 0)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self) -> float:
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, p:float) -> float:
+        """Return upper bound in seconds of bucket holding percentile p (0-100)."""
+        if not self.count:
+            return 0.0
+        limit = self.count * p / 100
+        total = 0
+        for index, count in enumerate(self.buckets):
+            total += count
+            if total >= limit:
+                return min((1 << (index + 1)) / 1000000, self.max)
+        return self.max
+
+    def __repr__(self):
+        s = 'LatencyHistogram object at ' + hex(id(self)) + '\n' + \
+            'count = ' + str(self.count) + '\n'
+        if not self.count:
+            return s
+        s += 'min = ' + '{:.1f}'.format(self.min * 1000000) + ' usec\n' + \
+            'mean = ' + '{:.1f}'.format(self.mean * 1000000) + ' usec\n' + \
+            'max = ' + '{:.1f}'.format(self.max * 1000000) + ' usec\n'
+        for index, count in enumerate(self.buckets):
+            if count:
+                s += '{:>9d}'.format(1 << index) + ' usec+ ' + \
+                    '{:>9d}'.format(count) + '\n'
+        return s
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class HalfDuplexLink():
+    """Request/response on a half-duplex line with minimal turnaround."""
+
+    def __init__(self, port:Port, two_wire:bool=True, auto_rts:bool=False,
+                 timeout:float=None):
+        """
+        port = open Port with settings applied
+        two_wire = send and receive share one data pair: disable receiver
+                   while sending
+        auto_rts = apply port settings with Settings.auto_rts enabled
+                   (not ASYNC) so the driver controls RTS. If False, the
+                   port's current auto_rts setting is used.
+        timeout = default response timeout in seconds, None = wait forever
+        """
+        self.port = port
+        self.two_wire = two_wire
+        self.timeout = timeout
+        settings = port._settings
+        if auto_rts and not settings.auto_rts and \
+           settings.protocol != Port.ASYNC:
+            settings = deepcopy(settings)
+            settings.auto_rts = True
+            port.apply_settings(settings)
+        self.auto_rts = port._settings.auto_rts
+        self._drain = two_wire or not self.auto_rts
+        self.turnaround = LatencyHistogram()
+        self.latency = LatencyHistogram()
+        self.exchanges = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def send(self, buf) -> bool:
+        """Send buf and turn line around to receive."""
+        port = self.port
+        if not self.auto_rts:
+            port.rts = True
+        if self.two_wire:
+            port.disable_receiver()
+        try:
+            if not port.write(buf):
+                self.errors += 1
+                return False
+            start = time.perf_counter()
+            if self._drain:
+                try:
+                    termios.tcdrain(port._fd)
+                except termios.error:
+                    pass
+        finally:
+            if not self.auto_rts:
+                port.rts = False
+            if self.two_wire:
+                port.enable_receiver()
+        self.turnaround.add(time.perf_counter() - start)
+        return True
+
+    def receive(self, timeout:float=None):
+        """
+        Return received data or None if no data within timeout seconds
+        (default link timeout).
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is not None:
+            readable, writable, errors = \
+                select.select([self.port._fd], [], [], timeout)
+            if not readable:
+                self.timeouts += 1
+                return None
+        return self.port.read(self.port._defaults.max_data_size)
+
+    def exchange(self, request, timeout:float=None):
+        """Send request and return response, None on timeout or error."""
+        start = time.perf_counter()
+        if not self.send(request):
+            return None
+        response = self.receive(timeout)
+        if response is not None:
+            self.exchanges += 1
+            self.latency.add(time.perf_counter() - start)
+        return response
+
+    def __repr__(self):
+        return 'HalfDuplexLink object at ' + hex(id(self)) + '\n' + \
+            'two_wire = ' + str(self.two_wire) + '\n' + \
+            'auto_rts = ' + str(self.auto_rts) + '\n' + \
+            'exchanges = ' + str(self.exchanges) + '\n' + \
+            'timeouts = ' + str(self.timeouts) + '\n' + \
+            'errors = ' + str(self.errors) + '\n' + \
+            'turnaround mean = ' + \
+            '{:.1f}'.format(self.turnaround.mean * 1000000) + ' usec\n' + \
+            'latency mean = ' + \
+            '{:.1f}'.format(self.latency.mean * 1000000) + ' usec\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,325 @@
+# Software HDLC framing for RAW mode
+#
+# Some links require Port.RAW (non-standard clocking) but still carry HDLC
+# frames. HdlcEncoder and HdlcDecoder implement HDLC framing in software:
+# flags, zero bit insertion/removal, abort detection and frame check
+# sequence (FCS).
+#
+# Bit stuffing is done with precomputed byte transition tables instead of
+# per bit loops. The table index is (state << 8) | byte where state is the
+# count of consecutive one bits preceding the byte. Each entry holds the
+# resulting state and the output bits for the whole byte, so the per byte
+# work is one table lookup and a few integer operations. Decoder entries
+# for bytes containing a flag or abort hold a short list of segments.
+#
+# Serial bit order is LSB first (as RAW mode receives). Set msb_first when
+# the port is configured with Settings.msb_first = True.
+#
+# HdlcDecoder returns frames in the same form as Port.read() in N_HDLC mode:
+# - return_ex = False : frame data without FCS, frames with errors dropped
+# - return_ex = True  : frame data + FCS + status byte (RX_OK/RX_CRC_ERROR)
+#                       as with Settings.discard_data_with_error = False
+
+from mgapi import Port, RX_OK, RX_CRC_ERROR
+from mgcrc import fcs, fcs_size
+
+HDLC_FLAG = 0x7e
+
+# decoder segment event codes
+_FLAG = -1
+_ABORT = -2
+
+# bit reversed byte values for msb_first ports
+_REVERSE = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+
+def _build_decode_table() -> list:
+    table = []
+    for state in range(8):
+        for byte in range(256):
+            segments = []
+            value = 0
+            count = 0
+            ones = state
+            for i in range(8):
+                if byte & (1 << i):
+                    if ones >= 6:
+                        # 7th consecutive one: abort/idle
+                        if ones == 6:
+                            if count:
+                                segments.append((value, count))
+                                value = count = 0
+                            segments.append(_ABORT)
+                        ones = 7
+                    else:
+                        ones += 1
+                        if ones <= 5:
+                            value |= 1 << count
+                            count += 1
+                        # 6th one held until flag/abort/data is known
+                else:
+                    if ones == 6:
+                        if count:
+                            segments.append((value, count))
+                            value = count = 0
+                        segments.append(_FLAG)
+                    elif ones != 5:
+                        # zero after 5 ones is a stuffed bit, discard
+                        count += 1
+                    ones = 0
+            if not segments:
+                table.append(ones | count << 3 | value << 7)
+            else:
+                if count:
+                    segments.append((value, count))
+                table.append((ones, tuple(segments)))
+    return table
+
+
+def _build_encode_table() -> list:
+    table = []
+    for state in range(5):
+        for byte in range(256):
+            value = 0
+            count = 0
+            ones = state
+            for i in range(8):
+                if byte & (1 << i):
+                    value |= 1 << count
+                    count += 1
+                    ones += 1
+                    if ones == 5:
+                        # insert zero after 5 consecutive ones
+                        count += 1
+                        ones = 0
+                else:
+                    count += 1
+                    ones = 0
+            table.append(ones | count << 3 | value << 7)
+    return table
+
+
+_DECODE_TABLE = _build_decode_table()
+_ENCODE_TABLE = _build_encode_table()
+
+
+class HdlcEncoder():
+    """Encode frames into an HDLC bitstream for RAW mode transmit."""
+
+    def __init__(self, crc:int=Port.CRC16, msb_first:bool=False):
+        self.crc = crc
+        self.msb_first = msb_first
+        self._acc = 0
+        self._bits = 0
+        self._ones = 0
+        self._flag = False  # True if last bits sent are a flag
+        self.frames = 0
+
+    def _put(self, out:bytearray, data):
+        table = _ENCODE_TABLE
+        acc = self._acc
+        bits = self._bits
+        ones = self._ones
+        for byte in data:
+            e = table[ones << 8 | byte]
+            ones = e & 7
+            acc |= (e >> 7) << bits
+            bits += (e >> 3) & 15
+            if bits >= 64:
+                out += (acc & 0xffffffffffffffff).to_bytes(8, 'little')
+                acc >>= 64
+                bits -= 64
+        self._acc = acc
+        self._bits = bits
+        self._ones = ones
+
+    def _put_flag(self):
+        self._acc |= HDLC_FLAG << self._bits
+        self._bits += 8
+        self._ones = 0
+        self._flag = True
+
+    def _take(self, out:bytearray):
+        # move complete bytes from bit accumulator to out
+        count = self._bits >> 3
+        if count:
+            out += (self._acc & ((1 << (count * 8)) - 1)).to_bytes(count, 'little')
+            self._acc >>= count * 8
+            self._bits &= 7
+
+    def encode(self, frame) -> bytes:
+        """
+        Return bitstream bytes for frame (flag, data, FCS, flag).
+        Bits that do not fill a byte are held for the next call
+        or for flush().
+        """
+        out = bytearray()
+        if not self._flag:
+            self._put_flag()
+        self._put(out, frame)
+        self._put(out, fcs(frame, self.crc))
+        self._put_flag()
+        self._take(out)
+        self.frames += 1
+        if self.msb_first:
+            return bytes(out).translate(_REVERSE)
+        return bytes(out)
+
+    def encode_frames(self, frames) -> bytes:
+        """Return bitstream for frames sharing flags between frames."""
+        out = bytearray()
+        for frame in frames:
+            out += self.encode(frame)
+        return bytes(out)
+
+    def flush(self) -> bytes:
+        """Return held bits padded to byte boundary with idle (one) bits."""
+        out = bytearray()
+        if self._bits:
+            self._acc |= ((1 << (8 - self._bits)) - 1) << self._bits
+            self._bits = 8
+            self._take(out)
+        self._acc = 0
+        self._bits = 0
+        self._flag = False
+        if self.msb_first:
+            return bytes(out).translate(_REVERSE)
+        return bytes(out)
+
+
+class HdlcDecoder():
+    """Decode frames from an HDLC bitstream received in RAW mode."""
+
+    def __init__(self, crc:int=Port.CRC16, return_ex:bool=False,
+                 msb_first:bool=False, max_frame_size:int=4096):
+        """
+        crc = Port.CRC16, Port.CRC32 or Port.OFF
+        return_ex = return FCS and status byte with every frame
+        msb_first = bit order of port
+        max_frame_size = largest frame (including FCS) accepted
+        """
+        self.crc = crc
+        self.return_ex = return_ex
+        self.msb_first = msb_first
+        self.max_frame_size = max_frame_size
+        self._fcs_size = fcs_size(crc)
+        self._state = 7  # start as if idle (hunting for flag)
+        self._in_frame = False
+        self._frame = bytearray()
+        self._acc = 0
+        self._bits = 0
+        self.frames = 0
+        self.crc_errors = 0
+        self.aborts = 0
+        self.short_frames = 0
+        self.long_frames = 0
+        self.bit_errors = 0  # frames not a multiple of 8 bits
+
+    def _start_frame(self):
+        self._in_frame = True
+        self._frame = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def _end_frame(self, out:list):
+        frame = self._frame
+        acc = self._acc
+        bits = self._bits
+        # closing flag added 0 + 5 ones to frame bits
+        if not frame and bits < 8 + 6:
+            return  # idle flags/ones between frames
+        if bits & 7 != 6:
+            self.bit_errors += 1
+            return
+        bits -= 6
+        if bits:
+            frame += (acc & ((1 << bits) - 1)).to_bytes(bits >> 3, 'little')
+        size = len(frame)
+        if size > self.max_frame_size:
+            self.long_frames += 1
+            return
+        if size <= self._fcs_size:
+            self.short_frames += 1
+            return
+        status = RX_OK
+        if self._fcs_size:
+            data = frame[:size - self._fcs_size]
+            if frame[size - self._fcs_size:] != fcs(data, self.crc):
+                status = RX_CRC_ERROR
+                self.crc_errors += 1
+        else:
+            data = frame
+        if self.return_ex:
+            frame.append(status)
+            out.append(bytes(frame))
+        elif status == RX_OK:
+            out.append(bytes(data))
+        if status == RX_OK:
+            self.frames += 1
+
+    def decode(self, buf) -> list:
+        """Return list of frames completed by receive data in buf."""
+        if self.msb_first:
+            buf = bytes(buf).translate(_REVERSE)
+        out = []
+        table = _DECODE_TABLE
+        state = self._state << 8
+        in_frame = self._in_frame
+        frame = self._frame
+        acc = self._acc
+        bits = self._bits
+        limit = self.max_frame_size
+        for byte in buf:
+            e = table[state | byte]
+            if e.__class__ is int:
+                state = (e & 7) << 8
+                if in_frame:
+                    acc |= (e >> 7) << bits
+                    bits += (e >> 3) & 15
+                    if bits >= 64:
+                        frame += (acc & 0xffffffffffffffff).to_bytes(8, 'little')
+                        acc >>= 64
+                        bits -= 64
+                        if len(frame) > limit:
+                            # too long, discard until next flag
+                            self.long_frames += 1
+                            in_frame = False
+                continue
+            state = e[0] << 8
+            for segment in e[1]:
+                if segment == _FLAG:
+                    if in_frame:
+                        self._frame = frame
+                        self._acc = acc
+                        self._bits = bits
+                        self._end_frame(out)
+                    self._start_frame()
+                    in_frame = True
+                    frame = self._frame
+                    acc = 0
+                    bits = 0
+                elif segment == _ABORT:
+                    if in_frame and (frame or bits > 5):
+                        self.aborts += 1
+                    in_frame = False
+                elif in_frame:
+                    acc |= segment[0] << bits
+                    bits += segment[1]
+        self._state = state >> 8
+        self._in_frame = in_frame
+        self._frame = frame
+        self._acc = acc
+        self._bits = bits
+        return out
+
+    def __repr__(self):
+        return 'HdlcDecoder object at ' + hex(id(self)) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'crc_errors = ' + str(self.crc_errors) + '\n' + \
+            'aborts = ' + str(self.aborts) + '\n' + \
+            'short_frames = ' + str(self.short_frames) + '\n' + \
+            'long_frames = ' + str(self.long_frames) + '\n' + \
+            'bit_errors = ' + str(self.bit_errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,497 @@
+# Sliding window reliable delivery (LAPB style) over HDLC
+#
+# A stop and wait exchange (samples/2wire.py) sends one frame per round
+# trip, leaving a long delay link idle most of the time. LapbLink keeps up
+# to window I frames outstanding so the line stays busy, and delivers
+# received information in order exactly once. A link reset (SABM/SABME,
+# FRMR) puts sent I frames not yet acknowledged back at the head of the
+# send queue, so none are lost; one the peer received but did not
+# acknowledge before the reset is delivered again.
+#
+#   address | control | information
+#   1         1 (modulo 8) or 2 (modulo 128)
+#
+# - modulo 8 (SABM, window up to 7) or modulo 128 (SABME, window up to 127)
+# - cumulative acknowledgement by N(R) in I, RR, RNR and REJ frames,
+#   sent piggybacked on I frames or as RR when ack_every frames are waiting
+#   or ack_delay seconds have passed
+# - REJ (go back N): out of sequence I frames are discarded and the sender
+#   restarts from the first missing frame (ignored if that frame was sent
+#   less than half a round trip before: REJ was caused by duplicates)
+# - SREJ (selective=True): out of sequence I frames are held and only the
+#   missing frames are requested and sent again
+# - retransmit timer (T1) from measured round trip times (smoothed RTT +
+#   4 x deviation (at least RTT / 8) + ack_delay, Karn's rule: retransmitted frames are not measured),
+#   doubled after each timeout. On timeout the oldest frame is sent again
+#   with the P bit set and the F bit response N(R) restarts sending (go
+#   back N) as REJ does
+#
+# Addresses follow LAPB: commands from the DTE and responses to the DTE use
+# address B (0x01), commands from the DCE and responses to the DCE use
+# address A (0x03). Frames are read with the default receive settings
+# (discard_data_with_error and discard_received_crc = True) as in mgsdlc.
+#
+# service() runs timers and sends frames and returns the time until the
+# next timer, so a caller can wait for receive data with select. The clock
+# function can be replaced to drive a link from a simulation.
+
+import select
+import time
+from collections import deque
+
+from mgapi import Port
+from mgsdlc import PF, RR, RNR, REJ, SREJ, DM, DISC, UA, FRMR, CONTROL, \
+    I_FRAME, S_FRAME, U_FRAME
+
+ADDRESS_A = 0x03
+ADDRESS_B = 0x01
+
+SABM = 0x2f
+SABME = 0x6f
+
+# link states
+DISCONNECTED = 0
+CONNECTING = 1
+CONNECTED = 2
+
+
+class LapbLink():
+    """Windowed reliable in order delivery over an HDLC port."""
+
+    def __init__(self, port:Port, modulo:int=8, window:int=None,
+                 dte:bool=True, selective:bool=False,
+                 initial_rto:float=1.0, min_rto:float=0.01,
+                 max_rto:float=10.0, ack_every:int=None,
+                 ack_delay:float=0.005, handler=None,
+                 clock=time.perf_counter):
+        """
+        port = open Port configured for HDLC
+        modulo = sequence number modulo, 8 or 128
+        window = max unacknowledged I frames (default modulo - 1, at most
+                 modulo / 2 if selective)
+        dte = True for DTE addressing, False for DCE
+        selective = request missing frames with SREJ and hold out of
+                    sequence frames, else REJ (go back N)
+        initial_rto = retransmit timeout before first RTT measurement
+        min_rto/max_rto = retransmit timeout limits in seconds
+        ack_every = received I frames acknowledged with one RR
+                    (default window / 2)
+        ack_delay = max seconds before received I frames are acknowledged
+        handler = function(info) called for each received information
+                  field, default appends bytes to received
+        clock = function returning time in seconds
+        """
+        assert modulo in (8, 128), 'modulo must be 8 or 128'
+        if window is None:
+            window = modulo - 1
+        assert 0 < window < modulo, 'window must be 1 to modulo - 1'
+        assert not selective or window <= modulo // 2, \
+            'selective window must be at most modulo / 2'
+        if ack_every is None:
+            ack_every = max(window // 2, 1)
+        self.port = port
+        self.modulo = modulo
+        self.window = window
+        self.selective = selective
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.rto = initial_rto
+        self.ack_every = ack_every
+        self.ack_delay = ack_delay
+        self.handler = handler
+        self.clock = clock
+        # commands sent and responses received use _command_address
+        if dte:
+            self._command_address = ADDRESS_B
+            self._response_address = ADDRESS_A
+        else:
+            self._command_address = ADDRESS_A
+            self._response_address = ADDRESS_B
+        self.state = DISCONNECTED
+        self.srtt = None
+        self.rttvar = 0.0
+        self.queue = deque()  # information waiting to send
+        self.received = deque()
+        self._sent = {}
+        self._reset()
+        self.i_frames_sent = 0
+        self.i_frames_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.rej_sent = 0
+        self.srej_sent = 0
+        self.duplicates = 0
+        self.sequence_errors = 0  # invalid N(R), FRMR received
+        self.writes = 0
+
+    def _reset(self):
+        # sequence state for new connection, unacknowledged I frames
+        # queued again in N(S) order
+        sent = self._sent
+        va = self.va if sent else 0
+        self.queue.extendleft(sent[ns][0] for ns in sorted(
+            sent, key=lambda ns: (ns - va) % self.modulo, reverse=True))
+        self.vs = 0
+        self.vr = 0
+        self.va = 0
+        self.remote_busy = False
+        self._sent = {}  # N(S) -> [info, send time, retransmitted]
+        self._resend = deque()  # N(S) to send again
+        self._held = {}  # out of sequence I frames (selective)
+        self._srej = set()  # N(S) requested with SREJ
+        self._rejected = False
+        self._ack_count = 0  # received I frames not yet acknowledged
+        self._ack_time = None  # time first unacknowledged I frame received
+        self._connect_time = None
+
+    # frame building
+
+    def _write(self, frame) -> bool:
+        self.writes += 1
+        return self.port.write(frame)
+
+    def _i_frame(self, ns:int, info, pf:bool) -> bytes:
+        if self.modulo == 8:
+            control = bytes((self._command_address,
+                             ns << 1 | self.vr << 5 | (PF if pf else 0)))
+        else:
+            control = bytes((self._command_address, ns << 1,
+                             self.vr << 1 | (1 if pf else 0)))
+        return control + info
+
+    def _s_frame(self, type:int, nr:int, pf:bool=False,
+                 command:bool=False) -> bool:
+        address = self._command_address if command else self._response_address
+        if self.modulo == 8:
+            frame = bytes((address, type | nr << 5 | (PF if pf else 0)))
+        else:
+            frame = bytes((address, type, nr << 1 | (1 if pf else 0)))
+        if type != SREJ:
+            self._ack_count = 0
+            self._ack_time = None
+        return self._write(frame)
+
+    def _u_frame(self, type:int, pf:bool=False, command:bool=False) -> bool:
+        address = self._command_address if command else self._response_address
+        return self._write(bytes((address, type | (PF if pf else 0))))
+
+    # connection
+
+    def connect(self):
+        """Start link setup (SABM or SABME), see connected."""
+        self._reset()
+        self.state = CONNECTING
+        self._connect_time = self.clock()
+        self._u_frame(SABM if self.modulo == 8 else SABME, True, True)
+
+    def disconnect(self):
+        """Send DISC and enter disconnected state."""
+        self._u_frame(DISC, True, True)
+        self.state = DISCONNECTED
+
+    @property
+    def connected(self) -> bool:
+        return self.state == CONNECTED
+
+    # sending
+
+    def send(self, info):
+        """Queue information for delivery to peer."""
+        self.queue.append(info)
+
+    def pending(self) -> int:
+        """Return number of I frames queued or not yet acknowledged."""
+        return len(self.queue) + len(self._sent)
+
+    def outstanding(self) -> int:
+        """Return number of sent I frames not yet acknowledged."""
+        return (self.vs - self.va) % self.modulo
+
+    def _update_rtt(self, rtt:float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        # deviation floor: acknowledgements may be held for ack_delay
+        rto = self.srtt + max(4 * self.rttvar, self.srtt / 8) + self.ack_delay
+        self.rto = min(max(rto, self.min_rto), self.max_rto)
+
+    def _ack(self, nr:int, now:float) -> bool:
+        # release I frames acknowledged by nr, False if nr invalid
+        modulo = self.modulo
+        count = (nr - self.va) % modulo
+        if count > (self.vs - self.va) % modulo:
+            self.sequence_errors += 1
+            return False
+        sent = self._sent
+        ns = self.va
+        for i in range(count):
+            entry = sent.pop(ns)
+            if not entry[2]:
+                self._update_rtt(now - entry[1])
+            ns = (ns + 1) % modulo
+        if count:
+            self.va = nr
+            if self._resend:
+                self._resend = deque(
+                    n for n in self._resend if n in sent)
+        return True
+
+    def _go_back(self, nr:int, now:float):
+        # send again from N(R), unless frame N(R) was sent less than half a
+        # round trip ago (in flight, REJ was caused by duplicates)
+        modulo = self.modulo
+        count = (self.vs - nr) % modulo
+        if not count:
+            return
+        if self.srtt is not None and \
+           now - self._sent[nr][1] < self.srtt / 2:
+            return
+        self._resend = deque((nr + i) % modulo for i in range(count))
+
+    def _send_frames(self, now:float):
+        sent = self._sent
+        modulo = self.modulo
+        while self._resend:
+            ns = self._resend.popleft()
+            entry = sent.get(ns)
+            if entry is None:
+                continue
+            entry[1] = now
+            entry[2] = True
+            self.retransmits += 1
+            self._write(self._i_frame(ns, entry[0], False))
+        if self.remote_busy:
+            return
+        queue = self.queue
+        while queue and (self.vs - self.va) % modulo < self.window:
+            info = queue.popleft()
+            ns = self.vs
+            sent[ns] = [info, now, False]
+            self.vs = (ns + 1) % modulo
+            self.i_frames_sent += 1
+            self.bytes_sent += len(info)
+            self._write(self._i_frame(ns, info, False))
+            # N(R) piggybacked
+            self._ack_count = 0
+            self._ack_time = None
+
+    def service(self) -> float:
+        """
+        Run timers and send queued frames and acknowledgements.
+        Return seconds until next timer (None if no timer running).
+        """
+        now = self.clock()
+        if self.state == CONNECTING:
+            if now - self._connect_time >= self.rto:
+                self.timeouts += 1
+                self.rto = min(self.rto * 2, self.max_rto)
+                self._connect_time = now
+                self._u_frame(SABM if self.modulo == 8 else SABME, True, True)
+            return max(self._connect_time + self.rto - now, 0.0)
+        if self.state != CONNECTED:
+            return None
+
+        self._send_frames(now)
+        if self._ack_count and (self._ack_count >= self.ack_every or
+                                now - self._ack_time >= self.ack_delay):
+            self._s_frame(RR, self.vr)
+
+        wait = None
+        if self._sent:
+            oldest = self._sent[self.va][1]
+            expire = oldest + self.rto
+            if now >= expire:
+                # T1 expired: send oldest again, P bit requests status
+                self.timeouts += 1
+                self.rto = min(self.rto * 2, self.max_rto)
+                entry = self._sent[self.va]
+                entry[1] = now
+                entry[2] = True
+                self.retransmits += 1
+                self._write(self._i_frame(self.va, entry[0], True))
+                expire = now + self.rto
+            wait = expire - now
+        if self._ack_count:
+            ack_wait = max(self._ack_time + self.ack_delay - now, 0.0)
+            if wait is None or ack_wait < wait:
+                wait = ack_wait
+        return wait
+
+    # receiving
+
+    def _deliver(self, info):
+        self.i_frames_received += 1
+        self.bytes_received += len(info)
+        if self.handler is None:
+            self.received.append(bytes(info))
+        else:
+            self.handler(info)
+
+    def _i_frame_in(self, ns:int, info, now:float):
+        modulo = self.modulo
+        vr = self.vr
+        if ns == vr:
+            self._deliver(info)
+            vr = (vr + 1) % modulo
+            held = self._held
+            srej = self._srej
+            srej.discard(ns)
+            while vr in held:
+                srej.discard(vr)
+                self._deliver(held.pop(vr))
+                vr = (vr + 1) % modulo
+            self.vr = vr
+            self._rejected = False
+            if not self._ack_count:
+                self._ack_time = now
+            self._ack_count += 1
+            return
+        ahead = (ns - vr) % modulo
+        if ahead >= self.window:
+            # already received: acknowledge again
+            self.duplicates += 1
+            if not self._ack_count:
+                self._ack_time = now
+            self._ack_count += 1
+            return
+        if not self.selective:
+            if not self._rejected:
+                self._rejected = True
+                self.rej_sent += 1
+                self._s_frame(REJ, vr)
+            return
+        if ns in self._held:
+            self.duplicates += 1
+            return
+        self._held[ns] = bytes(info)
+        self._srej.discard(ns)
+        # request each missing frame once
+        for i in range(ahead):
+            missing = (vr + i) % modulo
+            if missing not in self._held and missing not in self._srej:
+                self._srej.add(missing)
+                self.srej_sent += 1
+                self._s_frame(SREJ, missing)
+
+    def frame_in(self, frame):
+        """Process received frame (address + control + information)."""
+        if len(frame) < 2:
+            return
+        now = self.clock()
+        address = frame[0]
+        command = address == self._response_address
+        if not command and address != self._command_address:
+            return
+        c = frame[1]
+        if c & 3 == 3:
+            kind, type, pf = U_FRAME, c & ~PF & 0xff, bool(c & PF)
+            nr = ns = 0
+            info_start = 2
+        elif self.modulo == 8:
+            kind, type, ns, nr, pf = CONTROL[c]
+            info_start = 2
+        else:
+            if len(frame) < 3:
+                return
+            kind = I_FRAME if not c & 1 else S_FRAME
+            type = c & 0x0f if kind == S_FRAME else 0
+            ns = c >> 1
+            nr = frame[2] >> 1
+            pf = bool(frame[2] & 1)
+            info_start = 3
+
+        if kind == U_FRAME:
+            if type in (SABM, SABME):
+                if (type == SABM) != (self.modulo == 8):
+                    self._u_frame(DM, pf)
+                    return
+                self._reset()
+                self.state = CONNECTED
+                self._u_frame(UA, pf)
+            elif type == UA:
+                if self.state == CONNECTING:
+                    self._reset()
+                    self.state = CONNECTED
+            elif type == DISC:
+                self.state = DISCONNECTED
+                self._u_frame(UA, pf)
+            elif type == DM:
+                self.state = DISCONNECTED
+            elif type == FRMR:
+                self.sequence_errors += 1
+                self.connect()
+            return
+
+        if self.state != CONNECTED:
+            if command and pf:
+                self._u_frame(DM, True)
+            return
+        # SREJ N(R) requests a frame, later frames may be missing too
+        if not (kind == S_FRAME and type == SREJ) and not self._ack(nr, now):
+            return
+        if kind == I_FRAME:
+            self._i_frame_in(ns, memoryview(frame)[info_start:], now)
+        elif type == RR:
+            self.remote_busy = False
+        elif type == RNR:
+            self.remote_busy = True
+        elif type == REJ:
+            self.remote_busy = False
+            self._go_back(nr, now)
+        elif type == SREJ:
+            if nr in self._sent and nr not in self._resend:
+                self._resend.append(nr)
+        if command and pf:
+            # respond to checkpoint with current N(R)
+            self._s_frame(RR, self.vr, True)
+        elif pf and kind == S_FRAME and not self.selective:
+            # checkpoint response: frames from N(R) were lost
+            self._go_back(nr, now)
+
+    def run(self, timeout:float=None) -> bool:
+        """
+        Receive and process frames and run timers until timeout seconds
+        pass (None = until port.read() fails). Returns False if
+        port.read() fails.
+        """
+        port = self.port
+        end = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            wait = self.service()
+            if end is not None:
+                left = end - time.perf_counter()
+                if left <= 0:
+                    return True
+                wait = left if wait is None else min(wait, left)
+            readable, writable, errors = \
+                select.select([port._fd], [], [], wait)
+            if readable:
+                frame = port.read()
+                if frame is None:
+                    return False
+                self.frame_in(frame)
+
+    def __repr__(self):
+        return 'LapbLink object at ' + hex(id(self)) + '\n' + \
+            'state = ' + ('CONNECTED', 'CONNECTING', 'DISCONNECTED')[
+                2 - self.state] + '\n' + \
+            'modulo = ' + str(self.modulo) + '\n' + \
+            'window = ' + str(self.window) + '\n' + \
+            'selective = ' + str(self.selective) + '\n' + \
+            'rto = ' + '{:.4f}'.format(self.rto) + '\n' + \
+            'i_frames_sent = ' + str(self.i_frames_sent) + '\n' + \
+            'i_frames_received = ' + str(self.i_frames_received) + '\n' + \
+            'retransmits = ' + str(self.retransmits) + '\n' + \
+            'timeouts = ' + str(self.timeouts) + '\n' + \
+            'rej_sent = ' + str(self.rej_sent) + '\n' + \
+            'srej_sent = ' + str(self.srej_sent) + '\n' + \
+            'duplicates = ' + str(self.duplicates) + '\n' + \
+            'sequence_errors = ' + str(self.sequence_errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,300 @@
+# Virtual channel multiplexing over one HDLC link
+#
+# A Port is opened by one process with one reader. Mux lets many logical
+# conversations (channels 1 to 255) share one HDLC link, each with its own
+# receive queue, so a channel whose reader is slow does not hold up the
+# others (no head of line blocking).
+#
+#   channel | data                      data frame
+#   1
+#   0 | CREDIT | channel | count ...    credit frame (control channel 0)
+#   1   1        1         2
+#
+# Flow control is by credit: a sender may have up to window frames of a
+# channel not yet taken from the peer's receive queue. Each frame sent uses
+# one credit, and the receiver returns credits as the application takes
+# frames with Channel.receive() (in one CREDIT frame for all channels once
+# half a window is owed on a channel). A channel out of credit waits at
+# the sender while other channels keep sending.
+#
+# Channels with data and credit are served by deficit round robin in
+# proportion to their weight, as weighted classes in
+# mgtransmit.TransmitQueues, after any pending credit frame. Writes are
+# paced by a TransmitScheduler so only limit bytes wait in the driver and
+# the order of frames is decided by the scheduler, not the driver queue.
+#
+# Both ends must use the same window. A frame for a channel not yet opened
+# opens it (see accept()).
+
+import select
+import time
+from collections import deque
+
+from mgapi import Port
+from mgtransmit import TransmitScheduler
+
+CONTROL_CHANNEL = 0
+CREDIT = 1
+
+
+class Channel():
+    """One virtual channel of a Mux."""
+
+    def __init__(self, mux, number:int, weight:int=1):
+        """
+        mux = Mux owning the channel
+        number = channel number (1 to 255)
+        weight = share of link when channels compete (greater than 0)
+        """
+        assert weight > 0, 'weight must be greater than 0'
+        self.mux = mux
+        self.number = number
+        self.weight = weight
+        self.send_queue = deque()
+        self.receive_queue = deque()
+        self.credits = mux.window  # frames the peer can accept
+        self.deficit = 0
+        self.queued_bytes = 0
+        self._owed = 0  # credits to return to peer
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.drops = 0  # send queue full
+        self.overruns = 0  # frames received beyond window
+
+    def send(self, data) -> bool:
+        """Queue data to send, return False if send queue full."""
+        return self.mux.put(self, data)
+
+    def receive(self):
+        """Return next received data or None if none waiting."""
+        if not self.receive_queue:
+            return None
+        self._owed += 1
+        if self._owed >= max(self.mux.window // 2, 1):
+            self.mux._grant(self)
+        return self.receive_queue.popleft()
+
+    def pending(self) -> int:
+        """Return number of frames waiting to be sent."""
+        return len(self.send_queue)
+
+    def __repr__(self):
+        return 'Channel object at ' + hex(id(self)) + '\n' + \
+            'number = ' + str(self.number) + '\n' + \
+            'weight = ' + str(self.weight) + '\n' + \
+            'credits = ' + str(self.credits) + '\n' + \
+            'send queued = ' + str(len(self.send_queue)) + '\n' + \
+            'receive queued = ' + str(len(self.receive_queue)) + '\n' + \
+            'frames_sent = ' + str(self.frames_sent) + '\n' + \
+            'bytes_sent = ' + str(self.bytes_sent) + '\n' + \
+            'frames_received = ' + str(self.frames_received) + '\n' + \
+            'bytes_received = ' + str(self.bytes_received) + '\n' + \
+            'drops = ' + str(self.drops) + '\n' + \
+            'overruns = ' + str(self.overruns) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Mux():
+    """Many virtual channels with credit flow control on one HDLC port."""
+
+    def __init__(self, port:Port, window:int=8, limit:int=None,
+                 rate:int=None, quantum:int=None, max_queued:int=None):
+        """
+        port = open Port configured for HDLC (N_HDLC line discipline)
+        window = frames per channel a sender may have unread at the peer
+                 (receive queue size, same at both ends)
+        limit = max bytes outstanding in driver (default 2 * max_data_size)
+        rate = line rate in bits per second, see TransmitScheduler
+        quantum = bytes per weight added each round (default max_data_size),
+                  about one frame of the bulk channels keeps the wait of
+                  other channels short
+        max_queued = max bytes in each channel send queue, None = no limit
+        """
+        assert window > 0, 'window must be greater than 0'
+        max_data_size = port._defaults.max_data_size
+        if limit is None:
+            limit = max_data_size * 2
+        if quantum is None:
+            quantum = max_data_size
+        self.port = port
+        self.window = window
+        self.quantum = quantum
+        self.max_queued = max_queued
+        self.channels = {}  # number: Channel
+        self._active = []  # channels in round robin order
+        self._index = 0  # next round robin channel
+        self._owed = {}  # channel number: credits to return
+        self._new = deque()  # channels opened by peer, see accept()
+        self.scheduler = TransmitScheduler(port, rate=rate, target=limit)
+        self.credit_frames = 0
+        self.unknown = 0  # bad control frames and credits for unknown channels
+
+    def channel(self, number:int, weight:int=1) -> Channel:
+        """Return channel number, opening it if needed."""
+        assert 0 < number < 256, 'channel number must be 1 to 255'
+        c = self.channels.get(number)
+        if c is None:
+            c = Channel(self, number, weight)
+            self.channels[number] = c
+            self._active.append(c)
+        return c
+
+    def accept(self) -> Channel:
+        """Return next channel opened by a received frame, None if none."""
+        if not self._new:
+            return None
+        return self._new.popleft()
+
+    def put(self, c:Channel, data) -> bool:
+        """Queue data on channel c, return False if send queue full."""
+        if self.max_queued is not None and \
+           c.queued_bytes + len(data) > self.max_queued:
+            c.drops += 1
+            return False
+        c.send_queue.append(bytes([c.number]) + bytes(data))
+        c.queued_bytes += len(data)
+        return True
+
+    def _grant(self, c:Channel):
+        # credits taken from channel, sent by next send()
+        self._owed[c.number] = self._owed.get(c.number, 0) + c._owed
+        c._owed = 0
+
+    def pending(self) -> int:
+        """Return number of frames queued in all channels."""
+        return sum(len(c.send_queue) for c in self._active)
+
+    def _select(self):
+        # return channel with next frame to send or None
+        active = self._active
+        if not any(c.send_queue and c.credits for c in active):
+            return None
+        # deficit round robin over channels with data and credit
+        while True:
+            c = active[self._index]
+            if c.send_queue and c.credits:
+                if c.deficit >= len(c.send_queue[0]) - 1:
+                    return c
+                c.deficit += c.weight * self.quantum
+            else:
+                c.deficit = 0
+            self._index = (self._index + 1) % len(active)
+
+    def send(self, timeout:float=None) -> int:
+        """
+        Write credit frame if credits are owed, then queued frames of
+        channels with credit while driver queue is below limit.
+        timeout = seconds to wait for room in driver queue,
+                  None = wait until nothing left to send
+        Return number of frames written.
+        """
+        count = 0
+        end = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            wait = None if end is None else max(end - time.perf_counter(), 0)
+            if self._owed:
+                frame = bytearray([CONTROL_CHANNEL, CREDIT])
+                for number, credits in self._owed.items():
+                    frame.append(number)
+                    frame += credits.to_bytes(2, 'big')
+                if not self.scheduler.submit(frame, wait):
+                    return count
+                self._owed.clear()
+                self.credit_frames += 1
+                count += 1
+                continue
+            c = self._select()
+            if c is None:
+                return count
+            frame = c.send_queue[0]
+            if not self.scheduler.submit(frame, wait):
+                return count
+            c.send_queue.popleft()
+            size = len(frame) - 1
+            c.queued_bytes -= size
+            c.credits -= 1
+            c.deficit -= size
+            if not c.send_queue:
+                c.deficit = 0
+            c.frames_sent += 1
+            c.bytes_sent += size
+            count += 1
+
+    def frame_in(self, frame) -> Channel:
+        """
+        Process received frame, return channel it was queued on (None for
+        credit frames and dropped frames).
+        """
+        if not len(frame):
+            self.unknown += 1
+            return None
+        number = frame[0]
+        if number == CONTROL_CHANNEL:
+            if len(frame) < 2 or frame[1] != CREDIT or (len(frame) - 2) % 3:
+                self.unknown += 1
+                return None
+            for i in range(2, len(frame), 3):
+                c = self.channels.get(frame[i])
+                if c is None:
+                    # credit for channel never opened here
+                    self.unknown += 1
+                    continue
+                c.credits += frame[i + 1] << 8 | frame[i + 2]
+            return None
+        c = self.channels.get(number)
+        if c is None:
+            c = self.channel(number)
+            self._new.append(c)
+        if len(c.receive_queue) >= self.window:
+            # peer sent without credit
+            c.overruns += 1
+            return None
+        data = frame[1:]
+        c.receive_queue.append(data)
+        c.frames_received += 1
+        c.bytes_received += len(data)
+        return c
+
+    def run(self, timeout:float=None) -> bool:
+        """
+        Send queued frames and process received frames until timeout
+        seconds pass (None = until port.read() fails). Returns False if
+        port.read() fails.
+        """
+        port = self.port
+        end = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            self.send(0)
+            wait = self.scheduler.poll_interval if self._select() else None
+            if end is not None:
+                left = end - time.perf_counter()
+                if left <= 0:
+                    return True
+                wait = left if wait is None else min(wait, left)
+            readable, writable, errors = \
+                select.select([port._fd], [], [], wait)
+            if readable:
+                frame = port.read()
+                if frame is None:
+                    return False
+                self.frame_in(frame)
+
+    def __repr__(self):
+        s = 'Mux object at ' + hex(id(self)) + '\n' + \
+            'window = ' + str(self.window) + '\n' + \
+            'limit = ' + str(self.scheduler.target) + '\n' + \
+            'credit_frames = ' + str(self.credit_frames) + '\n' + \
+            'unknown = ' + str(self.unknown) + '\n'
+        for c in self._active:
+            s += 'channel ' + str(c.number) + ': credits = ' + \
+                str(c.credits) + ' sent = ' + str(c.frames_sent) + \
+                ' received = ' + str(c.frames_received) + \
+                ' queued = ' + str(len(c.send_queue)) + '\n'
+        return s
+
+    def __str__(self):
+        return self.__repr__()
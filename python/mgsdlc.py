@@ -0,0 +1,633 @@
+# SDLC secondary stations for multi-drop lines
+#
+# Settings.hdlc_address_filter accepts one address (or 0xff for all). To
+# emulate many SDLC secondary stations on one port, configure the port for
+# HDLC with hdlc_address_filter = 0xff and let SdlcEngine dispatch
+# received frames by address.
+#
+# - address dispatch: 256 entry table indexed by the address byte
+# - control field decode: 256 entry table of precomputed tuples
+#   (kind, type, N(S), N(R), P/F) indexed by the control byte
+# - per station state: mode (disconnected/NRM), V(S), V(R), unacknowledged
+#   and queued I frames
+#
+# Modulo 8 sequence numbers, single byte address and control fields.
+# A station sends only when polled (P bit set), returning queued I frames
+# (up to the window size) with the F bit on the last frame, or RR/RNR.
+# A poll whose N(R) does not acknowledge all I frames sent is a
+# checkpoint: the station sends them again from N(R). Out of sequence I
+# frames are answered with one REJ, sent ahead of the station's own I
+# frames in the next poll response.
+# Frames sent to the broadcast address (0xff) are processed by all stations
+# without response.
+#
+# Frames are read from the port with the default receive settings
+# (discard_data_with_error and discard_received_crc = True), so every
+# frame returned by Port.read() is address + control + information.
+#
+# PollScheduler is the primary side of a half-duplex multi-drop line. A
+# strict exchange (samples/2wire.py run_primary) waits the worst case
+# response time for every station, so a poll cycle is the sum of fixed
+# timeouts and a dead station costs its full timeout every cycle.
+# PollScheduler keeps per secondary state:
+# - response timeout adapted to measured response times (smoothed
+#   response time + 4 x deviation, limited to min/max timeout)
+# - timeout doubled after each missed response of a live station
+# - after dead_after consecutive misses the station is dead and is polled
+#   only every 2, 4, 8 ... max_backoff cycles until it answers again
+# and measures cycle time. The default poll is RR with N(R) = V(R) of the
+# secondary, advanced by each in sequence I frame in its responses, so
+# the poll acknowledges the station's I frames (an out of sequence I frame
+# is not passed to the handler and is sent again after the checkpoint).
+# The turnaround between send and receive is kept to the required calls:
+# RTS is not switched when the port uses auto_rts, the receiver is
+# disabled only while sending on 2-wire lines, and the send is drained
+# only when RTS must be dropped or the receiver enabled after it.
+#
+# Polls are not pipelined: on a half-duplex multi-drop line only the
+# polled secondary may send until its final frame (or the timeout), so
+# the next poll cannot be sent before the current one completes.
+
+import select
+import time
+from collections import deque
+
+from mgapi import Port
+
+BROADCAST = 0xff
+
+# control field kinds
+I_FRAME = 0
+S_FRAME = 1
+U_FRAME = 2
+
+# poll/final bit
+PF = 0x10
+
+# supervisory types (control bits 0-3)
+RR = 0x01
+RNR = 0x05
+REJ = 0x09
+SREJ = 0x0d
+
+# unnumbered commands/responses (control without P/F bit)
+UI = 0x03
+SIM = 0x07  # RIM response
+DM = 0x0f
+DISC = 0x43  # RD response
+UA = 0x63
+SNRM = 0x83
+FRMR = 0x87
+XID = 0xaf
+TEST = 0xe3
+
+# station modes
+DISCONNECTED = 0
+NRM = 1
+
+WINDOW = 7
+
+
+def _build_control_table() -> list:
+    table = []
+    for c in range(256):
+        pf = bool(c & PF)
+        if not c & 1:
+            table.append((I_FRAME, 0, (c >> 1) & 7, c >> 5, pf))
+        elif c & 3 == 1:
+            table.append((S_FRAME, c & 0x0f, 0, c >> 5, pf))
+        else:
+            table.append((U_FRAME, c & ~PF & 0xff, 0, 0, pf))
+    return table
+
+
+# control byte -> (kind, type, N(S), N(R), P/F)
+CONTROL = _build_control_table()
+
+
+def i_control(ns:int, nr:int, pf:bool=False) -> int:
+    """Return I frame control byte."""
+    return ns << 1 | nr << 5 | (PF if pf else 0)
+
+
+def s_control(type:int, nr:int, pf:bool=False) -> int:
+    """Return S frame control byte for type RR, RNR, REJ or SREJ."""
+    return type | nr << 5 | (PF if pf else 0)
+
+
+def u_control(type:int, pf:bool=False) -> int:
+    """Return U frame control byte."""
+    return type | (PF if pf else 0)
+
+
+class SdlcStation():
+    """Emulated SDLC secondary station."""
+
+    def __init__(self, address:int, handler=None, xid:bytes=b''):
+        """
+        address = station address (0x00 to 0xfe)
+        handler = function(station, info) called for each received
+                  I/UI frame, default appends bytes to received
+        xid = information returned in XID response
+        """
+        assert 0 <= address < BROADCAST, 'address must be 0x00 to 0xfe'
+        self.address = address
+        self.handler = handler
+        self.xid = xid
+        self.mode = DISCONNECTED
+        self.busy = False  # local busy, respond RNR
+        self.remote_busy = False  # primary sent RNR
+        self.vs = 0
+        self.vr = 0
+        self.va = 0  # oldest unacknowledged N(S)
+        self._rejected = False  # REJ sent, waiting for V(R) frame
+        self.queue = deque()  # I frame information waiting to send
+        self.unacked = deque()  # sent I frame information
+        self.received = deque()
+        self.i_frames_received = 0
+        self.i_frames_sent = 0
+        self.retransmits = 0
+        self.sequence_errors = 0
+        self.frmr_count = 0
+
+    def send(self, info):
+        """Queue information for I frames sent when polled."""
+        self.queue.append(info)
+
+    def reset(self):
+        """Reset sequence numbers and move unacknowledged data to queue."""
+        self.queue.extendleft(reversed(self.unacked))
+        self.unacked.clear()
+        self.vs = 0
+        self.vr = 0
+        self.va = 0
+        self._rejected = False
+        self.remote_busy = False
+
+    def _deliver(self, info):
+        if self.handler is None:
+            self.received.append(bytes(info))
+        else:
+            self.handler(self, info)
+
+    def _ack(self, nr:int) -> bool:
+        # release I frames acknowledged by nr, False if nr invalid
+        count = (nr - self.va) & 7
+        if count > len(self.unacked):
+            return False
+        for i in range(count):
+            self.unacked.popleft()
+        self.va = nr
+        return True
+
+    def _retransmit(self, nr:int):
+        # REJ: send again starting with N(S) = nr
+        self.retransmits += len(self.unacked)
+        self.queue.extendleft(reversed(self.unacked))
+        self.unacked.clear()
+        self.vs = nr
+
+    def _u_frame(self, type:int, pf:bool, info=b'') -> bytes:
+        return bytes((self.address, type | (PF if pf else 0))) + info
+
+    def _frmr(self, control:int, pf:bool) -> bytes:
+        # W = invalid control, X (0x02)/Z (0x08) not used
+        self.frmr_count += 1
+        info = bytes((control, self.vs << 1 | self.vr << 5, 0x01))
+        return self._u_frame(FRMR, pf, info)
+
+    def _poll_response(self) -> list:
+        address = self.address
+        out = []
+        if not self.remote_busy:
+            count = min(WINDOW - len(self.unacked), len(self.queue))
+            vs = self.vs
+            control = self.vr << 5
+            for i in range(count):
+                info = self.queue.popleft()
+                self.unacked.append(info)
+                if i == count - 1:
+                    control |= PF
+                out.append(bytes((address, control | vs << 1)) + info)
+                vs = (vs + 1) & 7
+            self.vs = vs
+            self.i_frames_sent += count
+        if self._rejected:
+            # REJ sent once, ahead of any I frames
+            self._rejected = False
+            if out:
+                out.insert(0, bytes((address, REJ | self.vr << 5)))
+            else:
+                out.append(bytes((address, REJ | PF | self.vr << 5)))
+        if not out:
+            type = RNR if self.busy else RR
+            out.append(bytes((address, type | PF | self.vr << 5)))
+        return out
+
+    def process(self, frame, respond:bool=True) -> list:
+        """Return list of response frames for received command frame."""
+        control = frame[1]
+        kind, type, ns, nr, pf = CONTROL[control]
+        pf = pf and respond
+
+        if kind == U_FRAME:
+            if type == SNRM:
+                self.reset()
+                self.mode = NRM
+                return [self._u_frame(UA, pf)] if respond else []
+            if type == DISC:
+                self.mode = DISCONNECTED
+                return [self._u_frame(UA, pf)] if respond else []
+            if type == UI:
+                self._deliver(memoryview(frame)[2:])
+                return self._poll_response() if pf and self.mode == NRM \
+                    else []
+            if type == TEST:
+                return [self._u_frame(TEST, pf, frame[2:])] if pf else []
+            if type == XID:
+                return [self._u_frame(XID, pf, self.xid)] if pf else []
+            if self.mode == DISCONNECTED:
+                return [self._u_frame(DM, pf)] if pf else []
+            return [self._frmr(control, pf)] if respond else []
+
+        if self.mode == DISCONNECTED:
+            return [self._u_frame(DM, pf)] if pf else []
+
+        if not self._ack(nr):
+            return [self._frmr(control, pf)] if respond else []
+
+        if kind == I_FRAME:
+            if ns == self.vr and not self.busy:
+                self.vr = (self.vr + 1) & 7
+                self._rejected = False
+                self.i_frames_received += 1
+                self._deliver(memoryview(frame)[2:])
+            elif ns != self.vr:
+                self.sequence_errors += 1
+                self._rejected = True
+        elif type == RR:
+            self.remote_busy = False
+        elif type == RNR:
+            self.remote_busy = True
+        elif type == REJ:
+            self.remote_busy = False
+            self._retransmit(nr)
+        else:
+            return [self._frmr(control, pf)] if respond else []
+
+        if pf:
+            if self.unacked:
+                # checkpoint: poll N(R) did not acknowledge all sent I
+                # frames, send again from N(R)
+                self._retransmit(nr)
+            return self._poll_response()
+        return []
+
+    def __repr__(self):
+        return 'SdlcStation object at ' + hex(id(self)) + '\n' + \
+            'address = ' + hex(self.address) + '\n' + \
+            'mode = ' + ('NRM' if self.mode == NRM else 'DISCONNECTED') + '\n' + \
+            'vs = ' + str(self.vs) + '\n' + \
+            'vr = ' + str(self.vr) + '\n' + \
+            'queue = ' + str(len(self.queue)) + '\n' + \
+            'unacked = ' + str(len(self.unacked)) + '\n' + \
+            'i_frames_received = ' + str(self.i_frames_received) + '\n' + \
+            'i_frames_sent = ' + str(self.i_frames_sent) + '\n' + \
+            'retransmits = ' + str(self.retransmits) + '\n' + \
+            'sequence_errors = ' + str(self.sequence_errors) + '\n' + \
+            'frmr_count = ' + str(self.frmr_count) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class SdlcEngine():
+    """Dispatch received frames to emulated SDLC secondary stations."""
+
+    def __init__(self, port:Port, half_duplex:bool=False):
+        """
+        port = open Port configured for HDLC with hdlc_address_filter = 0xff
+        half_duplex = turn on RTS and disable receiver to send responses
+                      (2-wire bus, see samples/2wire.py)
+        """
+        self.port = port
+        self.half_duplex = half_duplex
+        self._table = [None] * 256
+        self.stations = []
+        self.frames = 0
+        self.responses = 0
+        self.ignored = 0  # frames for addresses with no station
+        self.short_frames = 0
+
+    def add_station(self, station:SdlcStation) -> SdlcStation:
+        """Add station to engine and return it."""
+        assert self._table[station.address] is None, \
+            'station address already in use'
+        self._table[station.address] = station
+        self.stations.append(station)
+        return station
+
+    def remove_station(self, address:int):
+        """Remove station with address."""
+        station = self._table[address]
+        if station is not None:
+            self._table[address] = None
+            self.stations.remove(station)
+
+    def station(self, address:int) -> SdlcStation:
+        """Return station with address or None."""
+        return self._table[address]
+
+    def process(self, frame) -> list:
+        """Return list of response frames for received frame."""
+        self.frames += 1
+        if len(frame) < 2:
+            self.short_frames += 1
+            return []
+        station = self._table[frame[0]]
+        if station is not None:
+            responses = station.process(frame)
+            self.responses += len(responses)
+            return responses
+        if frame[0] == BROADCAST:
+            for station in self.stations:
+                station.process(frame, False)
+        else:
+            self.ignored += 1
+        return []
+
+    def send_responses(self, responses:list) -> bool:
+        """Send response frames, return True if all writes succeed."""
+        port = self.port
+        if self.half_duplex:
+            port.rts = True
+            port.disable_receiver()
+        ok = True
+        for response in responses:
+            if not port.write(response):
+                ok = False
+                break
+        if self.half_duplex:
+            port.flush()
+            port.rts = False
+            port.enable_receiver()
+        return ok
+
+    def receive(self) -> bool:
+        """
+        Read one frame, process it and send responses.
+        Return False if port.read() fails.
+        """
+        frame = self.port.read()
+        if frame is None:
+            return False
+        responses = self.process(frame)
+        if responses:
+            self.send_responses(responses)
+        return True
+
+    def run(self):
+        """Process frames until port.read() fails."""
+        while self.receive():
+            pass
+
+    def __repr__(self):
+        return 'SdlcEngine object at ' + hex(id(self)) + '\n' + \
+            'stations = ' + str(len(self.stations)) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'responses = ' + str(self.responses) + '\n' + \
+            'ignored = ' + str(self.ignored) + '\n' + \
+            'short_frames = ' + str(self.short_frames) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class Secondary():
+    """Secondary station state kept by PollScheduler."""
+
+    def __init__(self, address:int, poll_frame:bytes=None,
+                 timeout:float=0.1):
+        """
+        address = station address
+        poll_frame = frame sent to poll station, default RR, N(R) = vr,
+                     P bit (rebuilt for each poll)
+        timeout = initial response timeout in seconds
+        """
+        self.address = address
+        self.vr = 0  # next N(S) expected from station, N(R) of poll
+        # default poll frame for each N(R)
+        self._polls = [bytes((address, s_control(RR, nr, True)))
+                       for nr in range(8)]
+        self._poll_frame = poll_frame
+        self.timeout = timeout
+        self.srtt = None  # smoothed response time
+        self.rttvar = 0.0  # response time deviation
+        self.failures = 0  # consecutive missed responses
+        self.dead = False
+        self.backoff = 0  # cycles skipped between polls of dead station
+        self.skip = 0  # cycles left to skip
+        self.polls = 0
+        self.responses = 0
+        self.timeouts = 0
+        self.response_time = 0.0  # last measured response time
+        self.sequence_errors = 0  # out of sequence I frames
+
+    @property
+    def poll_frame(self) -> bytes:
+        """Frame sent to poll station: poll_frame given or RR, N(R) = vr."""
+        if self._poll_frame is None:
+            return self._polls[self.vr]
+        return self._poll_frame
+
+    @poll_frame.setter
+    def poll_frame(self, frame:bytes):
+        self._poll_frame = frame
+
+    def _update(self, rtt:float, min_timeout:float, max_timeout:float):
+        self.response_time = rtt
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.timeout = min(max(self.srtt + 4 * self.rttvar, min_timeout),
+                           max_timeout)
+        self.failures = 0
+        self.dead = False
+        self.backoff = 0
+        self.skip = 0
+
+    def __repr__(self):
+        return 'Secondary object at ' + hex(id(self)) + '\n' + \
+            'address = ' + hex(self.address) + '\n' + \
+            'vr = ' + str(self.vr) + '\n' + \
+            'timeout = ' + '{:.6f}'.format(self.timeout) + '\n' + \
+            'response_time = ' + '{:.6f}'.format(self.response_time) + '\n' + \
+            'dead = ' + str(self.dead) + '\n' + \
+            'backoff = ' + str(self.backoff) + '\n' + \
+            'polls = ' + str(self.polls) + '\n' + \
+            'responses = ' + str(self.responses) + '\n' + \
+            'timeouts = ' + str(self.timeouts) + '\n' + \
+            'sequence_errors = ' + str(self.sequence_errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class PollScheduler():
+    """Poll secondary stations on a half-duplex multi-drop HDLC line."""
+
+    def __init__(self, port:Port, handler=None, two_wire:bool=True,
+                 min_timeout:float=0.002, max_timeout:float=0.2,
+                 initial_timeout:float=0.1, dead_after:int=3,
+                 max_backoff:int=64):
+        """
+        port = open Port configured for HDLC
+        handler = function(secondary, frame) called for each response frame
+                  (out of sequence I frames are not passed)
+        two_wire = disable receiver while sending (shared data pair)
+        min_timeout/max_timeout = response timeout limits in seconds
+        initial_timeout = response timeout before first response
+        dead_after = consecutive missed responses marking station dead
+        max_backoff = most cycles skipped between polls of dead station
+        """
+        self.port = port
+        self.handler = handler
+        self.two_wire = two_wire
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.initial_timeout = initial_timeout
+        self.dead_after = dead_after
+        self.max_backoff = max_backoff
+        self.secondaries = []
+        self.cycles = 0
+        self.polls = 0
+        self.responses = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.cycle_time = 0.0  # last cycle time in seconds
+        self.average_cycle_time = 0.0
+
+    def add(self, address:int, poll_frame:bytes=None) -> Secondary:
+        """Add secondary station to poll list and return it."""
+        secondary = Secondary(address, poll_frame, self.initial_timeout)
+        self.secondaries.append(secondary)
+        return secondary
+
+    def _send(self, frame) -> bool:
+        # send frame and turn line around to receive
+        port = self.port
+        auto_rts = port._settings.auto_rts
+        if not auto_rts:
+            port.rts = True
+        if self.two_wire:
+            port.disable_receiver()
+        ok = port.write(frame)
+        if self.two_wire or not auto_rts:
+            # receiver or RTS must not change before send completes
+            port.flush()
+        if not auto_rts:
+            port.rts = False
+        if self.two_wire:
+            port.enable_receiver()
+        return ok
+
+    def _wait(self, timeout:float) -> bool:
+        # wait up to timeout seconds for receive frame
+        readable, writable, errors = \
+            select.select([self.port._fd], [], [], timeout)
+        return bool(readable)
+
+    def poll(self, secondary:Secondary) -> bool:
+        """
+        Poll secondary and receive response frames until final (F bit)
+        frame. Return False if the station did not respond in time.
+        """
+        secondary.polls += 1
+        self.polls += 1
+        if not self._send(secondary.poll_frame):
+            return False
+        start = time.perf_counter()
+        deadline = start + secondary.timeout
+        responded = False
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not self._wait(remaining):
+                break
+            frame = self.port.read()
+            if not frame:
+                break
+            if frame[0] != secondary.address or len(frame) < 2:
+                continue  # not for this poll, keep waiting
+            if not responded:
+                responded = True
+                secondary._update(time.perf_counter() - start,
+                                  self.min_timeout, self.max_timeout)
+                # allow multiple frame responses to complete
+                deadline = time.perf_counter() + secondary.timeout
+            secondary.responses += 1
+            self.responses += 1
+            control = frame[1]
+            deliver = True
+            if not control & 1:
+                # I frame: in sequence N(S) acknowledged by next poll
+                if (control >> 1) & 7 == secondary.vr:
+                    secondary.vr = (secondary.vr + 1) & 7
+                else:
+                    secondary.sequence_errors += 1
+                    deliver = False
+            elif control & ~PF == UA:
+                # station reset (SNRM) sequence numbers
+                secondary.vr = 0
+            if deliver and self.handler is not None:
+                self.handler(secondary, frame)
+            if control & PF:
+                return True
+        if responded:
+            return True
+        secondary.timeouts += 1
+        self.timeouts += 1
+        secondary.failures += 1
+        if not secondary.dead:
+            # response may be late: wait longer next time
+            secondary.timeout = min(secondary.timeout * 2, self.max_timeout)
+        if secondary.failures >= self.dead_after:
+            secondary.dead = True
+            secondary.backoff = min(max(secondary.backoff * 2, 1),
+                                    self.max_backoff)
+            secondary.skip = secondary.backoff
+        return False
+
+    def cycle(self) -> float:
+        """Poll each secondary once (dead stations per backoff), return cycle time."""
+        start = time.perf_counter()
+        for secondary in self.secondaries:
+            if secondary.skip:
+                secondary.skip -= 1
+                self.skipped += 1
+                continue
+            self.poll(secondary)
+        self.cycle_time = time.perf_counter() - start
+        if self.cycles:
+            self.average_cycle_time += \
+                (self.cycle_time - self.average_cycle_time) / 8
+        else:
+            self.average_cycle_time = self.cycle_time
+        self.cycles += 1
+        return self.cycle_time
+
+    def __repr__(self):
+        return 'PollScheduler object at ' + hex(id(self)) + '\n' + \
+            'secondaries = ' + str(len(self.secondaries)) + '\n' + \
+            'cycles = ' + str(self.cycles) + '\n' + \
+            'polls = ' + str(self.polls) + '\n' + \
+            'responses = ' + str(self.responses) + '\n' + \
+            'timeouts = ' + str(self.timeouts) + '\n' + \
+            'skipped = ' + str(self.skipped) + '\n' + \
+            'cycle_time = ' + '{:.6f}'.format(self.cycle_time) + '\n' + \
+            'average_cycle_time = ' + '{:.6f}'.format(self.average_cycle_time) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
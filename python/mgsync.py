@@ -0,0 +1,191 @@
+# Software sync pattern hunt for RAW mode
+#
+# In Port.RAW mode the controller does no sync detection: received bytes
+# have arbitrary bit alignment relative to the sender framing. SyncHunter
+# is the software counterpart of the hardware hunt used by BISYNC, MONOSYNC
+# and XSYNC: it searches receive data for an 8 to 32 bit sync pattern at
+# every bit offset, locks onto the offset where the pattern is found and
+# returns the following data byte aligned.
+#
+# The pattern is precomputed shifted to each of the 8 bit offsets in a
+# byte. If NumPy is installed each receive buffer is converted into an
+# array of overlapping 64 bit windows (one per byte position) compared
+# against the 8 shifted patterns. Otherwise the shifted patterns are
+# compiled into a single regular expression of byte classes.
+#
+# After lock, data is realigned by shifting whole buffers as Python
+# integers. If the data is already byte aligned no shifting is done and
+# memoryviews of the receive buffers are returned.
+#
+# Serial bit order is LSB first (as RAW mode receives). Set msb_first when
+# the port is configured with Settings.msb_first = True. The pattern value
+# holds the first received bit in bit 0: the byte sequence 0x67 0x98
+# is pattern=0x9867, bits=16 (or pass pattern=b'\x67\x98').
+
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# bit reversed byte values for msb_first ports
+_REVERSE = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+
+class SyncHunter():
+    """Find sync pattern at any bit offset and byte align following data."""
+
+    def __init__(self, pattern, bits:int=None, msb_first:bool=False):
+        """
+        pattern = sync pattern (int, first bit in bit 0, or bytes)
+        bits = sync pattern size in bits (8 to 32), default size of bytes
+        msb_first = bit order of port
+        """
+        if isinstance(pattern, (bytes, bytearray)):
+            if bits is None:
+                bits = len(pattern) * 8
+            pattern = int.from_bytes(pattern, 'little')
+        assert bits is not None and 8 <= bits <= 32, \
+            'sync pattern must be 8 to 32 bits'
+        self.pattern = pattern & ((1 << bits) - 1)
+        self.bits = bits
+        self.msb_first = msb_first
+        # bytes spanned by pattern at bit offset 7
+        self._span = (bits + 7 + 7) // 8
+        if numpy is not None:
+            self._masks = [numpy.uint64(((1 << bits) - 1) << k)
+                           for k in range(8)]
+            self._patterns = [numpy.uint64(self.pattern << k)
+                              for k in range(8)]
+        else:
+            self._regex = self._compile()
+        self._mask = 0
+        self._mask_size = 0
+        self.hunts = 0
+        self.locks = 0
+        self.discarded_bytes = 0
+        self.aligned_bytes = 0
+        self.hunt()
+
+    def _compile(self):
+        # one alternative per bit offset, group number = offset + 1
+        alternatives = []
+        for k in range(8):
+            value = self.pattern << k
+            mask = ((1 << self.bits) - 1) << k
+            parts = []
+            for j in range((k + self.bits + 7) // 8):
+                m = (mask >> (8 * j)) & 0xff
+                v = (value >> (8 * j)) & 0xff
+                if m == 0xff:
+                    parts.append(re.escape(bytes([v])))
+                else:
+                    parts.append(b'[' + b''.join(
+                        re.escape(bytes([x])) for x in range(256)
+                        if x & m == v) + b']')
+            alternatives.append(b'(' + b''.join(parts) + b')')
+        return re.compile(b'|'.join(alternatives), re.DOTALL)
+
+    def hunt(self):
+        """Discard lock and search for sync pattern."""
+        self.locked = False
+        self.bit_offset = 0
+        self._pending = b''
+        self._held = 0
+        self.hunts += 1
+
+    def _find(self, data) -> int:
+        # return bit position of first sync pattern in data or -1
+        if numpy is None:
+            match = self._regex.search(data)
+            if match is None:
+                return -1
+            return match.start() * 8 + match.lastindex - 1
+        count = len(data) - self._span + 1
+        if count < 1:
+            return -1
+        a = numpy.frombuffer(data, dtype=numpy.uint8)
+        window = a[:count].astype(numpy.uint64)
+        for i in range(1, self._span):
+            window |= a[i:i + count].astype(numpy.uint64) << numpy.uint64(8 * i)
+        position = -1
+        for k in range(8):
+            index = numpy.flatnonzero((window & self._masks[k]) ==
+                                      self._patterns[k])
+            if len(index):
+                bit = int(index[0]) * 8 + k
+                if position == -1 or bit < position:
+                    position = bit
+                    count = int(index[0]) + 1  # later offsets limited to here
+                    window = window[:count]
+        return position
+
+    def _shift(self, buf) -> bytes:
+        # realign buf using low bits of previous byte held in self._held
+        size = len(buf)
+        if not size:
+            return b''
+        shift = self.bit_offset
+        value = (int.from_bytes(buf, 'little') << (8 - shift)) | \
+            (self._held >> shift)
+        self._held = buf[-1]
+        if size != self._mask_size:
+            self._mask = (1 << (8 * size)) - 1
+            self._mask_size = size
+        return (value & self._mask).to_bytes(size, 'little')
+
+    def receive(self, buf):
+        """
+        Return byte aligned data following sync pattern from receive
+        data in buf (empty while hunting). Returns memoryview of buf
+        if no bit shift is needed.
+        """
+        if self.msb_first:
+            buf = bytes(buf).translate(_REVERSE)
+        if self.locked:
+            if self.bit_offset:
+                out = self._shift(buf)
+            else:
+                out = memoryview(buf)
+        else:
+            if self._pending:
+                data = self._pending + bytes(buf)
+            else:
+                data = buf
+            position = self._find(data)
+            if position == -1:
+                keep = min(self._span - 1, len(data))
+                self._pending = bytes(data[len(data) - keep:])
+                self.discarded_bytes += len(data) - keep
+                return b''
+            self.locked = True
+            self.locks += 1
+            self._pending = b''
+            start = position + self.bits
+            index = start >> 3
+            self.bit_offset = start & 7
+            self.discarded_bytes += index
+            if self.bit_offset:
+                self._held = data[index]
+                out = self._shift(memoryview(data)[index + 1:])
+            else:
+                out = memoryview(data)[index:]
+        self.aligned_bytes += len(out)
+        if self.msb_first:
+            return bytes(out).translate(_REVERSE)
+        return out
+
+    def __repr__(self):
+        return 'SyncHunter object at ' + hex(id(self)) + '\n' + \
+            'pattern = ' + hex(self.pattern) + '\n' + \
+            'bits = ' + str(self.bits) + '\n' + \
+            'locked = ' + str(self.locked) + '\n' + \
+            'bit_offset = ' + str(self.bit_offset) + '\n' + \
+            'hunts = ' + str(self.hunts) + '\n' + \
+            'locks = ' + str(self.locks) + '\n' + \
+            'discarded_bytes = ' + str(self.discarded_bytes) + '\n' + \
+            'aligned_bytes = ' + str(self.aligned_bytes) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,191 @@
+# TDM frame alignment and slip monitor
+#
+# A misconfigured tdm_sync_frame, tdm_sync_delay or sync polarity does not
+# produce receive errors. Data is silently shifted into neighboring slots.
+# TdmAlignmentMonitor checks a known alignment pattern carried in one slot
+# of every frame against each buffer returned by Port.read() in TDM mode.
+#
+# The alignment pattern may be a single value sent in every frame or a
+# sequence of values sent in consecutive frames (multiframe pattern, similar
+# to the E1 CRC4 multiframe alignment). The monitor reports:
+# - aligned      pattern found in expected slot with expected frame phase
+# - slot_offset  received slot index minus expected slot index
+#                (read slot (n + slot_offset) % slot_count to correct)
+# - slip         alignment changed since the last aligned buffer
+#
+# Comparisons use strided slices of the receive buffer (one byte column per
+# slot byte across all frames) so each check is a few C level compares
+# regardless of frame count.
+
+from mgapi import Port
+
+
+def bytes_per_slot(bits_per_slot:int) -> int:
+    """Return number of buffer bytes needed to store one slot."""
+    return (bits_per_slot + 7) // 8
+
+
+class TdmAlignment():
+    """Result of checking one TDM receive buffer."""
+
+    def __init__(self, aligned:bool, slot_offset:int, phase:int,
+                 slip:bool, errors:int):
+        self.aligned = aligned
+        self.slot_offset = slot_offset
+        self.phase = phase
+        self.slip = slip
+        self.errors = errors
+
+    def __repr__(self):
+        return 'TdmAlignment object at ' + hex(id(self)) + '\n' + \
+            'aligned = ' + str(self.aligned) + '\n' + \
+            'slot_offset = ' + str(self.slot_offset) + '\n' + \
+            'phase = ' + str(self.phase) + '\n' + \
+            'slip = ' + str(self.slip) + '\n' + \
+            'errors = ' + str(self.errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class TdmAlignmentMonitor():
+    """Monitor TDM receive buffers for slot misalignment and slips."""
+
+    def __init__(self, settings:Port.Settings, slot:int, pattern):
+        """
+        settings = Port.Settings applied to the TDM port
+        slot = index (0 based) of slot carrying alignment pattern
+        pattern = slot value sent in every frame, or list of slot values
+                  sent in consecutive frames (multiframe pattern)
+        """
+        assert settings.protocol == Port.TDM, 'settings must select TDM'
+        assert 0 <= slot < settings.tdm_slot_count, \
+            'slot must be 0 to tdm_slot_count-1'
+        if isinstance(pattern, int):
+            pattern = [pattern]
+        assert len(pattern) > 0, 'pattern must not be empty'
+
+        self.slot = slot
+        self.slot_count = settings.tdm_slot_count
+        self.slot_bytes = bytes_per_slot(settings.tdm_slot_bits)
+        self.frame_bytes = self.slot_count * self.slot_bytes
+        self.pattern = [value & ((1 << settings.tdm_slot_bits) - 1)
+                        for value in pattern]
+        self._columns = {}
+        self.reset()
+
+    def reset(self):
+        """Forget current alignment and clear counters."""
+        self._offset = 0
+        self._phase = 0
+        self._locked = False
+        self.buffers = 0
+        self.frames = 0
+        self.aligned_buffers = 0
+        self.misaligned_buffers = 0
+        self.slips = 0
+        self.errors = 0
+
+    def _expected(self, frames:int, phase:int) -> list:
+        # expected byte columns (one per slot byte) for frames starting at
+        # multiframe phase, built on first use and cached
+        key = (frames, phase)
+        columns = self._columns.get(key)
+        if columns is None:
+            size = len(self.pattern)
+            values = [self.pattern[(phase + i) % size] for i in range(frames)]
+            columns = [bytes((value >> (8 * byte)) & 0xff for value in values)
+                       for byte in range(self.slot_bytes)]
+            self._columns[key] = columns
+        return columns
+
+    def _match(self, buf, end:int, slot:int, columns:list) -> bool:
+        first = slot * self.slot_bytes
+        for byte in range(self.slot_bytes):
+            if buf[first + byte:end:self.frame_bytes] != columns[byte]:
+                return False
+        return True
+
+    def _hunt(self, buf, end:int, frames:int):
+        # search every slot position and multiframe phase for pattern
+        for phase in range(len(self.pattern)):
+            columns = self._expected(frames, phase)
+            for slot in range(self.slot_count):
+                if self._match(buf, end, slot, columns):
+                    return slot, phase
+        return None, None
+
+    def _mismatched_frames(self, buf, end:int, slot:int, columns:list) -> int:
+        first = slot * self.slot_bytes
+        frames = len(columns[0])
+        bad = bytearray(frames)
+        for byte in range(self.slot_bytes):
+            received = buf[first + byte:end:self.frame_bytes]
+            expected = columns[byte]
+            if received == expected:
+                continue
+            for i in range(frames):
+                if received[i] != expected[i]:
+                    bad[i] = 1
+        return frames - bad.count(0)
+
+    def check(self, buf) -> TdmAlignment:
+        """Check one receive buffer and return TdmAlignment result."""
+        if not isinstance(buf, (bytes, bytearray)):
+            buf = bytes(buf)
+        frames = len(buf) // self.frame_bytes
+        end = frames * self.frame_bytes
+        self.buffers += 1
+        self.frames += frames
+        size = len(self.pattern)
+
+        # fast path: pattern where the previous buffer left it
+        slot = (self.slot + self._offset) % self.slot_count
+        phase = self._phase
+        columns = self._expected(frames, phase)
+        if frames and self._match(buf, end, slot, columns):
+            self._locked = True
+            self._phase = (phase + frames) % size
+            if self._offset:
+                self.misaligned_buffers += 1
+            else:
+                self.aligned_buffers += 1
+            return TdmAlignment(self._offset == 0, self._offset, phase,
+                                False, 0)
+
+        # alignment lost or not yet acquired: hunt all positions
+        found_slot, found_phase = self._hunt(buf, end, frames) \
+            if frames else (None, None)
+        if found_slot is None:
+            errors = self._mismatched_frames(buf, end, slot, columns) \
+                if frames else 0
+            self.errors += errors
+            self.misaligned_buffers += 1
+            if self._locked:
+                self._phase = (phase + frames) % size
+            return TdmAlignment(False, None, None, False, errors)
+
+        offset = (found_slot - self.slot) % self.slot_count
+        slip = self._locked
+        if slip:
+            self.slips += 1
+        self._locked = True
+        self._offset = offset
+        self._phase = (found_phase + frames) % size
+        if offset:
+            self.misaligned_buffers += 1
+        else:
+            self.aligned_buffers += 1
+        return TdmAlignment(offset == 0, offset, found_phase, slip, 0)
+
+    def __repr__(self):
+        return 'TdmAlignmentMonitor object at ' + hex(id(self)) + '\n' + \
+            'buffers = ' + str(self.buffers) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'aligned_buffers = ' + str(self.aligned_buffers) + '\n' + \
+            'misaligned_buffers = ' + str(self.misaligned_buffers) + '\n' + \
+            'slips = ' + str(self.slips) + '\n' + \
+            'errors = ' + str(self.errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,579 @@
+# Transmit pacing for continuous send data
+#
+# samples/raw.py keeps the transmitter fed by polling transmit_count()
+# (TIOCOUTQ ioctl) every 5ms until the driver queue drops below a limit.
+# Each check is a system call, the 5ms sleep granularity adds jitter and
+# at high line rates the queue can drain (underrun) between checks.
+#
+# TransmitScheduler keeps a target amount of send data queued in the
+# driver. After each write it predicts the queue level from the line rate
+# (queued bytes drain at rate / bits per byte). When the queue is full it
+# sleeps once for the exact time until the queue drains to a low level,
+# corrects the prediction with a single transmit_count() call and then
+# accepts writes up to the target again without waiting, so one wakeup
+# serves several writes. When the line rate
+# is not known (external transmit clock) the drain rate is learned from
+# transmit_count() readings, waiting with poll(POLLOUT) until a rate is
+# available.
+#
+# TransmitQueues puts several transmit classes in front of one port.
+# Port.write() is FIFO into the driver, so a control frame written behind
+# a bulk backlog waits until the whole backlog is sent. TransmitQueues
+# holds frames in per class queues and writes only while the driver queue
+# is below a byte limit (TransmitScheduler with target = limit), so a
+# frame of the highest class waits behind at most limit bytes already in
+# the driver. Strict classes are served in class order before weighted
+# classes, weighted classes share the remaining line by deficit round
+# robin. Queueing delay (put until written to driver) is recorded per
+# class.
+#
+# DrainPoller replaces blocking Port.flush() (tcdrain parks the calling
+# thread until all send data is on the wire) with futures. drain() returns
+# a concurrent.futures.Future resolved when the port send queue
+# (transmit_count()) drops to a given level, adrain() is the asyncio
+# awaitable version. One poller thread serves any number of ports: each
+# port is checked again when its queue is predicted to reach the level at
+# the port line rate (doubling intervals if the rate is not known), so a
+# drain costs a few ioctls instead of a check every few msec.
+#
+# CoalescingWriter gathers small writes for byte stream protocols (RAW,
+# BISYNC, MONOSYNC, ASYNC and other N_TTY modes) into a preallocated
+# buffer and writes the buffer with one system call when it reaches a size
+# threshold, when a deadline after the first buffered byte has passed, or
+# on flush(). In N_HDLC mode each write is one frame, so writes are always
+# passed straight to the port.
+
+import asyncio
+import select
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from mgapi import Port
+from mghalfduplex import LatencyHistogram
+
+
+def line_rate(settings) -> tuple:
+    """
+    Return (bits per second, bits per byte) for Port.Settings.
+    bits per second is 0 if the transmit clock is external.
+    """
+    if settings.protocol == Port.ASYNC:
+        bits = 1 + settings.async_data_bits + settings.async_stop_bits
+        if settings.async_parity != Port.OFF:
+            bits += 1
+        return settings.async_data_rate, bits
+    if settings.transmit_clock == Port.INTERNAL:
+        return settings.internal_clock_rate, 8
+    return 0, 8
+
+
+class TransmitScheduler():
+    """Pace writes to keep a target amount of data queued in the driver."""
+
+    def __init__(self, port:Port, rate:int=None, target:int=None,
+                 low:int=None, latency:float=0.02,
+                 poll_interval:float=0.005):
+        """
+        port = open Port with settings applied
+        rate = line rate in bits per second (default from port settings),
+               0 = learn from transmit_count() (external transmit clock)
+        target = bytes kept queued in driver (default latency worth of data)
+        low = queue level to wait for when full (default target / 2)
+        latency = target queue time in seconds if target not set
+        poll_interval = longest wait before checking queue if rate unknown
+        """
+        rate_setting, self.bits_per_byte = line_rate(port._settings)
+        if rate is None:
+            rate = rate_setting
+        self.port = port
+        self.rate = rate
+        self.latency = latency
+        self._target = target
+        self._low = low
+        self.poll_interval = poll_interval
+        self._byte_rate = rate / self.bits_per_byte  # 0 = unknown
+        self._queued = 0  # driver queue at self._time
+        self._time = time.perf_counter()
+        self._poll = select.poll()
+        self._poll.register(port._fd, select.POLLOUT)
+        self.writes = 0
+        self.bytes = 0
+        self.wakeups = 0
+        self.queue_checks = 0
+        self.underruns = 0  # driver queue found empty after a wait
+
+    @property
+    def target(self) -> int:
+        if self._target is not None:
+            return self._target
+        if not self._byte_rate:
+            return self.port._defaults.max_data_size * 2
+        return max(int(self._byte_rate * self.latency), 1)
+
+    @target.setter
+    def target(self, x:int):
+        self._target = x
+
+    @property
+    def low(self) -> int:
+        if self._low is not None:
+            return self._low
+        return self.target // 2
+
+    @low.setter
+    def low(self, x:int):
+        self._low = x
+
+    def _predict(self, now:float) -> float:
+        # predicted driver queue bytes at time now
+        if not self._byte_rate:
+            return self._queued
+        return max(self._queued - (now - self._time) * self._byte_rate, 0)
+
+    def _check(self, now:float):
+        # measure driver queue, learn drain rate if rate unknown
+        queued = self.port.transmit_count()
+        self.queue_checks += 1
+        if not self.rate and self._queued > queued and now > self._time:
+            measured = (self._queued - queued) / (now - self._time)
+            if self._byte_rate:
+                self._byte_rate += (measured - self._byte_rate) / 8
+            else:
+                self._byte_rate = measured
+        if not queued and self.writes:
+            self.underruns += 1
+        self._queued = queued
+        self._time = now
+
+    def wait(self, size:int, timeout:float=None) -> bool:
+        """
+        Wait until size bytes fit below target in driver queue.
+        Return False if timeout (seconds) expires first.
+        """
+        target = max(self.target, size)
+        start = time.perf_counter()
+        now = start
+        queued = self._predict(now)
+        if queued + size <= target:
+            return True
+        # full: wait for queue to drain to low level
+        level = max(min(self.low, target - size), 0)
+        while True:
+            excess = queued - level
+            if excess <= 0:
+                return True
+            if timeout is not None and now - start >= timeout:
+                return False
+            if self._byte_rate:
+                delay = excess / self._byte_rate
+            else:
+                delay = self.poll_interval
+            if timeout is not None:
+                delay = min(delay, start + timeout - now)
+            if self._byte_rate:
+                time.sleep(delay)
+            else:
+                self._poll.poll(delay * 1000)
+            self.wakeups += 1
+            now = time.perf_counter()
+            self._check(now)
+            queued = self._queued
+
+    def submit(self, buf, timeout:float=None) -> bool:
+        """
+        Write buf when there is room in driver queue (backpressure).
+        Return False if timeout (seconds) expires or write fails.
+        """
+        size = len(buf)
+        if not self.wait(size, timeout):
+            return False
+        now = time.perf_counter()
+        queued = self._predict(now)
+        if not self.port.write(buf):
+            return False
+        self._queued = queued + size
+        self._time = now
+        self.writes += 1
+        self.bytes += size
+        return True
+
+    def __repr__(self):
+        return 'TransmitScheduler object at ' + hex(id(self)) + '\n' + \
+            'rate = ' + str(self.rate) + '\n' + \
+            'target = ' + str(self.target) + '\n' + \
+            'low = ' + str(self.low) + '\n' + \
+            'writes = ' + str(self.writes) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n' + \
+            'wakeups = ' + str(self.wakeups) + '\n' + \
+            'queue_checks = ' + str(self.queue_checks) + '\n' + \
+            'underruns = ' + str(self.underruns) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class TransmitClass():
+    """Transmit queue and counters for one TransmitQueues class."""
+
+    def __init__(self, weight:int):
+        """weight = 0 for strict priority, else weighted share"""
+        self.weight = weight
+        self.queue = deque()  # (put time, buf)
+        self.deficit = 0
+        self.queued_bytes = 0
+        self.frames = 0
+        self.bytes = 0
+        self.drops = 0
+        self.delay = LatencyHistogram()
+
+    def __repr__(self):
+        return 'TransmitClass object at ' + hex(id(self)) + '\n' + \
+            'weight = ' + str(self.weight) + '\n' + \
+            'queued = ' + str(len(self.queue)) + '\n' + \
+            'frames = ' + str(self.frames) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n' + \
+            'drops = ' + str(self.drops) + '\n' + \
+            'delay mean = ' + \
+            '{:.1f}'.format(self.delay.mean * 1000000) + ' usec\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class TransmitQueues():
+    """Strict priority and weighted transmit classes sharing one port."""
+
+    def __init__(self, port:Port, weights=(0, 1), limit:int=None,
+                 rate:int=None, quantum:int=None, max_queued:int=None):
+        """
+        port = open Port with settings applied
+        weights = weight of each class (class 0 first), 0 = strict
+                  priority (served in class order before weighted classes),
+                  else share of line left by strict classes
+        limit = max bytes outstanding in driver (default 2 * max_data_size)
+        rate = line rate in bits per second, see TransmitScheduler
+        quantum = bytes per weight added each round (default max_data_size)
+        max_queued = max bytes queued per class, None = no limit
+        """
+        max_data_size = port._defaults.max_data_size
+        if limit is None:
+            limit = max_data_size * 2
+        if quantum is None:
+            quantum = max_data_size
+        assert weights, 'weights must hold at least one class'
+        self.port = port
+        self.classes = [TransmitClass(weight) for weight in weights]
+        self._strict = [c for c in self.classes if not c.weight]
+        self._weighted = [c for c in self.classes if c.weight]
+        self._index = 0  # next weighted class
+        self.quantum = quantum
+        self.max_queued = max_queued
+        self.scheduler = TransmitScheduler(port, rate=rate, target=limit)
+
+    @property
+    def limit(self) -> int:
+        return self.scheduler.target
+
+    @limit.setter
+    def limit(self, x:int):
+        self.scheduler.target = x
+
+    def put(self, buf, cls:int=0) -> bool:
+        """Queue buf in class cls, return False if class queue full."""
+        c = self.classes[cls]
+        if self.max_queued is not None and \
+           c.queued_bytes + len(buf) > self.max_queued:
+            c.drops += 1
+            return False
+        c.queue.append((time.perf_counter(), buf))
+        c.queued_bytes += len(buf)
+        return True
+
+    def pending(self) -> int:
+        """Return number of frames queued in all classes."""
+        return sum(len(c.queue) for c in self.classes)
+
+    def _select(self):
+        # return class with next frame to send or None
+        for c in self._strict:
+            if c.queue:
+                return c
+        weighted = self._weighted
+        if not any(c.queue for c in weighted):
+            return None
+        # deficit round robin
+        while True:
+            c = weighted[self._index]
+            if c.queue:
+                if c.deficit >= len(c.queue[0][1]):
+                    return c
+                c.deficit += c.weight * self.quantum
+            else:
+                c.deficit = 0
+            self._index = (self._index + 1) % len(weighted)
+
+    def send(self, timeout:float=None) -> int:
+        """
+        Write queued frames while driver queue is below limit.
+        timeout = seconds to wait for room in driver queue,
+                  None = wait until all queues empty
+        Return number of frames written.
+        """
+        count = 0
+        end = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            c = self._select()
+            if c is None:
+                return count
+            put_time, buf = c.queue[0]
+            size = len(buf)
+            wait = None if end is None else max(end - time.perf_counter(), 0)
+            if not self.scheduler.submit(buf, wait):
+                return count
+            c.queue.popleft()
+            c.queued_bytes -= size
+            if c.weight:
+                c.deficit -= size
+                if not c.queue:
+                    c.deficit = 0
+            c.frames += 1
+            c.bytes += size
+            c.delay.add(time.perf_counter() - put_time)
+            count += 1
+
+    def __repr__(self):
+        s = 'TransmitQueues object at ' + hex(id(self)) + '\n' + \
+            'limit = ' + str(self.limit) + '\n'
+        for i, c in enumerate(self.classes):
+            s += 'class ' + str(i) + ': weight = ' + str(c.weight) + \
+                ' frames = ' + str(c.frames) + \
+                ' queued = ' + str(len(c.queue)) + \
+                ' delay mean = ' + \
+                '{:.1f}'.format(c.delay.mean * 1000000) + ' usec\n'
+        return s
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class DrainPoller():
+    """Resolve futures when port send queues drain, using one thread."""
+
+    def __init__(self, min_interval:float=0.0005, max_interval:float=0.1):
+        """
+        min_interval = shortest time between checks of one port (seconds)
+        max_interval = longest time between checks of one port (seconds)
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._cond = threading.Condition()
+        # pending drains: [due time, port, level, byte rate, interval, future]
+        self._drains = []
+        self._thread = None
+        self._stop = False
+        self.checks = 0
+        self.completed = 0
+
+    def drain(self, port:Port, level:int=0, rate:int=None) -> Future:
+        """
+        Return Future resolved with port.transmit_count() when it is
+        level bytes or less.
+        rate = line rate in bits per second (default from port settings,
+               0 = unknown)
+        """
+        bits, bits_per_byte = line_rate(port._settings)
+        if rate is not None:
+            bits = rate
+        future = Future()
+        entry = [time.perf_counter(), port, level, bits / bits_per_byte,
+                 self.min_interval, future]
+        with self._cond:
+            assert not self._stop, 'DrainPoller closed'
+            self._drains.append(entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    async def adrain(self, port:Port, level:int=0, rate:int=None) -> int:
+        """Wait (asyncio) until port send queue is level bytes or less."""
+        return await asyncio.wrap_future(self.drain(port, level, rate))
+
+    def _check(self, entry:list, now:float) -> bool:
+        # return True if drain complete
+        due, port, level, byte_rate, interval, future = entry
+        if future.cancelled():
+            return True
+        count = port.transmit_count()
+        self.checks += 1
+        if count <= level:
+            future.set_result(count)
+            self.completed += 1
+            return True
+        if byte_rate:
+            delay = (count - level) / byte_rate
+        else:
+            delay = interval
+            entry[4] = min(interval * 2, self.max_interval)
+        entry[0] = now + min(max(delay, self.min_interval), self.max_interval)
+        return False
+
+    def _run(self):
+        cond = self._cond
+        with cond:
+            while not self._stop:
+                if not self._drains:
+                    cond.wait()
+                    continue
+                now = time.perf_counter()
+                due = min(entry[0] for entry in self._drains)
+                if due > now:
+                    cond.wait(due - now)
+                    continue
+                self._drains = [entry for entry in self._drains
+                                if entry[0] > now or
+                                not self._check(entry, now)]
+
+    def pending(self) -> int:
+        """Return number of drains not yet complete."""
+        with self._cond:
+            return len(self._drains)
+
+    def close(self):
+        """Stop poller thread and cancel pending drains."""
+        with self._cond:
+            self._stop = True
+            for entry in self._drains:
+                entry[5].cancel()
+            self._drains = []
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __repr__(self):
+        return 'DrainPoller object at ' + hex(id(self)) + '\n' + \
+            'pending = ' + str(self.pending()) + '\n' + \
+            'checks = ' + str(self.checks) + '\n' + \
+            'completed = ' + str(self.completed) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class CoalescingWriter():
+    """Combine small writes into one port write per batch (not N_HDLC)."""
+
+    def __init__(self, port:Port, size:int=None, delay:float=0.005,
+                 timeout:float=None):
+        """
+        port = open Port
+        size = batch size in bytes written with one system call
+               (default max_data_size)
+        delay = max seconds data is held before written, None = hold until
+                size reached or flush()
+        timeout = max seconds a batch write waits for the port to accept
+                  data (blocked_io = False), None = wait until all sent.
+                  Data not sent stays in the batch for the next flush().
+        """
+        if size is None:
+            size = port._defaults.max_data_size
+        assert size > 0, 'size must be greater than 0'
+        self.port = port
+        self.size = size
+        self.delay = delay
+        self.timeout = timeout
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._count = 0
+        self._deadline = None
+        self.writes = 0  # write() calls
+        self.port_writes = 0  # port.write() calls
+        self.bytes = 0
+
+    def write(self, buf) -> bool:
+        """
+        Add buf to batch. Return False if buf was not taken because the
+        batch could not be written to make room for it. A buf of size
+        bytes or more is written directly, False if not all sent.
+        """
+        size = len(buf)
+        self.writes += 1
+        self.bytes += size
+        if self.port._ldisc == Port.N_HDLC:
+            self.port_writes += 1
+            return self.port.write(buf)
+        count = self._count
+        if count + size > self.size:
+            if count:
+                self.flush()
+                count = self._count
+            if not count and size >= self.size:
+                self.port_writes += 1
+                return self.port.write_all(buf, self.timeout) == size
+            if count + size > self.size:
+                return False
+        if not count and self.delay is not None:
+            self._deadline = time.perf_counter() + self.delay
+        self._buf[count:count + size] = buf
+        self._count = count + size
+        if self._count == self.size or \
+           (self._deadline is not None and
+            time.perf_counter() >= self._deadline):
+            # data not sent stays in batch
+            self.flush()
+        return True
+
+    def flush(self) -> bool:
+        """
+        Write batched data to port. Return False if not all was sent:
+        the rest stays in the batch (pending()) for the next flush().
+        """
+        count = self._count
+        if not count:
+            self._deadline = None
+            return True
+        self.port_writes += 1
+        sent = self.port.write_all(self._view[:count], self.timeout)
+        if sent < count:
+            # keep unsent data at start of batch
+            self._buf[:count - sent] = bytes(self._view[sent:count])
+            self._count = count - sent
+            return False
+        self._count = 0
+        self._deadline = None
+        return True
+
+    def pending(self) -> int:
+        """Return number of bytes held in batch."""
+        return self._count
+
+    def timeout(self) -> float:
+        """
+        Return seconds until batch must be written (for select/poll
+        timeouts), None if no deadline.
+        """
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.perf_counter(), 0.0)
+
+    def poll(self) -> bool:
+        """Write batch if its deadline has passed."""
+        if self._deadline is not None and \
+           time.perf_counter() >= self._deadline:
+            return self.flush()
+        return True
+
+    def __repr__(self):
+        return 'CoalescingWriter object at ' + hex(id(self)) + '\n' + \
+            'size = ' + str(self.size) + '\n' + \
+            'delay = ' + str(self.delay) + '\n' + \
+            'pending = ' + str(self._count) + '\n' + \
+            'writes = ' + str(self.writes) + '\n' + \
+            'port_writes = ' + str(self.port_writes) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -0,0 +1,275 @@
+# Message stream over XSYNC fixed size blocks
+#
+# In Port.XSYNC mode with Settings.xsync_block_size set, the receiver hunts
+# for the sync pattern (xsync_sync_size bytes of sync_pattern), discards it
+# and returns the following xsync_block_size bytes as one block (N_HDLC
+# line discipline, one block per read). The sender must put the sync
+# pattern in front of every block.
+#
+# XsyncWriter and XsyncReader carry variable size application messages
+# over these blocks. Each block holds a 3 byte header followed by a
+# continuous stream of messages, each message a 2 byte length followed by
+# data. Messages may span blocks, message headers do not.
+#
+#   sync | seq | first | len | message | len | message ...   | 0 | pad
+#          1     2       2                                     2
+#
+# seq = block sequence number (mod 256) to detect lost blocks
+# first = offset (after header) of first message starting in block,
+#         NO_MESSAGE if block holds only the continuation of a message
+# len = 0 marks padding to end of block
+#
+# After a lost or corrupt block the reader discards the partial message
+# and restarts at the first message of the next block.
+#
+# The writer packs as many sync + block units into each write as fit in
+# max_data_size, so a batch of messages needs few system calls. The reader
+# returns messages as memoryviews of the received blocks (no copy); only
+# messages spanning blocks are copied once into a new buffer.
+
+from mgapi import Port
+
+BLOCK_HEADER_SIZE = 3
+MESSAGE_HEADER_SIZE = 2
+NO_MESSAGE = 0xffff
+
+
+def sync_bytes(sync_pattern:int, sync_size:int) -> bytes:
+    """Return sync pattern bytes in send order (high byte first)."""
+    return (sync_pattern & 0xffffffff).to_bytes(4, 'big')[4 - sync_size:]
+
+
+class XsyncWriter():
+    """Send messages packed into XSYNC blocks."""
+
+    def __init__(self, port:Port, block_size:int=None,
+                 sync_pattern:int=None, sync_size:int=None):
+        """
+        port = open Port configured for XSYNC
+        block_size = block size (default port xsync_block_size)
+        sync_pattern = sync pattern (default port sync_pattern)
+        sync_size = sync pattern size in bytes (default port xsync_sync_size)
+        """
+        settings = port._settings
+        if block_size is None:
+            block_size = settings.xsync_block_size
+        if sync_pattern is None:
+            sync_pattern = settings.sync_pattern
+        if sync_size is None:
+            sync_size = settings.xsync_sync_size
+        assert block_size > BLOCK_HEADER_SIZE + MESSAGE_HEADER_SIZE, \
+            'block_size too small for message headers'
+        assert 1 <= sync_size <= 4, 'sync_size must be 1 to 4'
+        self.port = port
+        self.block_size = block_size
+        self.sync = sync_bytes(sync_pattern, sync_size)
+        self._unit_size = len(self.sync) + block_size
+        self.blocks_per_write = max(1, port._defaults.max_data_size //
+                                    self._unit_size)
+        self._seq = 0
+        self.messages = 0
+        self.blocks = 0
+        self.writes = 0
+
+    def pack(self, messages) -> bytearray:
+        """Return sync + block units holding messages."""
+        payload_size = self.block_size - BLOCK_HEADER_SIZE
+        out = bytearray()
+        block = None
+        used = 0  # bytes of payload used in current block
+        first = NO_MESSAGE
+        for message in messages:
+            size = len(message)
+            assert 0 < size < 0x10000, 'message size must be 1 to 65535'
+            pos = 0
+            header = True
+            while header or pos < size:
+                if block is None:
+                    block = bytearray()
+                    used = 0
+                    first = NO_MESSAGE
+                room = payload_size - used
+                if header:
+                    if room < MESSAGE_HEADER_SIZE + 1:
+                        used = payload_size  # pad, header in next block
+                    else:
+                        if first == NO_MESSAGE:
+                            first = used
+                        block += size.to_bytes(2, 'big')
+                        used += MESSAGE_HEADER_SIZE
+                        header = False
+                        room -= MESSAGE_HEADER_SIZE
+                        count = min(room, size)
+                        block += message[:count]
+                        used += count
+                        pos = count
+                else:
+                    count = min(room, size - pos)
+                    block += message[pos:pos + count]
+                    used += count
+                    pos += count
+                if used >= payload_size:
+                    self._add_block(out, block, first)
+                    block = None
+            self.messages += 1
+        if block is not None:
+            self._add_block(out, block, first)
+        return out
+
+    def _add_block(self, out:bytearray, block:bytearray, first:int):
+        payload_size = self.block_size - BLOCK_HEADER_SIZE
+        out += self.sync
+        out.append(self._seq)
+        out += first.to_bytes(2, 'big')
+        out += block
+        # zero fill: length 0 marks padding
+        out += bytes(payload_size - len(block))
+        self._seq = (self._seq + 1) & 0xff
+        self.blocks += 1
+
+    def write_messages(self, messages) -> bool:
+        """Send messages, return True if all writes succeed."""
+        data = self.pack(messages)
+        view = memoryview(data)
+        step = self.blocks_per_write * self._unit_size
+        for i in range(0, len(data), step):
+            self.writes += 1
+            if not self.port.write(view[i:i + step]):
+                return False
+        return True
+
+    def __repr__(self):
+        return 'XsyncWriter object at ' + hex(id(self)) + '\n' + \
+            'block_size = ' + str(self.block_size) + '\n' + \
+            'blocks_per_write = ' + str(self.blocks_per_write) + '\n' + \
+            'messages = ' + str(self.messages) + '\n' + \
+            'blocks = ' + str(self.blocks) + '\n' + \
+            'writes = ' + str(self.writes) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class XsyncReader():
+    """Reassemble messages from received XSYNC blocks."""
+
+    def __init__(self, port:Port, block_size:int=None):
+        """
+        port = open Port configured for XSYNC with xsync_block_size set
+        block_size = block size (default port xsync_block_size)
+        """
+        if block_size is None:
+            block_size = port._settings.xsync_block_size
+        assert block_size > BLOCK_HEADER_SIZE + MESSAGE_HEADER_SIZE, \
+            'block_size too small for message headers'
+        self.port = port
+        self.block_size = block_size
+        self._seq = -1  # expected sequence number, -1 = any
+        self._partial = None  # message spanning blocks
+        self._need = 0  # bytes missing from partial message
+        self.blocks = 0
+        self.messages = 0
+        self.bytes = 0
+        self.lost_blocks = 0
+        self.errors = 0
+
+    def reset(self):
+        """Discard partial message and accept any block sequence number."""
+        self._seq = -1
+        self._partial = None
+        self._need = 0
+
+    def messages_in(self, block) -> list:
+        """Return list of messages completed by block."""
+        size = len(block)
+        if size != self.block_size:
+            self.errors += 1
+            self.reset()
+            return []
+        self.blocks += 1
+        seq = block[0]
+        if seq != self._seq:
+            if self._seq != -1:
+                self.lost_blocks += (seq - self._seq) & 0xff
+            self._partial = None
+        self._seq = (seq + 1) & 0xff
+
+        view = memoryview(block)
+        partial = self._partial
+        if partial is not None:
+            need = self._need
+            if need >= size - BLOCK_HEADER_SIZE:
+                # whole block is message continuation
+                partial += view[BLOCK_HEADER_SIZE:]
+                self._need = need - (size - BLOCK_HEADER_SIZE)
+                if self._need:
+                    return []
+                self._partial = None
+                self.messages += 1
+                self.bytes += len(partial)
+                return [memoryview(partial)]
+            pos = BLOCK_HEADER_SIZE + need
+            partial += view[BLOCK_HEADER_SIZE:pos]
+            self._partial = None
+            out = [memoryview(partial)]
+            total = len(partial)
+        else:
+            first = block[1] << 8 | block[2]
+            if first == NO_MESSAGE:
+                return []  # continuation of discarded message
+            pos = BLOCK_HEADER_SIZE + first
+            out = []
+            total = 0
+
+        while pos + MESSAGE_HEADER_SIZE <= size:
+            length = block[pos] << 8 | block[pos + 1]
+            if not length:
+                break  # padding
+            pos += MESSAGE_HEADER_SIZE
+            end = pos + length
+            if end > size:
+                self._partial = bytearray(view[pos:])
+                self._need = end - size
+                break
+            out.append(view[pos:end])
+            total += length
+            pos = end
+        self.messages += len(out)
+        self.bytes += total
+        return out
+
+    def read_messages(self, block_count:int=1) -> list:
+        """
+        Read up to block_count blocks and return list of completed
+        messages (memoryviews). With blocked_io = False reading stops
+        when no block is available. Returns None if first read fails.
+        """
+        out = []
+        for i in range(block_count):
+            block = self.port.read()
+            if not block:
+                if i == 0:
+                    return None
+                break
+            out += self.messages_in(block)
+        return out
+
+    def __iter__(self):
+        """Return messages until port.read() fails."""
+        while True:
+            messages = self.read_messages()
+            if messages is None:
+                return
+            yield from messages
+
+    def __repr__(self):
+        return 'XsyncReader object at ' + hex(id(self)) + '\n' + \
+            'block_size = ' + str(self.block_size) + '\n' + \
+            'blocks = ' + str(self.blocks) + '\n' + \
+            'messages = ' + str(self.messages) + '\n' + \
+            'bytes = ' + str(self.bytes) + '\n' + \
+            'lost_blocks = ' + str(self.lost_blocks) + '\n' + \
+            'errors = ' + str(self.errors) + '\n'
+
+    def __str__(self):
+        return self.__repr__()
@@ -64,6 +64,8 @@ BLOCK_SIZE = 100
 # Actual applications may send multiple byte aligned blocks.
 # In this case the receiver remains enabled between blocks. The application
 # is responsible for determining when the receiver must resync between blocks.
+# mgbisync.BlockAssembler implements this case with large reads and
+# restarts the receiver only on errors.
 
 def receive_block(port: Port) -> bytearray:
     block = bytearray()  # assembled data block